@@ -0,0 +1,331 @@
+# =========================================================================
+#           Performance Benchmarks
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import socket
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from skrf.calibration import SOLT
+
+# Benchmarked modules live beside this folder
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.append(os.path.join(ROOT, 'Plotting'))
+sys.path.append(os.path.join(ROOT, 'GUI'))
+sys.path.append(os.path.join(ROOT, 'Miscellaneous'))
+from Trace_Engine import Traces
+from Error_Kernel import error_terms
+from Error_Model import extract_error_terms
+from Results_Table import result_tables_multi
+from Deembedding import Deembedder
+from NPort_Calibration import NPortCalibration
+from SCPI_Session import SCPISession, fetch_trace
+from Synthetic_SParam import frequency_grid, line_network, filter_network, solt_standards, nport_standards, \
+    nport_network
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SIZES = (1000, 10000, 100000, 1000000)
+
+# Largest size run by each benchmark unless --all-sizes is given, keeping a default run to a few minutes
+DEFAULT_MAX_POINTS = {
+    'traces': 1000000,
+    'error_terms': 1000000,
+    'error_model': 1000000,
+    'table_export': 1000000,
+    'solt_deembed': 100000,
+    'nport_2': 1000000,
+    'nport_4': 100000,
+    'nport_8': 10000,
+    'nport_16': 1000,
+    'scpi_round_trip': 1000,
+    'scpi_trace': 100000,
+}
+
+
+def time_call(function, repeat):
+    """
+    time_call runs a function repeatedly and keeps the fastest run, which is the least affected by other load
+    :param function: The function to time, called with no arguments
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_traces(points, repeat):
+    """
+    bench_traces times computing every derived trace of a network
+    :param points: The number of frequency points
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    ntwk = filter_network(frequency_grid(points))
+    return time_call(lambda: Traces(ntwk.f, ntwk.s, aperture=10, smoothing=10), repeat)
+
+
+def bench_error_terms(points, repeat):
+    """
+    bench_error_terms times the ratio-based error terms of four calibrated cases
+    :param points: The number of frequency points
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    measured, true = line_network(frequency_grid(points), 1), line_network(frequency_grid(points), 2)
+    stacked = np.stack([true.s] * 4)
+    return time_call(lambda: error_terms(measured.s, stacked), repeat)
+
+
+def bench_error_model(points, repeat):
+    """
+    bench_error_model times extracting the 12-term error model from SOLT standards
+    :param points: The number of frequency points
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    ideals, measured, _ = solt_standards(frequency_grid(points))
+    ideal_s = np.stack([ntwk.s for ntwk in ideals])
+    measured_s = np.stack([ntwk.s for ntwk in measured])
+    return time_call(lambda: extract_error_terms(ideal_s, measured_s), repeat)
+
+
+def bench_table_export(points, repeat):
+    """
+    bench_table_export times a 10000 row comparison table of four networks written to CSV
+    :param points: The number of frequency points
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    networks = [filter_network(frequency_grid(points), seed) for seed in range(4)]
+    step = (networks[0].f[-1] - networks[0].f[0]) / 9999
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'table.csv')
+        with contextlib.redirect_stdout(io.StringIO()):
+            return time_call(lambda: result_tables_multi(networks, ['A', 'B', 'C', 'D'], networks[0].f[0],
+                                                         networks[0].f[-1], step, path), repeat)
+
+
+def bench_solt_deembed(points, repeat):
+    """
+    bench_solt_deembed times solving a SOLT calibration, correcting a DUT and de-embedding a fixture, as
+    solve_calibration_results does in the GUI
+    :param points: The number of frequency points
+    :param repeat: The number of runs
+    :return: The fastest run time in seconds
+    """
+    ideals, measured, _ = solt_standards(frequency_grid(points))
+    dut = filter_network(frequency_grid(points), 3)
+    fixture = line_network(frequency_grid(points), 4)
+
+    def solve_and_deembed():
+        cal = SOLT(ideals=ideals, measured=measured)
+        cal.run()
+        Deembedder(fixture).apply(cal.apply_cal(dut))
+
+    return time_call(solve_and_deembed, repeat)
+
+
+def bench_nport(nports):
+    """
+    bench_nport makes a benchmark of solving an N-port error model from its standards and correcting a DUT
+    :param nports: The number of ports
+    :return: The benchmark function, taking the number of frequency points and runs
+    """
+    def bench(points, repeat):
+        f = frequency_grid(points)
+        reflect_ideals, reflect_measured, thru_ideal, thru_measured, _ = nport_standards(f, nports)
+        reflect_ideals = np.stack([ntwk.s for ntwk in reflect_ideals])
+        reflect_measured = np.stack([ntwk.s for ntwk in reflect_measured])
+        thru_ideals = np.stack([thru_ideal.s] * len(thru_measured))
+        thru_measured = np.stack([ntwk.s for ntwk in thru_measured])
+        dut = nport_network(f, nports, 3).s
+
+        def solve_and_correct():
+            NPortCalibration.from_standards(f, reflect_ideals, reflect_measured, thru_ideals,
+                                            thru_measured).apply_s(dut)
+
+        return time_call(solve_and_correct, repeat)
+
+    return bench
+
+
+def free_port():
+    """
+    free_port finds an unused local TCP port for the simulated instrument
+    :return: The port number
+    """
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_simulator():
+    """
+    start_simulator serves a simulated instrument on a background thread
+    :return: The port it listens on
+    """
+    # InstrumentSim imports pyvisa and pyvisa_sim, so it is only loaded for the SCPI benchmarks
+    from InstrumentSim import new_simulation_settings, serve_simulated_instruments
+    port = free_port()
+    settings = new_simulation_settings()
+    thread = threading.Thread(target=lambda: asyncio.run(serve_simulated_instruments('127.0.0.1', port, 1, settings)),
+                              name='benchmark-simulator', daemon=True)
+    thread.start()
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return port
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("Simulated instrument did not start")
+
+
+def bench_scpi_round_trip(points, repeat, port):
+    """
+    bench_scpi_round_trip times a series of *OPC? queries against the simulated instrument
+    :param points: Ten times the number of queries, so the series scales with the network size
+    :param repeat: The number of runs
+    :param port: The port of the simulated instrument
+    :return: The fastest run time in seconds
+    """
+    with SCPISession('127.0.0.1', port) as session:
+        return time_call(lambda: [session.query("*OPC?") for _ in range(points // 10)], repeat)
+
+
+def bench_scpi_trace(points, repeat, port):
+    """
+    bench_scpi_trace times fetching a binary trace from the simulated instrument
+    :param points: The number of sweep points
+    :param repeat: The number of runs
+    :param port: The port of the simulated instrument
+    :return: The fastest run time in seconds
+    """
+    with SCPISession('127.0.0.1', port) as session:
+        session.write(f"SENS:SWE:POIN {points}")
+        session.query("*OPC?")
+        return time_call(lambda: fetch_trace(session), repeat)
+
+
+BENCHMARKS = {
+    'traces': bench_traces,
+    'error_terms': bench_error_terms,
+    'error_model': bench_error_model,
+    'table_export': bench_table_export,
+    'solt_deembed': bench_solt_deembed,
+    'nport_2': bench_nport(2),
+    'nport_4': bench_nport(4),
+    'nport_8': bench_nport(8),
+    'nport_16': bench_nport(16),
+    'scpi_round_trip': bench_scpi_round_trip,
+    'scpi_trace': bench_scpi_trace,
+}
+SCPI_BENCHMARKS = ('scpi_round_trip', 'scpi_trace')
+
+
+def run_benchmarks(names=None, sizes=SIZES, repeat=5, all_sizes=False):
+    """
+    run_benchmarks times each benchmark at each network size
+    :param names: The benchmarks to run, or None for all of them
+    :param sizes: The numbers of frequency points to run at
+    :param repeat: The number of runs of each timing, the fastest is kept
+    :param all_sizes: Run every size, including sizes above DEFAULT_MAX_POINTS
+    :return: A dictionary of benchmark name to a dictionary of size to seconds
+    """
+    names = list(BENCHMARKS) if names is None else names
+    port = None
+    if any(name in SCPI_BENCHMARKS for name in names):
+        try:
+            port = start_simulator()
+        except ImportError as e:
+            print(f"Skipping SCPI benchmarks, the instrument simulator could not be loaded: {e}")
+            names = [name for name in names if name not in SCPI_BENCHMARKS]
+
+    results = {}
+    for name in names:
+        results[name] = {}
+        for points in sizes:
+            if not all_sizes and points > DEFAULT_MAX_POINTS[name]:
+                continue
+            args = (points, repeat, port) if name in SCPI_BENCHMARKS else (points, repeat)
+            seconds = BENCHMARKS[name](*args)
+            results[name][str(points)] = seconds
+            print(f"{name:<16} {points:>8} points  {seconds * 1e3:10.3f} ms")
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold):
+    """
+    compare_to_baseline finds timings that are slower than the baseline by more than the threshold
+    :param results: The timings from run_benchmarks
+    :param baseline: The stored baseline timings, in the same layout
+    :param threshold: The allowed slowdown as a fraction, e.g. 0.25 for 25 %
+    :return: A list of (name, size, baseline seconds, current seconds) for each regression
+    """
+    regressions = []
+    for name, timings in results.items():
+        for points, seconds in timings.items():
+            reference = baseline.get(name, {}).get(points)
+            if reference is not None and seconds > reference * (1 + threshold):
+                regressions.append((name, points, reference, seconds))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the acquisition, calibration and plotting hot paths")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=None, metavar='NAME',
+                        help=f"benchmarks to run, default all of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(SIZES), help="network sizes in points")
+    parser.add_argument('--all-sizes', action='store_true', help="run sizes above each benchmark's default limit")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per timing, the fastest is kept")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline results file")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="allowed slowdown against the baseline as a fraction, default 0.25")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.sizes, args.repeat, args.all_sizes)
+
+    if args.save_baseline:
+        # Merge into the existing baseline, so a partial run only replaces the timings it measured
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as file:
+                baseline = json.load(file).get('results', {})
+        for name, timings in results.items():
+            baseline.setdefault(name, {}).update(timings)
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': platform.node(), 'python': platform.python_version(), 'results': baseline},
+                      file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to create one")
+        sys.exit(0)
+    with open(args.baseline) as file:
+        stored = json.load(file)
+    if stored.get('machine') != platform.node():
+        print(f"Warning: baseline was recorded on {stored.get('machine')}, timings may not be comparable")
+
+    regressions = compare_to_baseline(results, stored['results'], args.threshold)
+    for name, points, reference, seconds in regressions:
+        print(f"REGRESSION {name} at {points} points: {reference * 1e3:.3f} ms -> {seconds * 1e3:.3f} ms "
+              f"({seconds / reference - 1:+.0%})")
+    if regressions:
+        sys.exit(1)
+    print(f"No regressions beyond {args.threshold:.0%} of the baseline")
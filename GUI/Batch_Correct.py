@@ -0,0 +1,117 @@
+# =========================================================================
+#           VNA Calibration Device Batch DUT Correction
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import skrf as rf
+from skrf.calibration import SOLT
+from Calibration_Cache import CalibrationCache, IDEAL_FILES, MEASURED_FILES
+from Deembedding import Deembedder
+
+# Touchstone loader shared with the plotting scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Plotting'))
+from Touchstone_Cache import load_network
+
+# Calibration and de-embedding shared by each worker process, set once by init_worker
+worker_cal = None
+worker_deembedder = None
+worker_output_dir = None
+
+
+def init_worker(frequency, coefs, deembed, output_dir):
+    """
+    init_worker rebuilds the solved calibration in a worker process from its error coefficients
+    :param frequency: The calibration frequency points in Hz
+    :param coefs: The dictionary of calibration error coefficients
+    :param deembed: The de-embedding fixture network, or None to skip de-embedding
+    :param output_dir: The directory corrected Touchstone files are written to
+    :return: NULL
+    """
+    global worker_cal, worker_deembedder, worker_output_dir
+    worker_cal = SOLT.from_coefs(rf.Frequency.from_f(frequency, unit='Hz'), coefs)
+    worker_deembedder = None if deembed is None else Deembedder(deembed)
+    worker_output_dir = output_dir
+
+
+def correct_file(path):
+    """
+    correct_file applies the calibration and de-embedding to a single DUT file and writes the result
+    :param path: The path to the DUT Touchstone file
+    :return: A tuple of the path and None on success, or the path and an error message on failure
+    """
+    try:
+        dut = load_network(path)
+        corrected = worker_cal.apply_cal(dut)
+        if worker_deembedder is not None:
+            corrected = worker_deembedder.apply(corrected)
+        name = os.path.splitext(os.path.basename(path))[0]
+        corrected.write_touchstone(filename=name, dir=worker_output_dir)
+        return path, None
+    except Exception as e:
+        return path, str(e)
+
+
+def batch_correct(input_dir, output_dir, ideal_paths=IDEAL_FILES, measured_paths=MEASURED_FILES,
+                  deembed_path=None, pattern='*.s2p', workers=None, chunksize=8):
+    """
+    batch_correct solves the calibration once and corrects every DUT file in a directory across a process pool
+    :param input_dir: The directory of DUT Touchstone files
+    :param output_dir: The directory corrected Touchstone files are written to
+    :param ideal_paths: The paths to the ideal standard Touchstone files
+    :param measured_paths: The paths to the measured standard Touchstone files
+    :param deembed_path: The path to the de-embedding fixture Touchstone file, or None to skip de-embedding
+    :param pattern: The glob pattern selecting DUT files within input_dir
+    :param workers: The number of worker processes, or None for one per core
+    :param chunksize: The number of files handed to a worker at a time
+    :return: A dictionary with the number of files corrected, the failures and the throughput in files per second
+    """
+    start = time.perf_counter()
+    cal = CalibrationCache().get_calibration(ideal_paths, measured_paths)
+    deembed = None if deembed_path is None else load_network(deembed_path)
+    paths = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+    print(f"Calibration ready in {time.perf_counter() - start:.2f} s, correcting {len(paths)} files "
+          f"with {workers} workers")
+
+    # Files are streamed through the pool, results arrive as each chunk finishes
+    start = time.perf_counter()
+    corrected = 0
+    failures = []
+    with multiprocessing.Pool(workers, initializer=init_worker,
+                              initargs=(cal.frequency.f, cal.coefs, deembed, output_dir)) as pool:
+        for path, error in pool.imap_unordered(correct_file, paths, chunksize=chunksize):
+            if error is None:
+                corrected += 1
+            else:
+                failures.append((path, error))
+                print(f"Failed to correct {path}: {error}")
+    elapsed = time.perf_counter() - start
+
+    rate = corrected / elapsed if elapsed > 0 else 0.0
+    print(f"Corrected {corrected} files in {elapsed:.2f} s ({rate:.1f} files/s), {len(failures)} failed")
+    return {'corrected': corrected, 'failures': failures, 'files_per_second': rate}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correct a directory of DUT Touchstone files")
+    parser.add_argument('input_dir', help="directory of DUT Touchstone files")
+    parser.add_argument('output_dir', help="directory corrected Touchstone files are written to")
+    parser.add_argument('--ideals', nargs=4, default=IDEAL_FILES, metavar='FILE',
+                        help="ideal Short, Open, Load and Thru files")
+    parser.add_argument('--measured', nargs=4, default=MEASURED_FILES, metavar='FILE',
+                        help="measured Short, Open, Load and Thru files")
+    parser.add_argument('--deembed', default=None, help="de-embedding fixture file")
+    parser.add_argument('--pattern', default='*.s2p', help="glob pattern of DUT files")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument('--chunksize', type=int, default=8, help="files handed to a worker at a time")
+    args = parser.parse_args()
+    batch_correct(args.input_dir, args.output_dir, args.ideals, args.measured, args.deembed, args.pattern,
+                  args.workers, args.chunksize)
@@ -0,0 +1,310 @@
+# =========================================================================
+#           VNA Calibration Device Calibration Cache
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import skrf as rf
+from skrf.calibration import SOLT
+
+# Touchstone loader shared with the plotting scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Plotting'))
+from Touchstone_Cache import load_network
+from Grid_Align import align
+from NPort_Calibration import NPortCalibration, port_pairs, solve_nport_calibration
+from Timing import span
+
+# Calibration kit used by the GUI, ordered Short, Open, Load, Thru
+IDEAL_FILES = [
+    'SParam/Ideals/Short_Ideal.s2p',
+    'SParam/Ideals/Open_Ideal.s2p',
+    'SParam/Ideals/Load_Ideal.s2p',
+    'SParam/Ideals/Thru_Ideal.s2p',
+]
+MEASURED_FILES = [
+    'SParam/Meas/1000mm_line_short.s2p',
+    'SParam/Meas/1000mm_line_open.s2p',
+    'SParam/Meas/1000mm_line_load.s2p',
+    'SParam/Meas/1000mm_line_thru.s2p',
+]
+CACHE_DIR = 'SParam/.calibration_cache'
+NPORT_REFLECTS = ['Short', 'Open', 'Load']
+
+# Example DUTs corrected by the GUI after a calibration, 2-port and N-port
+DUT_FILE = 'SParam/DUTs/1m_cable_LPF_1-35P_3dbRipple.s2p'
+NPORT_DUT_FILE = 'SParam/DUTs/{nports}port_DUT.s{nports}p'
+
+# File content hashes, reused while the file size and modification time are unchanged
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def file_hash(path):
+    """
+    file_hash calculates the SHA-256 of a file's contents, only re-reading the file when its size or
+    modification time changes
+    :param path: The path to the file
+    :return: The hex digest of the file contents
+    """
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    path = os.path.abspath(path)
+    with _file_hashes_lock:
+        cached = _file_hashes.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    with _file_hashes_lock:
+        _file_hashes[path] = (signature, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def nport_kit_files(nports):
+    """
+    nport_kit_files lists the calibration kit of an N-port, a Short, Open and Load on every port and a thru
+    between every pair of ports, named like the 2-port kit
+    :param nports: The number of ports
+    :return: A tuple of the ideal and measured reflect standard paths, and the ideal and measured thru paths in
+    port_pairs order
+    """
+    pairs = port_pairs(nports)
+    return ([f'SParam/Ideals/{name}_Ideal.s{nports}p' for name in NPORT_REFLECTS],
+            [f'SParam/Meas/1000mm_line_{name.lower()}.s{nports}p' for name in NPORT_REFLECTS],
+            [IDEAL_FILES[3]] * len(pairs),
+            [f'SParam/Meas/1000mm_line_thru_{j + 1}{k + 1}.s{nports}p' for j, k in pairs])
+
+
+def calibration_key(ideal_paths, measured_paths, frequency=None, kind='SOLT'):
+    """
+    calibration_key builds the content address of a calibration from its standard files and frequency grid
+    :param ideal_paths: The paths to the ideal standard Touchstone files
+    :param measured_paths: The paths to the measured standard Touchstone files
+    :param frequency: The frequency grid in Hz the standards are interpolated to, or None to use the file grid
+    :param kind: The calibration method, so different methods on the same files never share a key
+    :return: The hex digest identifying the calibration
+    """
+    digest = hashlib.sha256(kind.encode('ascii'))
+    for path in list(ideal_paths) + list(measured_paths):
+        digest.update(file_hash(path).encode('ascii'))
+    if frequency is not None:
+        digest.update(np.ascontiguousarray(frequency, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def solve_calibration(ideal_paths, measured_paths, frequency=None):
+    """
+    solve_calibration parses the standard files and solves the SOLT calibration
+    :param ideal_paths: The paths to the ideal standard Touchstone files
+    :param measured_paths: The paths to the measured standard Touchstone files
+    :param frequency: The frequency grid in Hz the standards are interpolated to, or None to use the file grid
+    :return: The solved SOLT calibration
+    """
+    with span('touchstone_parse'):
+        ideals = [load_network(path) for path in ideal_paths]
+        measured = [load_network(path) for path in measured_paths]
+    if frequency is not None:
+        # Standards usually share a grid, so the interpolation weights are calculated once for all of them
+        with span('grid_align'):
+            ideals = [align(ntwk, frequency) for ntwk in ideals]
+            measured = [align(ntwk, frequency) for ntwk in measured]
+
+    with span('solt_run'):
+        cal = SOLT(
+            ideals=ideals,
+            measured=measured,
+        )
+        cal.run()
+    return cal
+
+
+class CalibrationCache:
+    """
+    CalibrationCache holds solved calibrations in memory and on disk, addressed by the contents of the standard
+    files and the frequency grid. Both levels evict the least recently used calibrations
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_entries=8, max_disk_entries=64):
+        """
+        __init__ sets the cache location and sizes
+        :param cache_dir: The directory solved calibrations are saved to, or None for memory only
+        :param max_memory_entries: The number of calibrations kept in memory
+        :param max_disk_entries: The number of calibrations kept on disk
+        :return: NULL
+        """
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_calibration(self, ideal_paths=IDEAL_FILES, measured_paths=MEASURED_FILES, frequency=None):
+        """
+        get_calibration returns the solved calibration for the given standards, only parsing and solving when no
+        cached solution matches the current file contents
+        :param ideal_paths: The paths to the ideal standard Touchstone files
+        :param measured_paths: The paths to the measured standard Touchstone files
+        :param frequency: The frequency grid in Hz the standards are interpolated to, or None to use the file grid
+        :return: The solved SOLT calibration
+        """
+        with span('calibration_lookup'):
+            key = calibration_key(ideal_paths, measured_paths, frequency)
+            cal = self.get(key)
+        if cal is None:
+            self.misses += 1
+            cal = solve_calibration(ideal_paths, measured_paths, frequency)
+            self.put(key, cal)
+        else:
+            self.hits += 1
+        return cal
+
+    def get_nport_calibration(self, nports, frequency=None):
+        """
+        get_nport_calibration returns the solved N-port error model of the nport_kit_files kit, only parsing and
+        solving when no cached solution matches the current file contents
+        :param nports: The number of ports
+        :param frequency: The frequency grid in Hz the standards are interpolated to, or None to use the file grid
+        :return: The NPortCalibration
+        """
+        reflect_ideals, reflect_measured, thru_ideals, thru_measured = nport_kit_files(nports)
+        with span('calibration_lookup'):
+            key = calibration_key(reflect_ideals + thru_ideals, reflect_measured + thru_measured, frequency,
+                                  f'NPORT{nports}')
+            cal = self.get(key)
+        if cal is None:
+            self.misses += 1
+            with span('nport_solve'):
+                cal = solve_nport_calibration(reflect_ideals, reflect_measured, thru_ideals, thru_measured,
+                                              frequency=frequency)
+            self.put(key, cal)
+        else:
+            self.hits += 1
+        return cal
+
+    def get(self, key):
+        """
+        get looks up a calibration in memory, then on disk
+        :param key: The calibration key from calibration_key
+        :return: The solved calibration, or None if not cached
+        """
+        with self._lock:
+            cal = self._memory.get(key)
+            if cal is not None:
+                self._memory.move_to_end(key)
+                return cal
+
+        cal = self._load(key)
+        if cal is not None:
+            self._remember(key, cal)
+        return cal
+
+    def put(self, key, cal):
+        """
+        put stores a solved calibration in memory and on disk
+        :param key: The calibration key from calibration_key
+        :param cal: The solved calibration
+        :return: NULL
+        """
+        self._remember(key, cal)
+        self._save(key, cal)
+
+    def clear(self):
+        """
+        clear removes all cached calibrations from memory and disk
+        :return: NULL
+        """
+        with self._lock:
+            self._memory.clear()
+        for path in self._disk_entries():
+            os.remove(path)
+
+    def _remember(self, key, cal):
+        """
+        _remember stores a calibration in memory, evicting the least recently used beyond the memory limit
+        :param key: The calibration key from calibration_key
+        :param cal: The solved calibration
+        :return: NULL
+        """
+        with self._lock:
+            self._memory[key] = cal
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        """
+        _path gives the on-disk location of a calibration
+        :param key: The calibration key from calibration_key
+        :return: The path to the .npz file
+        """
+        return os.path.join(self.cache_dir, key + '.npz')
+
+    def _disk_entries(self):
+        """
+        _disk_entries lists the calibrations saved on disk
+        :return: A list of paths to .npz files
+        """
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+
+    def _load(self, key):
+        """
+        _load reads a calibration from disk and rebuilds it from its error coefficients
+        :param key: The calibration key from calibration_key
+        :return: The solved calibration or NPortCalibration, or None if not on disk
+        """
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                frequency = data['frequency']
+                coefs = {name: data[name] for name in data.files if name != 'frequency'}
+        except (OSError, KeyError, ValueError):
+            return None
+
+        # Mark as recently used for disk eviction
+        os.utime(path)
+        if 'nport_offset' in coefs:
+            return NPortCalibration(frequency, coefs['nport_offset'], coefs['nport_tracking'], coefs['nport_match'])
+        return SOLT.from_coefs(rf.Frequency.from_f(frequency, unit='Hz'), coefs)
+
+    def _save(self, key, cal):
+        """
+        _save writes the error coefficients of a calibration to disk
+        :param key: The calibration key from calibration_key
+        :param cal: The solved calibration or NPortCalibration
+        :return: NULL
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as file:
+            if isinstance(cal, NPortCalibration):
+                np.savez(file, frequency=cal.frequency, nport_offset=cal.offset, nport_tracking=cal.tracking,
+                         nport_match=cal.match)
+            else:
+                np.savez(file, frequency=cal.frequency.f, **cal.coefs)
+        os.replace(temp_path, path)
+
+        # Evict the least recently used calibrations beyond the disk limit
+        entries = sorted(self._disk_entries(), key=os.path.getmtime)
+        for old_path in entries[:max(0, len(entries) - self.max_disk_entries)]:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
@@ -0,0 +1,175 @@
+# =========================================================================
+#           VNA Calibration Device Batched De-embedding
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import time
+import numpy as np
+import skrf as rf
+
+
+def inverse_2x2(m):
+    """
+    inverse_2x2 inverts a stack of 2x2 matrices in closed form
+    :param m: A complex array of shape (..., 2, 2)
+    :return: The inverse matrices, with the same shape as m
+    """
+    a, b = m[..., 0, 0], m[..., 0, 1]
+    c, d = m[..., 1, 0], m[..., 1, 1]
+    det = a * d - b * c
+    inverse = np.empty_like(m)
+    inverse[..., 0, 0] = d / det
+    inverse[..., 0, 1] = -b / det
+    inverse[..., 1, 0] = -c / det
+    inverse[..., 1, 1] = a / det
+    return inverse
+
+
+def matmul_2x2(x, y):
+    """
+    matmul_2x2 multiplies two broadcastable stacks of 2x2 matrices in closed form
+    :param x: A complex array of shape (..., 2, 2)
+    :param y: A complex array of shape (..., 2, 2)
+    :return: The products x @ y
+    """
+    x00, x01, x10, x11 = x[..., 0, 0], x[..., 0, 1], x[..., 1, 0], x[..., 1, 1]
+    y00, y01, y10, y11 = y[..., 0, 0], y[..., 0, 1], y[..., 1, 0], y[..., 1, 1]
+    product = np.empty(np.broadcast_shapes(x.shape, y.shape), dtype=np.result_type(x, y))
+    product[..., 0, 0] = x00 * y00 + x01 * y10
+    product[..., 0, 1] = x00 * y01 + x01 * y11
+    product[..., 1, 0] = x10 * y00 + x11 * y10
+    product[..., 1, 1] = x10 * y01 + x11 * y11
+    return product
+
+
+def s2t_2port(s):
+    """
+    s2t_2port converts stacked 2-port S-parameters to T-parameters, using the same convention as Network.t
+    :param s: A complex array of shape (..., 2, 2)
+    :return: The T-parameters, with the same shape as s
+    """
+    s11, s12, s21, s22 = s[..., 0, 0], s[..., 0, 1], s[..., 1, 0], s[..., 1, 1]
+    t = np.empty_like(s)
+    t[..., 0, 0] = s12 - s11 * s22 / s21
+    t[..., 0, 1] = s11 / s21
+    t[..., 1, 0] = -s22 / s21
+    t[..., 1, 1] = 1 / s21
+    return t
+
+
+def t2s_2port(t):
+    """
+    t2s_2port converts stacked 2-port T-parameters back to S-parameters
+    :param t: A complex array of shape (..., 2, 2)
+    :return: The S-parameters, with the same shape as t
+    """
+    t11, t12, t21, t22 = t[..., 0, 0], t[..., 0, 1], t[..., 1, 0], t[..., 1, 1]
+    s = np.empty_like(t)
+    s[..., 0, 0] = t12 / t22
+    s[..., 0, 1] = t11 - t12 * t21 / t22
+    s[..., 1, 0] = 1 / t22
+    s[..., 1, 1] = -t21 / t22
+    return s
+
+
+class Deembedder:
+    """
+    Deembedder removes fixture networks from either side of a DUT. The inverse fixture T-matrices are calculated
+    once and reused for every DUT applied
+    """
+
+    def __init__(self, left, right=None):
+        """
+        __init__ calculates and stores the inverse fixture T-matrices
+        :param left: The fixture network on port 1 of the DUT
+        :param right: The fixture network on port 2 of the DUT, or None to use the left fixture on both sides
+        :return: NULL
+        """
+        self.frequency = left.frequency
+        self.left_inv = inverse_2x2(s2t_2port(left.s))
+        self.right_inv = self.left_inv if right is None else inverse_2x2(s2t_2port(right.s))
+
+    def apply_t(self, t):
+        """
+        apply_t de-embeds stacked T-parameters
+        :param t: A complex array of shape (F, 2, 2) for one DUT or (K, F, 2, 2) for K DUTs
+        :return: The de-embedded T-parameters, with the same shape as t
+        """
+        return matmul_2x2(matmul_2x2(self.left_inv, t), self.right_inv)
+
+    def apply_s(self, s):
+        """
+        apply_s de-embeds stacked S-parameters
+        :param s: A complex array of shape (F, 2, 2) for one DUT or (K, F, 2, 2) for K DUTs
+        :return: The de-embedded S-parameters, with the same shape as s
+        """
+        return t2s_2port(self.apply_t(s2t_2port(s)))
+
+    def apply(self, ntwk):
+        """
+        apply de-embeds a single DUT network
+        :param ntwk: The DUT network, on the same frequency grid as the fixtures
+        :return: A new de-embedded network
+        """
+        deembedded = ntwk.copy()
+        deembedded.s = self.apply_s(ntwk.s)
+        return deembedded
+
+    def apply_batch(self, ntwks):
+        """
+        apply_batch de-embeds many DUT networks with a single vectorized call
+        :param ntwks: A list of DUT networks, on the same frequency grid as the fixtures
+        :return: A list of new de-embedded networks
+        """
+        s = self.apply_s(np.stack([ntwk.s for ntwk in ntwks]))
+        deembedded = []
+        for ntwk, s_dut in zip(ntwks, s):
+            ntwk = ntwk.copy()
+            ntwk.s = s_dut
+            deembedded.append(ntwk)
+        return deembedded
+
+
+def compare_deembedding(points=10001, duts=16, repeats=5):
+    """
+    compare_deembedding times the original inverse T-matrix expression against the precomputed Deembedder on
+    synthetic networks
+    :param points: The number of frequency points
+    :param duts: The number of DUT networks de-embedded per run
+    :param repeats: The number of times each method is run
+    :return: A dictionary of the mean time per run in seconds for each method
+    """
+    rng = np.random.default_rng(0)
+    frequency = rf.Frequency(1, 6000, points, 'MHz')
+
+    def random_network():
+        s = 0.2 * (rng.standard_normal((points, 2, 2)) + 1j * rng.standard_normal((points, 2, 2)))
+        s[:, 1, 0] += 0.9
+        s[:, 0, 1] += 0.9
+        return rf.Network(frequency=frequency, s=s)
+
+    de = random_network()
+    ntwks = [random_network() for _ in range(duts)]
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for ntwk in ntwks:
+            expected = ntwk.copy()
+            expected.t = np.linalg.inv(de.t) @ ntwk.t @ np.linalg.inv(de.t)
+    original = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        deembedder = Deembedder(de)
+        deembedded = deembedder.apply_batch(ntwks)
+    batched = (time.perf_counter() - start) / repeats
+
+    error = np.max(np.abs(deembedded[-1].s - expected.s))
+    print(f"Original expression: {original * 1e3:.2f} ms for {duts} DUTs of {points} points")
+    print(f"Deembedder: {batched * 1e3:.2f} ms, speed-up {original / batched:.1f}x, max difference {error:.2e}")
+    return {'original': original, 'batched': batched}
+
+
+if __name__ == "__main__":
+    compare_deembedding()
@@ -7,50 +7,266 @@
 import pyvisa
 import pyvisa_sim
 import os
-import socket
+import argparse
+import asyncio
+import numpy as np
 
+# Commands that trigger a sweep, and commands that wait for the sweep to complete
+SWEEP_COMMANDS = ("TRIG:SING", "INIT", "INIT:IMM")
+WAIT_COMMANDS = ("*WAI", "*OPC?", "CALC:DATA?")
 
-def start_simulated_instrument():
+
+def new_instrument_state():
+    """
+    new_instrument_state creates the settings held by the simulated instrument for one connection
+    :return: A dictionary of instrument settings
+    """
+    return {
+        'points': 100,
+        'start': 1e3,
+        'stop': 6e9,
+        'format': 'ASC',
+        'byte_order': 'NORM',
+        'errors': [],
+    }
+
+
+def simulated_trace(state):
+    """
+    simulated_trace generates a complex sweep of a lossy delay line over the current frequency settings
+    :param state: The instrument settings dictionary
+    :return: A complex numpy array with one value per sweep point
+    """
+    frequency = np.linspace(state['start'], state['stop'], state['points'])
+    loss = 10 ** (-0.5e-9 * np.sqrt(frequency) / 20)
+    return loss * np.exp(-2j * np.pi * frequency * 5e-9)
+
+
+def encode_trace(state, trace):
+    """
+    encode_trace encodes a complex trace in the current data format, as ASCII or an IEEE 488.2 block
+    :param state: The instrument settings dictionary
+    :param trace: The complex numpy array to encode
+    :return: The encoded response bytes, without the terminator
+    """
+    interleaved = trace.view(np.float64)
+    if state['format'].startswith('REAL'):
+        dtype = '<f8' if state['byte_order'] == 'SWAP' else '>f8'
+        payload = interleaved.astype(dtype).tobytes()
+        length = str(len(payload))
+        return f"#{len(length)}{length}".encode('ascii') + payload
+    return ','.join(f"{value:.12e}" for value in interleaved).encode('ascii')
+
+
+def parse_command(command):
+    """
+    parse_command splits a single SCPI command into its normalised header and argument
+    :param command: A single SCPI command string with the terminator removed
+    :return: A tuple of the upper case header and the argument string
+    """
+    header, _, argument = command.partition(' ')
+    return header.upper().lstrip(':'), argument.strip()
+
+
+def handle_command(state, command):
+    """
+    handle_command updates the instrument settings and generates the simulated response to a single SCPI command
+    :param state: The instrument settings dictionary for this connection
+    :param command: A single SCPI command string with the terminator removed
+    :return: The response bytes for queries, or None for write-only commands
+    """
+    header, argument = parse_command(command)
+
+    if header == "SENS:SWE:POIN":
+        state['points'] = int(float(argument))
+    elif header == "SENS:FREQ:START":
+        state['start'] = float(argument)
+    elif header == "SENS:FREQ:STOP":
+        state['stop'] = float(argument)
+    elif header == "FORM:DATA":
+        state['format'] = argument.upper()
+    elif header == "FORM:BORD":
+        state['byte_order'] = argument.upper()
+    elif header == "SYST:PRES":
+        state.update(new_instrument_state())
+    elif header == "*OPC?":
+        return b"1"
+    elif header == "SYST:ERR?":
+        return (state['errors'].pop(0) if state['errors'] else '0,"No error"').encode('utf-8')
+    elif header == "*IDN?":
+        return b"SCPI,MOCK LAN,VERSION_1.0"
+    elif header == "CALC:DATA?":
+        return encode_trace(state, simulated_trace(state))
+    elif header.endswith('?'):
+        return f"Simulated response to {command}".encode('utf-8')
+    return None
+
+
+def split_commands(buffer):
+    """
+    split_commands splits the received data into newline terminated messages and semicolon separated commands
+    :param buffer: A bytearray of received data, complete messages are removed from it
+    :return: A list of the complete commands received, messages that are not valid UTF-8 are skipped
+    """
+    commands = []
+    while True:
+        index = buffer.find(b'\n')
+        if index < 0:
+            break
+        try:
+            message = bytes(buffer[:index]).decode('utf-8')
+        except UnicodeDecodeError:
+            message = ''
+        del buffer[:index + 1]
+        commands += [command.strip() for command in message.split(';') if command.strip()]
+    return commands
+
+
+def new_simulation_settings(command_latency=0.0, sweep_time=0.0, bandwidth=None):
+    """
+    new_simulation_settings creates the timing model shared by all simulated instruments
+    :param command_latency: The processing time of every command in seconds
+    :param sweep_time: The time taken by a triggered sweep or calibration standard in seconds
+    :param bandwidth: The LAN throughput in bytes per second, or None for unlimited
+    :return: A dictionary of simulation settings
+    """
+    return {
+        'command_latency': command_latency,
+        'sweep_time': sweep_time,
+        'bandwidth': bandwidth,
+    }
+
+
+async def serve_client(reader, writer, settings, verbose=False):
+    """
+    serve_client handles one client connection, each connection has its own instrument state and sweep timing
+    :param reader: The asyncio StreamReader of the connection
+    :param writer: The asyncio StreamWriter of the connection
+    :param settings: The simulation settings dictionary
+    :param verbose: True to print every command received
+    :return: NULL
+    """
+    loop = asyncio.get_running_loop()
+    addr = writer.get_extra_info('peername')
+    if verbose:
+        print(f"Connection from {addr}")
+    state = new_instrument_state()
+    busy_until = 0.0
+    buffer = bytearray()
+
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            buffer += data
+            for command in split_commands(buffer):
+                if verbose:
+                    print(f"Received command: {command}")
+                if settings['command_latency']:
+                    await asyncio.sleep(settings['command_latency'])
+
+                # Hold waiting commands until the last triggered sweep has finished
+                header, _ = parse_command(command)
+                if header in WAIT_COMMANDS and busy_until > loop.time():
+                    await asyncio.sleep(busy_until - loop.time())
+                if header in SWEEP_COMMANDS or header.startswith("CALIBRATION:"):
+                    busy_until = loop.time() + settings['sweep_time']
+
+                # Respond with simulated data to queries, write-only commands are acknowledged silently. A bad
+                # argument is queued as an SCPI error for SYST:ERR? instead of dropping the connection
+                try:
+                    response = handle_command(state, command)
+                except ValueError as e:
+                    state['errors'].append(f'-224,"Illegal parameter value; {e}"')
+                    if verbose:
+                        print(f"Rejected command: {command} ({e})")
+                    continue
+                if response is not None:
+                    response += b'\n'
+                    if settings['bandwidth']:
+                        await asyncio.sleep(len(response) / settings['bandwidth'])
+                    writer.write(response)
+                    await writer.drain()
+
+    except ConnectionError:
+        pass
+
+    finally:
+        writer.close()
+        if verbose:
+            print(f"Connection from {addr} closed")
+
+
+async def serve_simulated_instruments(host='127.0.0.1', port=5025, count=1, settings=None, verbose=False):
+    """
+    serve_simulated_instruments serves any number of concurrent clients on each of count simulated instruments,
+    listening on consecutive ports starting at port
+    :param host: The IP address to listen on
+    :param port: The port of the first simulated instrument
+    :param count: The number of simulated instruments
+    :param settings: The simulation settings dictionary, or None for no added latency
+    :param verbose: True to print every connection and command
+    :return: NULL
+    """
+    if settings is None:
+        settings = new_simulation_settings()
+
+    async def handler(reader, writer):
+        await serve_client(reader, writer, settings, verbose)
+
+    servers = [await asyncio.start_server(handler, host, port + i) for i in range(count)]
+    print(f"Listening on {host}:{port}" if count == 1 else f"Listening on {host}:{port}-{port + count - 1}")
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        for server in servers:
+            server.close()
+
+
+def start_simulated_instrument(host='127.0.0.1', port=5025, count=1, command_latency=0.0, sweep_time=0.0,
+                               bandwidth=None, verbose=True):
     """
     start_simulated_instrument initiates the simulated instrument, including opening the socket connection and
+    serving clients until interrupted
+    :param host: The IP address to listen on
+    :param port: The port of the first simulated instrument
+    :param count: The number of simulated instruments
+    :param command_latency: The processing time of every command in seconds
+    :param sweep_time: The time taken by a triggered sweep or calibration standard in seconds
+    :param bandwidth: The LAN throughput in bytes per second, or None for unlimited
+    :param verbose: True to print every connection and command
     :return: NULL
     """
     rm = pyvisa.ResourceManager('C:/Users/dylan/Documents/Thesis - Python/Thesis - Calibration/instrument.yaml@sim')
     print(rm.list_resources())
     instrument = rm.open_resource('ASRL1::INSTR')
 
-    # Setup TCP/IP server for communication
-    host = '127.0.0.1'
-    port = 5025
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((host, port))
-    server_socket.listen(1)
-    print(f"Listening on {host}:{port}")
-
+    # Setup TCP/IP servers for communication
+    settings = new_simulation_settings(command_latency, sweep_time, bandwidth)
     try:
-        while True:
-            client_socket, addr = server_socket.accept()
-            print(f"Connection from {addr}")
-            while True:
-                data = client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
-                print(f"Received command: {data}")
-                # Respond with simulated data or acknowledge the command
-                response = f"Simulated response to {data}"
-                client_socket.sendall(response.encode('utf-8'))
-            client_socket.close()
+        asyncio.run(serve_simulated_instruments(host, port, count, settings, verbose))
+
+    except KeyboardInterrupt:
+        pass
 
     except Exception as e:
         print(f"An error occurred: {e}")
 
     finally:
         instrument.close()
-        server_socket.close()
         print("Instrument connection closed.")
 
 
 if __name__ == "__main__":
-    start_simulated_instrument()
-
-
+    parser = argparse.ArgumentParser(description="Simulated VNA SCPI server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5025)
+    parser.add_argument('--count', type=int, default=1, help="number of instruments on consecutive ports")
+    parser.add_argument('--latency', type=float, default=0.0, help="per-command latency in seconds")
+    parser.add_argument('--sweep-time', type=float, default=0.0, help="sweep time in seconds")
+    parser.add_argument('--bandwidth', type=float, default=None, help="throughput in bytes per second")
+    parser.add_argument('--quiet', action='store_true', help="do not print every command")
+    args = parser.parse_args()
+    start_simulated_instrument(args.host, args.port, args.count, args.latency, args.sweep_time,
+                               args.bandwidth, not args.quiet)
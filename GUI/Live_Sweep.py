@@ -0,0 +1,222 @@
+# =========================================================================
+#           VNA Calibration Device Live Sweep Display
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import threading
+import time
+import numpy as np
+import skrf as rf
+from SCPI_Session import SCPISession, fetch_trace
+
+
+class LiveSweepView:
+    """
+    LiveSweepView draws the Smith chart grid and magnitude axes once, caches them as a background and updates the
+    traces in place with blitting
+    """
+
+    def __init__(self, fig, smith_ax, mag_ax, canvas, label='S21'):
+        """
+        __init__ draws the static parts of the chart and creates the animated traces
+        :param fig: The matplotlib Figure holding both axes
+        :param smith_ax: The axes to draw the Smith chart on
+        :param mag_ax: The axes to draw the log magnitude on
+        :param canvas: The FigureCanvasTkAgg displaying the figure
+        :param label: The name of the measured parameter
+        :return: NULL
+        """
+        self.fig = fig
+        self.smith_ax = smith_ax
+        self.mag_ax = mag_ax
+        self.canvas = canvas
+        self.background = None
+        self._scaled = False
+
+        rf.plotting.smith(ax=smith_ax, draw_labels=True)
+        smith_ax.set_title(f'Smith Chart ({label})')
+        mag_ax.set_title(f'Log Magnitude ({label})')
+        mag_ax.set_xlabel('Frequency (Hz)')
+        mag_ax.set_ylabel('Magnitude (dB)')
+        mag_ax.grid(True)
+
+        self.smith_line, = smith_ax.plot([], [], color='C0', animated=True)
+        self.mag_line, = mag_ax.plot([], [], color='C0', animated=True)
+
+        # Recapture the background whenever the figure is fully redrawn, e.g. after a resize
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.draw()
+
+    def _on_draw(self, event):
+        """
+        _on_draw caches the static background and redraws the traces on top of it
+        :param event: The matplotlib draw event
+        :return: NULL
+        """
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_traces()
+
+    def _draw_traces(self):
+        """
+        _draw_traces draws only the animated traces
+        :return: NULL
+        """
+        self.smith_ax.draw_artist(self.smith_line)
+        self.mag_ax.draw_artist(self.mag_line)
+
+    def update(self, frequency, trace):
+        """
+        update replaces the trace data and blits the changed traces onto the cached background. The background is
+        only redrawn when the magnitude axes have to be rescaled
+        :param frequency: The sweep frequency points in Hz
+        :param trace: The complex sweep data
+        :return: NULL
+        """
+        magnitude = 20 * np.log10(np.abs(trace) + 1e-15)
+        self.smith_line.set_data(trace.real, trace.imag)
+        self.mag_line.set_data(frequency, magnitude)
+
+        if self._rescale(frequency, magnitude) or self.background is None:
+            self.canvas.draw()
+            return
+
+        self.canvas.restore_region(self.background)
+        self._draw_traces()
+        self.canvas.blit(self.fig.bbox)
+
+    def _rescale(self, frequency, magnitude):
+        """
+        _rescale widens the magnitude axes limits when the new data falls outside them
+        :param frequency: The sweep frequency points in Hz
+        :param magnitude: The sweep log magnitude in dB
+        :return: True if the limits changed, otherwise False
+        """
+        changed = False
+        if len(frequency) and self.mag_ax.get_xlim() != (frequency[0], frequency[-1]):
+            self.mag_ax.set_xlim(frequency[0], frequency[-1])
+            changed = True
+        finite = magnitude[np.isfinite(magnitude)]
+        if len(finite):
+            low, high = self.mag_ax.get_ylim()
+            if not self._scaled or finite.min() < low or finite.max() > high:
+                margin = max(1.0, 0.1 * (finite.max() - finite.min()))
+                self.mag_ax.set_ylim(finite.min() - margin, finite.max() + margin)
+                self._scaled = True
+                changed = True
+        return changed
+
+
+class LiveSweep:
+    """
+    LiveSweep continuously triggers sweeps and fetches traces on a background thread. Only the newest trace is
+    kept, and the Tk mainloop draws it at the target frame rate, so slow drawing never backs up the instrument
+    """
+
+    def __init__(self, root, view, start_freq, end_freq, host='127.0.0.1', port=5025, frame_rate=20.0,
+                 log=None, on_error=None):
+        """
+        __init__ stores the sweep settings, call start to begin streaming
+        :param root: The Tk root window used to schedule frame updates
+        :param view: The LiveSweepView to draw to
+        :param start_freq: The starting frequency value in Hz
+        :param end_freq: The ending frequency value in Hz
+        :param host: The IP address of the VNA
+        :param port: The SCPI socket port of the VNA
+        :param frame_rate: The target number of display updates per second
+        :param log: An optional callable taking a string, used to report errors
+        :param on_error: An optional callable taking the error message, called on the Tk mainloop when sweeping
+        fails, e.g. to close the window
+        :return: NULL
+        """
+        self.root = root
+        self.view = view
+        self.start_freq = start_freq
+        self.end_freq = end_freq
+        self.session = SCPISession(host, port)
+        self.frame_interval_ms = max(1, int(1000 / frame_rate))
+        self.log = log
+        self.sweeps = 0
+        self.frames = 0
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.on_error = on_error
+        self.error = None
+
+    def start(self):
+        """
+        start begins fetching sweeps and updating the display
+        :return: NULL
+        """
+        self._stop.clear()
+        self.error = None
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._acquire, name='live-sweep', daemon=True)
+        self._thread.start()
+        self.root.after(self.frame_interval_ms, self._draw_frame)
+
+    def stop(self):
+        """
+        stop ends streaming and closes the connection used for live sweeps
+        :return: NULL
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+            self._thread = None
+        self.session.close()
+
+    @property
+    def rates(self):
+        """
+        rates reports the sweeps fetched and frames drawn per second since start
+        :return: A tuple of the sweep rate and the frame rate
+        """
+        elapsed = time.perf_counter() - self._started if self._started else 0
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return self.sweeps / elapsed, self.frames / elapsed
+
+    def _acquire(self):
+        """
+        _acquire triggers and fetches sweeps until stopped, replacing the latest trace each time
+        :return: NULL
+        """
+        try:
+            self.session.write(":TRIG:SOUR BUS", f"SENS:FREQ:START {self.start_freq}",
+                               f"SENS:FREQ:STOP {self.end_freq}")
+            while not self._stop.is_set():
+                self.session.write(":TRIG:SING")
+                self.session.query("*OPC?")
+                trace = fetch_trace(self.session)
+                frequency = np.linspace(self.start_freq, self.end_freq, len(trace))
+                with self._lock:
+                    self._latest = (frequency, trace)
+                self.sweeps += 1
+        except Exception as e:
+            if not self._stop.is_set():
+                self.error = str(e) or type(e).__name__
+                if self.log is not None:
+                    self.log(f"Live sweep stopped: {self.error}")
+            self._stop.set()
+
+    def _draw_frame(self):
+        """
+        _draw_frame draws the newest trace if one has arrived since the last frame, then reschedules itself. A
+        failure of the sweep thread is handed to on_error here, on the Tk mainloop
+        :return: NULL
+        """
+        if self._stop.is_set():
+            if self.error is not None and self.on_error is not None:
+                self.on_error(self.error)
+            return
+        with self._lock:
+            latest = self._latest
+            self._latest = None
+        if latest is not None:
+            self.view.update(*latest)
+            self.frames += 1
+        self.root.after(self.frame_interval_ms, self._draw_frame)
@@ -0,0 +1,147 @@
+# =========================================================================
+#           VNA Calibration Device Bounded SCPI Log
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import queue
+import threading
+import tkinter as tk
+from collections import deque
+
+
+class LogFileSink:
+    """
+    LogFileSink appends log lines to a file from a background thread so disk writes never block the GUI
+    """
+
+    def __init__(self, path, flush_lines=256):
+        """
+        __init__ opens the log file and starts the writer thread
+        :param path: The path of the log file, lines are appended
+        :param flush_lines: The maximum number of lines written between file flushes
+        :return: NULL
+        """
+        self.flush_lines = flush_lines
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='log-file-sink', daemon=True)
+        self._thread.start()
+
+    def write(self, lines):
+        """
+        write queues lines to be appended to the file
+        :param lines: A list of text strings
+        :return: NULL
+        """
+        if lines:
+            self._queue.put(lines)
+
+    def close(self):
+        """
+        close writes any queued lines and closes the file
+        :return: NULL
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        """
+        _run writes queued lines to the file until closed, flushing once the queue is drained
+        :return: NULL
+        """
+        pending = 0
+        while True:
+            lines = self._queue.get()
+            if lines is None:
+                break
+            self._file.write('\n'.join(lines) + '\n')
+            pending += len(lines)
+            if pending >= self.flush_lines or self._queue.empty():
+                self._file.flush()
+                pending = 0
+        self._file.flush()
+
+
+class LogBuffer:
+    """
+    LogBuffer keeps the most recent log lines in a ring buffer and copies new lines to a text widget in batches on
+    a timer. Lines can be added from any thread, the widget is only touched from the Tk mainloop
+    """
+
+    def __init__(self, max_lines=2000, flush_interval_ms=100, sink=None):
+        """
+        __init__ creates an empty log
+        :param max_lines: The maximum number of lines kept in memory and displayed
+        :param flush_interval_ms: The time between widget updates in milliseconds
+        :param sink: An optional LogFileSink receiving every line
+        :return: NULL
+        """
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.sink = sink
+        self.lines = deque(maxlen=max_lines)
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._widget = None
+        self._root = None
+        self._widget_lines = 0
+
+    def append(self, message):
+        """
+        append adds a line to the log, safe to call from any thread
+        :param message: A text string to be added to log
+        :return: NULL
+        """
+        with self._lock:
+            self.lines.append(message)
+            self._pending.append(message)
+            # Lines beyond the cap would be trimmed from the widget straight away, so never queue them
+            if len(self._pending) > self.max_lines:
+                self._pending.popleft()
+        if self.sink is not None:
+            self.sink.write([message])
+
+    def attach(self, root, widget):
+        """
+        attach starts copying the log to a text widget in batches
+        :param root: The Tk root window used to schedule flushes
+        :param widget: The ScrolledText or Text widget displaying the log
+        :return: NULL
+        """
+        self._root = root
+        self._widget = widget
+        self._root.after(self.flush_interval_ms, self._flush)
+
+    def clear(self):
+        """
+        clear removes all lines from the log and the widget
+        :return: NULL
+        """
+        with self._lock:
+            self.lines.clear()
+            self._pending.clear()
+        if self._widget is not None:
+            self._widget.delete('1.0', tk.END)
+            self._widget_lines = 0
+
+    def _flush(self):
+        """
+        _flush inserts the pending lines into the widget with a single insert and trims the widget to max_lines
+        :return: NULL
+        """
+        with self._lock:
+            batch = list(self._pending)
+            self._pending.clear()
+
+        if batch:
+            self._widget.insert(tk.END, '\n'.join(batch) + '\n')
+            self._widget_lines += sum(message.count('\n') + 1 for message in batch)
+            excess = self._widget_lines - self.max_lines
+            if excess > 0:
+                self._widget.delete('1.0', f'{excess + 1}.0')
+                self._widget_lines = self.max_lines
+            self._widget.see(tk.END)
+
+        self._root.after(self.flush_interval_ms, self._flush)
@@ -0,0 +1,324 @@
+# =========================================================================
+#           VNA Calibration Device Multi-Instrument Orchestration
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from SCPI_Session import SETUP_COMMANDS, frequency_commands, standard_commands
+from Timing import RunTimer
+
+DEFAULT_PORT = 5025
+STANDARD_METHODS = ["Short", "Open", "Load", "Thru"]
+
+
+class AsyncSCPISession:
+    """
+    AsyncSCPISession is the asyncio counterpart of SCPISession, so many instruments can be driven from one event
+    loop. Write-only commands are buffered and sent together, only queries wait for the instrument
+    """
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT, timeout=10.0, log=None):
+        """
+        __init__ stores the connection details, the connection is opened by connect
+        :param host: The IP address of the VNA
+        :param port: The SCPI socket port of the VNA
+        :param timeout: The timeout of connecting and of each query in seconds
+        :param log: An optional callable taking a string, used to log sent and received messages
+        :return: NULL
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.log = log
+        self.reader = None
+        self.writer = None
+        self._pending = []
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def connect(self):
+        """
+        connect opens the connection to the VNA if it is not already open
+        :return: NULL
+        """
+        if self.writer is not None:
+            return
+        self.reader, self.writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port),
+                                                          self.timeout)
+        self.writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    async def close(self):
+        """
+        close flushes any buffered commands and closes the connection
+        :return: NULL
+        """
+        if self.writer is None:
+            return
+        writer = self.writer
+        try:
+            await self.flush()
+        finally:
+            self.reader = self.writer = None
+            self._pending.clear()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    def write(self, *commands):
+        """
+        write buffers one or more write-only commands, they are sent on the next flush or query
+        :param commands: SCPI command strings, with or without a trailing newline
+        :return: NULL
+        """
+        for command in commands:
+            command = command.strip()
+            if command:
+                self._pending.append(command)
+
+    async def flush(self):
+        """
+        flush sends all buffered write-only commands back-to-back in a single write
+        :return: NULL
+        """
+        if not self._pending:
+            return
+        await self.connect()
+        self.writer.write(''.join(command + '\n' for command in self._pending).encode('utf-8'))
+        await self.writer.drain()
+        if self.log is not None:
+            for command in self._pending:
+                self.log(f"Sent: {command}")
+        self._pending.clear()
+
+    async def query(self, command):
+        """
+        query sends any buffered commands followed by a query, and waits for its single line response
+        :param command: The SCPI query string, e.g. "*OPC?"
+        :return: The decoded response with the terminator removed
+        """
+        self.write(command)
+        await self.flush()
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise ConnectionError("Connection closed by instrument")
+        response = line.decode('utf-8').strip()
+        if self.log is not None:
+            self.log(f"Received: {response}")
+        return response
+
+
+class InstrumentRun:
+    """
+    InstrumentRun holds the state, progress and stage timings of one instrument in a multi-instrument calibration
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT):
+        """
+        __init__ creates a pending run for an instrument
+        :param host: The IP address of the VNA
+        :param port: The SCPI socket port of the VNA
+        :return: NULL
+        """
+        self.host = host
+        self.port = port
+        self.name = f"{host}:{port}"
+        self.state = 'pending'
+        self.progress = 0.0
+        self.error = None
+        self.elapsed = None
+        self.timer = RunTimer(self.name)
+
+    @property
+    def finished(self):
+        """
+        finished reports whether the run has stopped, successfully or not
+        :return: True if done, failed or cancelled, otherwise False
+        """
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def summary(self):
+        """
+        summary gives the run as plain data, safe to pass between threads
+        :return: A dict of the instrument name, state, progress, error, elapsed time and stage timings
+        """
+        return {'name': self.name, 'state': self.state, 'progress': self.progress, 'error': self.error,
+                'elapsed': self.elapsed, 'stages': self.timer.stages()}
+
+
+def parse_endpoint(endpoint, default_port=DEFAULT_PORT):
+    """
+    parse_endpoint reads an instrument address written as host or host:port
+    :param endpoint: The address string, e.g. "192.168.0.10:5025"
+    :param default_port: The port used when none is given
+    :return: A tuple of the host and port
+    """
+    host, separator, port = endpoint.strip().rpartition(':')
+    if not separator:
+        host, port = port, default_port
+    if not host:
+        raise ValueError(f"No host in VNA endpoint {endpoint!r}")
+    return host, int(port)
+
+
+def parse_endpoints(text, default_port=DEFAULT_PORT):
+    """
+    parse_endpoints reads a comma or whitespace separated list of instrument addresses
+    :param text: The address list, e.g. "127.0.0.1:5025, 127.0.0.1:5026"
+    :param default_port: The port used when none is given
+    :return: A list of (host, port) tuples
+    """
+    return [parse_endpoint(endpoint, default_port) for endpoint in text.replace(',', ' ').split()]
+
+
+async def calibrate_instrument(run, methods, start_freq, end_freq, cancel_event=None, on_update=None,
+                               timeout=10.0, log=None):
+    """
+    calibrate_instrument runs setup, frequency configuration and the standard sequence on one instrument. Any
+    failure is recorded on the run rather than raised, so it never stops the other instruments
+    :param run: The InstrumentRun of the instrument, updated as the calibration progresses
+    :param methods: The list of calibration standards to measure
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :param cancel_event: An optional threading.Event, when set the run stops before the next standard
+    :param on_update: An optional callable taking the run, called on every change of state or progress
+    :param timeout: The timeout of connecting and of each query in seconds
+    :param log: An optional callable taking a string, used to log SCPI traffic tagged with the instrument
+    :return: The run
+    """
+    def update(state, progress=None):
+        run.state = state
+        if progress is not None:
+            run.progress = progress
+        if on_update is not None:
+            on_update(run)
+
+    def cancelled():
+        if cancel_event is not None and cancel_event.is_set():
+            update('cancelled')
+            return True
+        return False
+
+    session_log = None if log is None else (lambda message: log(f"[{run.name}] {message}"))
+    session = AsyncSCPISession(run.host, run.port, timeout, session_log)
+    start = time.perf_counter()
+    try:
+        update('connecting')
+        with run.timer.span('connect'):
+            await session.connect()
+
+        update('setup')
+        with run.timer.span('vna_setup'):
+            session.write(*SETUP_COMMANDS)
+            await session.query("*OPC?")
+        with run.timer.span('frequency_range'):
+            session.write(*frequency_commands(start_freq, end_freq))
+            await session.flush()
+
+        for i, method in enumerate(methods):
+            if cancelled():
+                return run
+            update(f"measuring {method}")
+            with run.timer.span(f"measure_{method.lower()}"):
+                session.write(*standard_commands(method))
+                await session.query("*OPC?")
+            update(run.state, 100 * (i + 1) / len(methods))
+
+        if not cancelled():
+            update('done', 100.0)
+
+    except Exception as e:
+        run.error = str(e) or type(e).__name__
+        update('failed')
+
+    finally:
+        run.elapsed = time.perf_counter() - start
+        try:
+            await session.close()
+        except (OSError, asyncio.TimeoutError):
+            pass
+    return run
+
+
+async def calibrate_all(endpoints, methods, start_freq, end_freq, cancel_event=None, on_update=None, timeout=10.0,
+                        log=None):
+    """
+    calibrate_all calibrates every instrument concurrently on the running event loop, so the total time
+    approaches that of the slowest instrument
+    :param endpoints: A list of (host, port) tuples
+    :param methods: The list of calibration standards to measure
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :param cancel_event: An optional threading.Event, when set every run stops before its next standard
+    :param on_update: An optional callable taking the list of runs, called whenever any run changes
+    :param timeout: The timeout of connecting and of each query in seconds
+    :param log: An optional callable taking a string, used to log SCPI traffic
+    :return: The list of InstrumentRun, in the order of endpoints
+    """
+    runs = [InstrumentRun(host, port) for host, port in endpoints]
+    notify = None if on_update is None else (lambda run: on_update(runs))
+    await asyncio.gather(*(calibrate_instrument(run, methods, start_freq, end_freq, cancel_event, notify, timeout,
+                                                log) for run in runs))
+    return runs
+
+
+def run_calibrations(endpoints, methods, start_freq, end_freq, cancel_event=None, on_update=None, timeout=10.0,
+                     log=None):
+    """
+    run_calibrations is a blocking handler for calibrate_all, for the GUI calibration worker and the command line
+    :param endpoints: A list of (host, port) tuples
+    :param methods: The list of calibration standards to measure
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :param cancel_event: An optional threading.Event, when set every run stops before its next standard
+    :param on_update: An optional callable taking the list of runs, called whenever any run changes
+    :param timeout: The timeout of connecting and of each query in seconds
+    :param log: An optional callable taking a string, used to log SCPI traffic
+    :return: The list of InstrumentRun, in the order of endpoints
+    """
+    return asyncio.run(calibrate_all(endpoints, methods, start_freq, end_freq, cancel_event, on_update, timeout,
+                                     log))
+
+
+def print_summary(runs, wall_time):
+    """
+    print_summary prints the outcome and stage timings of each instrument
+    :param runs: The list of InstrumentRun
+    :param wall_time: The total time of the calibration in seconds
+    :return: NULL
+    """
+    for run in runs:
+        stages = ', '.join(f"{name} {seconds * 1e3:.1f} ms" for name, seconds in run.timer.stages().items())
+        outcome = run.state if run.error is None else f"{run.state}: {run.error}"
+        print(f"{run.name:<22} {outcome:<12} {run.elapsed * 1e3:9.1f} ms  {stages}")
+    slowest = max(run.elapsed for run in runs)
+    print(f"{len(runs)} instruments in {wall_time * 1e3:.1f} ms, slowest instrument {slowest * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calibrate several VNAs concurrently")
+    parser.add_argument('endpoints', nargs='+', help="instrument addresses as host or host:port")
+    parser.add_argument('--methods', nargs='+', default=STANDARD_METHODS, help="calibration standards to measure")
+    parser.add_argument('--start', type=float, default=1e3, help="start frequency in Hz")
+    parser.add_argument('--stop', type=float, default=6e9, help="stop frequency in Hz")
+    parser.add_argument('--timeout', type=float, default=10.0, help="connect and query timeout in seconds")
+    parser.add_argument('--verbose', action='store_true', help="print all SCPI traffic")
+    args = parser.parse_args()
+
+    endpoints = [parse_endpoint(endpoint) for endpoint in args.endpoints]
+    start = time.perf_counter()
+    runs = run_calibrations(endpoints, args.methods, args.start, args.stop, timeout=args.timeout,
+                            log=print if args.verbose else None)
+    print_summary(runs, time.perf_counter() - start)
+    sys.exit(0 if all(run.state == 'done' for run in runs) else 1)
@@ -0,0 +1,345 @@
+# =========================================================================
+#           VNA Calibration Device Persistent SCPI Session
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import socket
+import time
+import numpy as np
+
+# Set-up commands for the VNA, sent back-to-back with a single wait for completion
+SETUP_COMMANDS = [
+    "SYST:PRES", "SENS:SWE:POIN 100", "CALC:PAR1:DEF S21",
+    "CALC:PAR1:SEL", "CALC:FORM MLOG", "SENS:BAND 10",
+    ":TRIG:SOUR BUS", ":TRIG:SING"
+]
+
+
+def frequency_commands(start_freq, end_freq):
+    """
+    frequency_commands gives the write-only commands setting the VNA operating frequency range
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :return: A list of SCPI command strings
+    """
+    return [f"SENS:FREQ:START {start_freq}", f"SENS:FREQ:STOP {end_freq}"]
+
+
+def standard_commands(method):
+    """
+    standard_commands gives the write-only commands measuring a calibration standard, followed by *OPC? to wait
+    :param method: The calibration standard, e.g. "Short"
+    :return: A list of SCPI command strings
+    """
+    return [f"CALIBRATION:{method.upper()}", "*WAI"]
+
+
+class SCPISession:
+    """
+    SCPISession holds a single LAN connection to the VNA open across calibrations. Write-only commands are
+    buffered and sent back-to-back in one packet, and the socket is only read when a query returns something
+    """
+
+    def __init__(self, host='127.0.0.1', port=5025, timeout=10.0, log=None):
+        """
+        __init__ stores the connection details, the socket is opened lazily on first use
+        :param host: The IP address of the VNA
+        :param port: The SCPI socket port of the VNA
+        :param timeout: The socket timeout in seconds
+        :param log: An optional callable taking a string, used to log sent and received messages
+        :return: NULL
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.log = log
+        self.connection = None
+        self._pending = []
+        self._buffer = bytearray()
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def connected(self):
+        """
+        connected reports whether the session currently holds an open socket
+        :return: True if connected, otherwise False
+        """
+        return self.connection is not None
+
+    def connect(self):
+        """
+        connect opens the socket to the VNA if it is not already open
+        :return: NULL
+        """
+        if self.connection is not None:
+            return
+        connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connection = connection
+        self._buffer.clear()
+
+    def close(self):
+        """
+        close flushes any buffered commands and closes the socket
+        :return: NULL
+        """
+        if self.connection is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.connection.close()
+            self.connection = None
+            self._pending.clear()
+            self._buffer.clear()
+
+    def write(self, *commands):
+        """
+        write buffers one or more write-only commands, they are sent on the next flush or query
+        :param commands: SCPI command strings, with or without a trailing newline
+        :return: NULL
+        """
+        for command in commands:
+            command = command.strip()
+            if command:
+                self._pending.append(command)
+
+    def flush(self):
+        """
+        flush sends all buffered write-only commands back-to-back in a single sendall
+        :return: NULL
+        """
+        if not self._pending:
+            return
+        self.connect()
+        payload = ''.join(command + '\n' for command in self._pending)
+        self.connection.sendall(payload.encode('utf-8'))
+        if self.log is not None:
+            for command in self._pending:
+                self.log(f"Sent: {command}")
+        self._pending.clear()
+
+    def query(self, command):
+        """
+        query sends any buffered commands followed by a query, and waits for its single line response
+        :param command: The SCPI query string, e.g. "*OPC?"
+        :return: The decoded response with the terminator removed
+        """
+        self.write(command)
+        self.flush()
+        response = self.read_line()
+        if self.log is not None:
+            self.log(f"Received: {response}")
+        return response
+
+    def query_block(self, command):
+        """
+        query_block sends any buffered commands followed by a query that returns an IEEE 488.2 definite-length
+        block, e.g. "CALC:DATA? SDATA" with FORM:DATA REAL,64
+        :param command: The SCPI query string
+        :return: A bytearray holding only the block payload
+        """
+        self.write(command)
+        self.flush()
+        block = self.read_block()
+        if self.log is not None:
+            self.log(f"Received: <{len(block)} byte block>")
+        return block
+
+    def read_line(self):
+        """
+        read_line reads from the socket until a newline terminated response is available
+        :return: The decoded response with the terminator removed
+        """
+        start = 0
+        while True:
+            index = self._buffer.find(b'\n', start)
+            if index >= 0:
+                line = bytes(self._buffer[:index])
+                del self._buffer[:index + 1]
+                return line.decode('utf-8').strip()
+            start = len(self._buffer)
+            self._receive()
+
+    def read_block(self):
+        """
+        read_block reads an IEEE 488.2 definite-length block (#<n><length><payload>). The payload is received
+        straight into a preallocated buffer so it can be wrapped by np.frombuffer without further copies
+        :return: A bytearray holding only the block payload
+        """
+        while len(self._buffer) < 2:
+            self._receive()
+        if self._buffer[0:1] != b'#':
+            raise ValueError(f"Expected definite-length block, received {bytes(self._buffer[:16])!r}")
+        digits = int(self._buffer[1:2])
+        if digits == 0:
+            raise ValueError("Indefinite-length blocks are not supported")
+        while len(self._buffer) < 2 + digits:
+            self._receive()
+        length = int(self._buffer[2:2 + digits])
+        del self._buffer[:2 + digits]
+
+        # Move any payload already buffered, then receive the remainder directly into place
+        payload = bytearray(length)
+        view = memoryview(payload)
+        received = min(length, len(self._buffer))
+        view[:received] = self._buffer[:received]
+        del self._buffer[:received]
+        while received < length:
+            count = self.connection.recv_into(view[received:])
+            if count == 0:
+                self.connection.close()
+                self.connection = None
+                raise ConnectionError("Connection closed by instrument")
+            received += count
+        view.release()
+
+        # Consume the message terminator following the block
+        while not self._buffer:
+            self._receive()
+        if self._buffer[0:1] == b'\n':
+            del self._buffer[:1]
+        return payload
+
+    def _receive(self):
+        """
+        _receive reads the next available chunk from the socket into the receive buffer
+        :return: NULL
+        """
+        chunk = self.connection.recv(65536)
+        if not chunk:
+            self.connection.close()
+            self.connection = None
+            raise ConnectionError("Connection closed by instrument")
+        self._buffer += chunk
+
+
+def fetch_trace(connection, binary=True):
+    """
+    fetch_trace fetches the complex sweep data of the active trace from the VNA
+    :param connection: The SCPISession connected to the VNA
+    :param binary: True to transfer REAL,64 blocks, False to transfer and parse ASCII
+    :return: A complex numpy array with one value per sweep point
+    """
+    if binary:
+        # Little-endian doubles, decoded in place as interleaved real and imaginary values
+        connection.write("FORM:DATA REAL,64", "FORM:BORD SWAP")
+        block = connection.query_block("CALC:DATA? SDATA")
+        return np.frombuffer(block, dtype='<c16')
+
+    connection.write("FORM:DATA ASC")
+    response = connection.query("CALC:DATA? SDATA")
+    values = np.array(response.split(','), dtype=float)
+    return values[0::2] + 1j * values[1::2]
+
+
+def legacy_round_trips(host, port, commands):
+    """
+    legacy_round_trips replays the original per-command path, a fresh socket with one blocking round trip per
+    command. Write-only commands have no response, so each is paired with *OPC? to force the round trip
+    :param host: The IP address of the VNA
+    :param port: The SCPI socket port of the VNA
+    :param commands: The list of SCPI command strings to send
+    :return: NULL
+    """
+    connection = socket.create_connection((host, port))
+    try:
+        for command in commands:
+            command = command.strip()
+            if not command.endswith('?'):
+                command += ';*OPC?'
+            connection.sendall((command + '\n').encode('utf-8'))
+            response = b''
+            while not response.endswith(b'\n'):
+                chunk = connection.recv(1024)
+                if not chunk:
+                    raise ConnectionError("Connection closed by instrument")
+                response += chunk
+    finally:
+        connection.close()
+
+
+def pipelined_commands(session, commands):
+    """
+    pipelined_commands sends the same command list through a persistent session, only waiting on queries
+    :param session: An SCPISession instance
+    :param commands: The list of SCPI command strings to send
+    :return: NULL
+    """
+    for command in commands:
+        if command.strip().endswith('?'):
+            session.query(command)
+        else:
+            session.write(command)
+    session.flush()
+
+
+def compare_latency(host='127.0.0.1', port=5025, repeats=20):
+    """
+    compare_latency times the setup and calibration command sequence of the GUI through the legacy per-command
+    path and through a persistent pipelined session
+    :param host: The IP address of the VNA or simulator
+    :param port: The SCPI socket port of the VNA or simulator
+    :param repeats: The number of times each path is run
+    :return: A dictionary of the mean time per sequence in seconds for each path
+    """
+    commands = SETUP_COMMANDS + ["*OPC?"] + frequency_commands(1000, 1000000)
+    for method in ["Short", "Open", "Load", "Thru"]:
+        commands += standard_commands(method) + ["*OPC?"]
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        legacy_round_trips(host, port, commands)
+    legacy = (time.perf_counter() - start) / repeats
+
+    with SCPISession(host, port) as session:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            pipelined_commands(session, commands)
+        pipelined = (time.perf_counter() - start) / repeats
+
+    print(f"Per-command path: {legacy * 1e3:.3f} ms per sequence")
+    print(f"Pipelined session: {pipelined * 1e3:.3f} ms per sequence")
+    print(f"Speed-up: {legacy / pipelined:.1f}x")
+    return {'legacy': legacy, 'pipelined': pipelined}
+
+
+def compare_trace_transfer(host='127.0.0.1', port=5025, points=(1000, 10000, 100000), repeats=10):
+    """
+    compare_trace_transfer times trace fetches of increasing length using ASCII and REAL,64 block transfer
+    :param host: The IP address of the VNA or simulator
+    :param port: The SCPI socket port of the VNA or simulator
+    :param points: The sweep point counts to test
+    :param repeats: The number of fetches timed at each point count
+    :return: A dictionary mapping point count to the mean ASCII and binary fetch times in seconds
+    """
+    results = {}
+    with SCPISession(host, port) as session:
+        for count in points:
+            session.write(f"SENS:SWE:POIN {count}")
+            timings = {}
+            for name, binary in (('ascii', False), ('binary', True)):
+                fetch_trace(session, binary)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    trace = fetch_trace(session, binary)
+                timings[name] = (time.perf_counter() - start) / repeats
+                if len(trace) != count:
+                    raise ValueError(f"Expected {count} points, received {len(trace)}")
+            results[count] = timings
+            print(f"{count:>7} points: ASCII {timings['ascii'] * 1e3:8.3f} ms, "
+                  f"REAL,64 {timings['binary'] * 1e3:8.3f} ms, "
+                  f"speed-up {timings['ascii'] / timings['binary']:.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    compare_latency()
+    compare_trace_transfer()
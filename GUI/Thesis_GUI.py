@@ -5,13 +5,66 @@
 
 # Imports required
 import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
-import socket
+from tkinter import ttk, messagebox, scrolledtext, filedialog
 import skrf as rf
-from skrf.calibration import SOLT
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
+import os
+import sys
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from SCPI_Session import SCPISession, SETUP_COMMANDS, frequency_commands, standard_commands
+from Calibration_Cache import CalibrationCache, IDEAL_FILES, MEASURED_FILES, DUT_FILE, NPORT_DUT_FILE, file_hash
+from Deembedding import Deembedder
+from NPort_Calibration import fixture_deembedder
+from Log_Buffer import LogBuffer, LogFileSink
+from Live_Sweep import LiveSweep, LiveSweepView
+from Timing import RunTimer, TimingLog, span
+from Multi_VNA import parse_endpoints, run_calibrations
+from matplotlib.figure import Figure
+
+# Touchstone loader shared with the plotting scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Plotting'))
+from Touchstone_Cache import load_network
+
+# LAN Details
+VNA_HOST = '127.0.0.1'
+VNA_PORT = 5025
+
+# Persistent SCPI session, kept open across calibrations
+session = None
+
+# Calibrations run on a single background worker so queued runs are measured in order. The worker reports
+# back to the Tk mainloop through ui_queue, which is drained with root.after
+calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='calibration')
+ui_queue = queue.Queue()
+calibration_jobs = {}
+job_counter = 0
+UI_POLL_MS = 50
+
+# SCPI log display, capped to the most recent lines. Set LOG_FILE to also keep the full log on disk
+LOG_MAX_LINES = 2000
+LOG_FLUSH_MS = 100
+LOG_FILE = None
+log_buffer = LogBuffer(LOG_MAX_LINES, LOG_FLUSH_MS, None if LOG_FILE is None else LogFileSink(LOG_FILE))
+
+# Continuous sweep display, drawn with blitting at the target frame rate
+LIVE_FRAME_RATE = 20.0
+live_sweep = None
+
+# Solved calibrations, reused until one of the standard files changes
+calibration_cache = CalibrationCache()
+
+# De-embedding fixture, the inverse T-matrices are kept until the file changes
+DEEMBED_FILE = 'SParam/De_embed/de-embed.s2p'
+deembedder = None
+deembedder_hash = None
+
+# Per-stage timings of recent calibration runs, shown in the stats panel and exported as JSON
+TIMING_MAX_RUNS = 500
+TIMING_FILE = 'calibration_timings.json'
+timing_log = TimingLog(TIMING_MAX_RUNS)
 
 
 def show_error_popup(message):
@@ -25,87 +78,146 @@ def show_error_popup(message):
 
 def log_message(message):
     """
-    log_message displays a message received as a chat log
+    log_message adds a message to the chat log, safe to call from the calibration worker. The log window is
+    updated in batches by log_buffer
     :param message: A text string regarding the message to be added to log
     :return: NULL
     """
-    message_window.insert(tk.END, message + '\n')
-    message_window.see(tk.END)
+    log_buffer.append(message)
+
+
+def handle_ui_message(kind, job_id, payload):
+    """
+    handle_ui_message applies one progress update or result posted by the calibration worker
+    :param kind: The kind of message, e.g. 'progress' or 'done'
+    :param job_id: The number of the calibration run
+    :param payload: The data of the message, depending on its kind
+    :return: NULL
+    """
+    if kind == 'started':
+        update_job_popup(job_id, "Calibrating...")
+    elif kind == 'progress':
+        update_job_popup(job_id, None, payload)
+    elif kind == 'instruments':
+        finished = sum(run['state'] in ('done', 'failed', 'cancelled') for run in payload)
+        failed = sum(run['state'] == 'failed' for run in payload)
+        update_job_popup(job_id, f"{finished}/{len(payload)} instruments, {failed} failed",
+                         sum(run['progress'] for run in payload) / len(payload))
+    elif kind == 'done':
+        close_job_popup(job_id)
+        dut_calibrated, timer = payload
+        with timer.span('canvas_draw'):
+            plot_calibration_results(dut_calibrated)
+        timing_log.add(timer, 'done')
+        update_stats_panel()
+    elif kind == 'cancelled':
+        close_job_popup(job_id)
+        log_message(f"Calibration {job_id} cancelled")
+        update_stats_panel()
+    elif kind == 'error':
+        close_job_popup(job_id)
+        show_error_popup(payload)
+        update_stats_panel()
+
+
+def process_ui_queue():
+    """
+    process_ui_queue applies progress updates and results posted by the calibration worker, then
+    reschedules itself on the Tk mainloop. A message that fails is logged, so it never stops later messages
+    :return: NULL
+    """
+    try:
+        while True:
+            try:
+                kind, job_id, payload = ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                handle_ui_message(kind, job_id, payload)
+            except Exception as e:
+                log_message(f"Error handling {kind} of calibration {job_id}: {e}")
+    finally:
+        root.after(UI_POLL_MS, process_ui_queue)
+
+
+def get_session(host=VNA_HOST, port=VNA_PORT):
+    """
+    get_session returns the persistent SCPI session, opening the connection if required
+    :param host: The IP address of the VNA, the session is reopened if it is connected elsewhere
+    :param port: The SCPI socket port of the VNA
+    :return: The connected SCPISession
+    """
+    global session
+    if session is not None and (session.host, session.port) != (host, port):
+        close_session()
+    if session is None:
+        session = SCPISession(host, port, log=log_message)
+    session.connect()
+    return session
+
+
+def close_session():
+    """
+    close_session closes the persistent SCPI session so the next calibration reconnects
+    :return: NULL
+    """
+    global session
+    if session is not None:
+        try:
+            session.close()
+        except OSError:
+            pass
+        session = None
 
 
 def vna_setup(connection):
     """
     vna_setup initiates the VNA through a series of SCPI commands
-    :param connection: The LAN or USB connection details
+    :param connection: The SCPISession connected to the VNA
     :return: NULL
     """
 
-    # Set-up commands for VNA
-    commands = [
-        "SYST:PRES\n", "SENS:SWE:POIN 100\n", "CALC:PAR1:DEF S21\n",
-        "CALC:PAR1:SEL\n", "CALC:FORM MLOG\n", "SENS:BAND 10\n",
-        ":TRIG:SOUR BUS\n", ":TRIG:SING\n", "*OPC?\n"
-    ]
-
-    # Iterate through commands, send to VNA device
-    for command in commands:
-        connection.sendall(command.encode('utf-8'))
-        response = connection.recv(1024)
-        log_message(f"Sent: {command.strip()}")
-        log_message(f"Received: {response.decode('utf-8').strip()}")
+    # Set-up commands for VNA, sent back-to-back with a single wait for completion
+    connection.write(*SETUP_COMMANDS)
+    connection.query("*OPC?")
 
 
 def update_frequency_range(connection, start_freq, end_freq):
     """
     update_frequency_range updates the VNA operating frequency range
-    :param connection: The LAN or USB connection details
+    :param connection: The SCPISession connected to the VNA
     :param start_freq: The starting frequency value
     :param end_freq: The ending frequency value
     :return: NULL
     """
 
-    # Commands for updating start and end frequency
-    commands = [
-        f"SENS:FREQ:START {start_freq}\n", f"SENS:FREQ:STOP {end_freq}\n"
-    ]
-
-    # Iterate through commands, send to VNA device
-    for command in commands:
-        connection.sendall(command.encode('utf-8'))
-        response = connection.recv(1024)
-        log_message(f"Sent: {command.strip()}")
-        log_message(f"Received: {response.decode('utf-8').strip()}")
+    # Commands for updating start and end frequency, these return nothing so are only buffered
+    connection.write(*frequency_commands(start_freq, end_freq))
 
 
-def start_calibration_type(connection, command):
+def start_calibration_type(connection, method):
     """
     start_calibration_type sends commands to the VNA to initiate calibration
-    :param connection: The LAN or USB connection details
-    :param command: The command message to send to the VNA
+    :param connection: The SCPISession connected to the VNA
+    :param method: The calibration standard to measure, e.g. "Short"
     :return: NULL
     """
 
-    # Command from input, wait command and response from VNA
-    commands = [command, "*WAI\n", "*OPC?\n"]
-    for cmd in commands:
-        connection.sendall(cmd.encode('utf-8'))
-        response = connection.recv(1024)
-        log_message(f"Sent: {cmd.strip()}")
-        log_message(f"Received: {response.decode('utf-8').strip()}")
+    # Command from input and wait command, only the completion query waits for a response from VNA
+    connection.write(*standard_commands(method))
+    connection.query("*OPC?")
 
-def calibrate():
+def read_frequency_range():
     """
-    calibrate provides the implementation to conduct calibration with the VNA through the GUI
-    :return: NULL
+    read_frequency_range reads and checks the start and end frequency inputs
+    :return: A tuple of the start and end frequency in Hz, or None if the inputs are invalid
     """
 
     # Obtain the details from the given user inputs
-    selected_methods = [method for method, var in method_vars.items() if var.get()]
     start_freq_counter_value = int(start_freq_counter_var.get())
     end_freq_counter_value = int(end_freq_counter_var.get())
     start_freq_unit = start_freq_unit_var.get()
     end_freq_unit = end_freq_unit_var.get()
-    num_ports = ports_entry.get()
 
     # Add multiplication weightings to frequency
     if start_freq_unit == "Hz":
@@ -129,97 +241,317 @@ def calibrate():
     # Error checking and handling
     if start_freq_counter_value <= 0:
         show_error_popup("Start frequency must be greater than 0.")
-        return
+        return None
     if end_freq_counter_value <= 0:
         show_error_popup("End frequency must be greater than 0.")
-        return
+        return None
     if start_freq_counter_value >= end_freq_counter_value:
         show_error_popup("Start frequency must be less than end frequency.")
-        return
+        return None
     if start_freq_counter_value > 6e9 or end_freq_counter_value > 6e9:
         show_error_popup("Frequency values cannot exceed 6 GHz.")
+        return None
+    return start_freq_counter_value, end_freq_counter_value
+
+
+def calibrate():
+    """
+    calibrate provides the implementation to conduct calibration with the VNA through the GUI
+    :return: NULL
+    """
+
+    # Obtain the details from the given user inputs
+    selected_methods = [method for method, var in method_vars.items() if var.get()]
+    num_ports = ports_entry.get()
+    frequency_range = read_frequency_range()
+    if frequency_range is None:
+        return
+    start_freq_counter_value, end_freq_counter_value = frequency_range
+
+    if not num_ports.isdigit() or int(num_ports) < 2:
+        show_error_popup("Number of ports must be a valid number of at least 2.")
         return
-    if not num_ports.isdigit():
-        show_error_popup("Number of ports must be a valid number.")
+    num_ports = int(num_ports)
+    try:
+        endpoints = parse_endpoints(endpoints_var.get(), VNA_PORT)
+    except ValueError:
+        show_error_popup("VNA endpoints must be written as host:port, separated by commas.")
+        return
+    if not endpoints:
+        show_error_popup("At least one VNA endpoint is required.")
+        return
+
+    # Queue the calibration on the background worker, the progress popup is updated through ui_queue
+    global job_counter
+    job_counter += 1
+    job_id = job_counter
+    cancel_event = threading.Event()
+    calibration_jobs[job_id] = {'cancel': cancel_event, 'popup': create_job_popup(job_id, cancel_event)}
+    if len(endpoints) == 1:
+        calibration_executor.submit(run_calibration, job_id, cancel_event, selected_methods,
+                                    start_freq_counter_value, end_freq_counter_value, *endpoints[0], num_ports)
+    else:
+        calibration_executor.submit(run_multi_calibration, job_id, cancel_event, endpoints, selected_methods,
+                                    start_freq_counter_value, end_freq_counter_value, num_ports)
+
+
+def create_job_popup(job_id, cancel_event):
+    """
+    create_job_popup displays a loading bar for a queued calibration, with a button to cancel it
+    :param job_id: The number of the calibration run
+    :param cancel_event: The threading.Event checked by the worker between standards
+    :return: A tuple of the popup window, label and progress bar
+    """
+    loading_bar_popup = tk.Toplevel(root)
+    loading_bar_popup.title(f"Calibration Progress ({job_id})")
+    loading_bar_popup.geometry("300x90")
+
+    progress_label = ttk.Label(loading_bar_popup, text="Queued...", style='Custom.TLabel')
+    progress_label.pack()
+
+    progress = ttk.Progressbar(loading_bar_popup, orient='horizontal', length=200, mode='determinate')
+    progress.pack()
+
+    def cancel():
+        """
+        cancel requests the calibration stops before the next standard
+        :return: NULL
+        """
+        cancel_event.set()
+        progress_label.config(text="Cancelling...")
+
+    cancel_button = ttk.Button(loading_bar_popup, text="Cancel", command=cancel, style='Custom.TButton')
+    cancel_button.pack(pady=5)
+    loading_bar_popup.protocol("WM_DELETE_WINDOW", cancel)
+    return loading_bar_popup, progress_label, progress
+
+
+def update_job_popup(job_id, text=None, value=None):
+    """
+    update_job_popup updates the label and progress bar of a calibration run
+    :param job_id: The number of the calibration run
+    :param text: The new label text, or None to leave unchanged
+    :param value: The new progress percentage, or None to leave unchanged
+    :return: NULL
+    """
+    job = calibration_jobs.get(job_id)
+    if job is None:
+        return
+    _, progress_label, progress = job['popup']
+    if text is not None and not job['cancel'].is_set():
+        progress_label.config(text=text)
+    if value is not None:
+        progress['value'] = value
+
+
+def close_job_popup(job_id):
+    """
+    close_job_popup removes the loading bar of a finished calibration run
+    :param job_id: The number of the calibration run
+    :return: NULL
+    """
+    job = calibration_jobs.pop(job_id, None)
+    if job is not None:
+        job['popup'][0].destroy()
+
+
+def run_calibration(job_id, cancel_event, selected_methods, start_freq, end_freq, host=VNA_HOST, port=VNA_PORT,
+                    nports=2):
+    """
+    run_calibration conducts the calibration on the background worker, including the SCPI conversation with the
+    VNA and the calibration solve. Results are posted to ui_queue for the mainloop to plot
+    :param job_id: The number of the calibration run
+    :param cancel_event: A threading.Event, when set the run stops before the next standard
+    :param selected_methods: The list of calibration standards to measure
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :param host: The IP address of the VNA
+    :param port: The SCPI socket port of the VNA
+    :param nports: The number of ports of the calibration
+    :return: NULL
+    """
+    if cancel_event.is_set():
+        ui_queue.put(('cancelled', job_id, None))
         return
+    ui_queue.put(('started', job_id, None))
+
+    # Every stage of the run is timed, including those inside the calibration cache
+    timer = RunTimer(job_id)
 
     # Try the LAN connection
     try:
-        # LAN Details
-        host = '127.0.0.1'
-        port = 5025
-        connection = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        connection.connect((host, port))
+        with timer.activate():
+            with span('connect'):
+                connection = get_session(host, port)
+
+            # Conduct VNA setup
+            with span('vna_setup'):
+                vna_setup(connection)
+            with span('frequency_range'):
+                update_frequency_range(connection, start_freq, end_freq)
+
+            for i, method in enumerate(selected_methods):
+                if cancel_event.is_set():
+                    timing_log.add(timer, 'cancelled')
+                    ui_queue.put(('cancelled', job_id, None))
+                    return
+                with span(f"measure_{method.lower()}"):
+                    start_calibration_type(connection, method)
+                ui_queue.put(('progress', job_id, 100 * (i + 1) / len(selected_methods)))
+
+            if cancel_event.is_set():
+                timing_log.add(timer, 'cancelled')
+                ui_queue.put(('cancelled', job_id, None))
+                return
+
+            # Solve the calibration here, only the drawing is left to the mainloop
+            dut_calibrated = solve_calibration_results(nports)
+        ui_queue.put(('done', job_id, (dut_calibrated, timer)))
 
-        # Conduct VNA setup
-        vna_setup(connection)
-        update_frequency_range(connection, start_freq_counter_value, end_freq_counter_value)
+    except Exception as e:
+        # Drop the session so the next calibration starts from a fresh connection
+        close_session()
+        timing_log.add(timer, 'error')
+        ui_queue.put(('error', job_id, f"Error communicating with instrument: {e}"))
 
-        # Display a loading bar while calibrating
-        loading_bar_popup = tk.Toplevel(root)
-        loading_bar_popup.title("Calibration Progress")
-        loading_bar_popup.geometry("300x50")
 
-        progress_label = ttk.Label(loading_bar_popup, text="Calibrating...", style='Custom.TLabel')
-        progress_label.pack()
+def run_multi_calibration(job_id, cancel_event, endpoints, selected_methods, start_freq, end_freq, nports=2):
+    """
+    run_multi_calibration conducts the calibration on several VNAs concurrently from the background worker. An
+    instrument that fails is logged and left out, the results are solved if any instrument completed
+    :param job_id: The number of the calibration run
+    :param cancel_event: A threading.Event, when set every instrument stops before its next standard
+    :param endpoints: A list of (host, port) tuples
+    :param selected_methods: The list of calibration standards to measure
+    :param start_freq: The starting frequency value in Hz
+    :param end_freq: The ending frequency value in Hz
+    :param nports: The number of ports of the calibration
+    :return: NULL
+    """
+    if cancel_event.is_set():
+        ui_queue.put(('cancelled', job_id, None))
+        return
+    ui_queue.put(('started', job_id, None))
+    timer = RunTimer(job_id)
 
-        progress = ttk.Progressbar(loading_bar_popup, orient='horizontal', length=200, mode='determinate')
-        progress.pack()
+    def on_update(runs):
+        ui_queue.put(('instruments', job_id, [run.summary() for run in runs]))
 
-        def update_progress():
-            """
-            update_progress updates the progress bar according to the calibration progress
-            :return: NULL
-            """
-            progress.step(100 / len(selected_methods))
+    try:
+        with timer.activate():
+            with span('instruments'):
+                runs = run_calibrations(endpoints, selected_methods, start_freq, end_freq, cancel_event, on_update,
+                                        log=log_message)
+            for run in runs:
+                log_message(f"{run.name}: {run.state} in {run.elapsed * 1e3:.0f} ms"
+                            + ("" if run.error is None else f" ({run.error})"))
+
+            if cancel_event.is_set():
+                timing_log.add(timer, 'cancelled')
+                ui_queue.put(('cancelled', job_id, None))
+                return
+            if not any(run.state == 'done' for run in runs):
+                timing_log.add(timer, 'error')
+                ui_queue.put(('error', job_id, "Calibration failed on every instrument: "
+                              + "; ".join(f"{run.name} {run.error}" for run in runs)))
+                return
+
+            dut_calibrated = solve_calibration_results(nports)
+        ui_queue.put(('done', job_id, (dut_calibrated, timer)))
 
-        for method in selected_methods:
-            start_calibration_type(connection, f"CALIBRATION:{method.upper()}")
-            update_progress()
+    except Exception as e:
+        timing_log.add(timer, 'error')
+        ui_queue.put(('error', job_id, f"Error calibrating instruments: {e}"))
 
-        # Close the connection when finished
-        connection.close()
 
-        # Remove the loading bar
-        loading_bar_popup.destroy()
+def get_deembedder(nports=2):
+    """
+    get_deembedder returns the de-embedding operator for the fixture file, rebuilding it only when it or the
+    number of ports changes
+    :param nports: The number of ports of the DUT, the fixture is removed from every port
+    :return: The Deembedder for DEEMBED_FILE, or its NPortCalibration for more than 2 ports
+    """
+    global deembedder, deembedder_hash
+    current_hash = (file_hash(DEEMBED_FILE), nports)
+    if deembedder is None or current_hash != deembedder_hash:
+        fixture = load_network(DEEMBED_FILE)
+        deembedder = Deembedder(fixture) if nports == 2 else fixture_deembedder(fixture, nports)
+        deembedder_hash = current_hash
+    return deembedder
 
-        # Plot the calibration results
-        plot_calibration_results()
 
-    except Exception as e:
-        show_error_popup(f"Error communicating with instrument: {e}")
+def solve_calibration_results(nports=2):
+    """
+    solve_calibration_results solves the calibration and applies it to an example DUT, safe to run off the
+    Tk mainloop thread. 2 ports use the SOLT kit, more ports use the N-port kit of nport_kit_files
+    :param nports: The number of ports of the calibration
+    :return: The calibrated and de-embedded DUT network
+    """
+    # Only parses the standards and solves when the calibration kit files have changed
+    if nports == 2:
+        cal1 = calibration_cache.get_calibration(IDEAL_FILES, MEASURED_FILES)
+        dut_file = DUT_FILE
+    else:
+        cal1 = calibration_cache.get_nport_calibration(nports)
+        dut_file = NPORT_DUT_FILE.format(nports=nports)
+
+    with span('touchstone_parse'):
+        dut = load_network(dut_file)
+    with span('apply_cal'):
+        dut_calibrated = cal1.apply_cal(dut) if nports == 2 else cal1.apply(dut)
+    with span('deembed'):
+        return get_deembedder(nports).apply(dut_calibrated)
+
+
+def update_stats_panel():
+    """
+    update_stats_panel refreshes the per-stage latency table from the timing log
+    :return: NULL
+    """
+    stats_tree.delete(*stats_tree.get_children())
+    for name, stats in timing_log.stage_stats().items():
+        latency = [f"{stats[key] * 1e3:.1f}" for key in ('last', 'mean', 'min', 'max')]
+        stats_tree.insert('', tk.END, values=(name, *latency, stats['runs']))
+    stats_summary_var.set(f"Runs: {len(timing_log.runs)}")
 
 
-def plot_calibration_results():
+def toggle_stats_panel():
     """
-    plot_calibration_results plots an example of the calibration results
+    toggle_stats_panel shows or hides the timing stats panel
     :return: NULL
     """
-    de = rf.Network('SParam/De_embed/de-embed.s2p')
-    ideals = [
-        rf.Network('SParam/Ideals/Short_Ideal.s2p'),
-        rf.Network('SParam/Ideals/Open_Ideal.s2p'),
-        rf.Network('SParam/Ideals/Load_Ideal.s2p'),
-        rf.Network('SParam/Ideals/Thru_Ideal.s2p'),
-    ]
-    measured = [
-        rf.Network('SParam/Meas/1000mm_line_short.s2p'),
-        rf.Network('SParam/Meas/1000mm_line_open.s2p'),
-        rf.Network('SParam/Meas/1000mm_line_load.s2p'),
-        rf.Network('SParam/Meas/1000mm_line_thru.s2p'),
-    ]
-
-    cal1 = SOLT(
-        ideals=ideals,
-        measured=measured,
-    )
-
-    cal1.run()
-
-    dut = rf.Network('SParam/DUTs/1m_cable_LPF_1-35P_3dbRipple.s2p')
-    dut_calibrated = cal1.apply_cal(dut)
-    dut_calibrated.t = np.linalg.inv(de.t) @ dut_calibrated.t @ np.linalg.inv(de.t)
+    if stats_frame.winfo_ismapped():
+        stats_frame.grid_remove()
+        stats_button.config(text="Show Timings")
+    else:
+        update_stats_panel()
+        stats_frame.grid()
+        stats_button.config(text="Hide Timings")
 
+
+def export_timings():
+    """
+    export_timings saves the timings of all kept calibration runs to a JSON file chosen by the user
+    :return: NULL
+    """
+    path = filedialog.asksaveasfilename(title="Export Timings", initialfile=TIMING_FILE, defaultextension='.json',
+                                        filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+    if not path:
+        return
+    try:
+        timing_log.export_json(path)
+    except OSError as e:
+        show_error_popup(f"Could not export timings: {e}")
+        return
+    log_message(f"Timings of {len(timing_log.runs)} runs exported to {path}")
+
+
+def plot_calibration_results(dut_calibrated):
+    """
+    plot_calibration_results plots an example of the calibration results
+    :param dut_calibrated: The calibrated DUT network returned by solve_calibration_results
+    :return: NULL
+    """
     # Clear the existing plot
     ax.clear()
     dut_calibrated.plot_s_smith(ax=ax)
@@ -228,6 +560,61 @@ def plot_calibration_results():
     canvas.draw()
 
 
+def toggle_live_sweep():
+    """
+    toggle_live_sweep opens a window continuously displaying sweeps from the VNA, or closes it if already open
+    :return: NULL
+    """
+    global live_sweep
+    if live_sweep is not None:
+        stop_live_sweep()
+        return
+    frequency_range = read_frequency_range()
+    if frequency_range is None:
+        return
+
+    live_popup = tk.Toplevel(root)
+    live_popup.title("Live Sweep")
+    live_fig = Figure(figsize=(10, 4))
+    smith_ax, mag_ax = live_fig.subplots(1, 2)
+    live_canvas = FigureCanvasTkAgg(live_fig, master=live_popup)
+    live_canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    view = LiveSweepView(live_fig, smith_ax, mag_ax, live_canvas)
+    live_sweep = LiveSweep(root, view, *frequency_range, host=VNA_HOST, port=VNA_PORT,
+                           frame_rate=LIVE_FRAME_RATE, log=log_message, on_error=live_sweep_failed)
+    live_sweep.popup = live_popup
+    live_popup.protocol("WM_DELETE_WINDOW", stop_live_sweep)
+    live_sweep.start()
+    live_button.config(text="Stop Live Sweep")
+
+
+def live_sweep_failed(message):
+    """
+    live_sweep_failed closes the live sweep window and resets the button when the sweep thread fails
+    :param message: The error that stopped the sweep
+    :return: NULL
+    """
+    stop_live_sweep()
+    show_error_popup(f"Live sweep stopped: {message}")
+
+
+def stop_live_sweep():
+    """
+    stop_live_sweep stops streaming sweeps and closes the live sweep window
+    :return: NULL
+    """
+    global live_sweep
+    if live_sweep is None:
+        return
+    live_sweep.stop()
+    sweep_rate, frame_rate = live_sweep.rates
+    log_message(f"Live sweep: {sweep_rate:.1f} sweeps/s, {frame_rate:.1f} frames/s")
+    live_sweep.popup.destroy()
+    live_sweep = None
+    live_button.config(text="Live Sweep")
+
+
 def update_start_freq_counter(change):
     """
     update_start_freq_counter updates the frequency counter staring point
@@ -275,6 +662,13 @@ def on_exit():
     :return: NULL
     """
     if messagebox.askokcancel("Exit", "Are you sure you want to exit?"):
+        for job in calibration_jobs.values():
+            job['cancel'].set()
+        calibration_executor.shutdown(wait=False, cancel_futures=True)
+        stop_live_sweep()
+        close_session()
+        if log_buffer.sink is not None:
+            log_buffer.sink.close()
         root.destroy()
 
 
@@ -354,12 +748,21 @@ end_freq_unit_menu.grid(row=10, column=2, sticky=tk.W, padx=10, pady=5)
 ports_label = ttk.Label(root, text="Number of Ports:", style='Custom.TLabel')
 ports_label.grid(row=11, column=0, sticky=tk.W, padx=10, pady=5)
 
-ports_entry = ttk.Entry(root, width=10, style='Custom.TEntry')
+ports_var = tk.StringVar(value='2')
+ports_entry = ttk.Entry(root, textvariable=ports_var, width=10, style='Custom.TEntry')
 ports_entry.grid(row=11, column=1, sticky=tk.W, padx=10, pady=5)
 
+# VNA endpoint panel, several comma separated endpoints are calibrated concurrently
+endpoints_label = ttk.Label(root, text="VNA Endpoints:", style='Custom.TLabel')
+endpoints_label.grid(row=12, column=0, sticky=tk.W, padx=10, pady=5)
+
+endpoints_var = tk.StringVar(value=f"{VNA_HOST}:{VNA_PORT}")
+endpoints_entry = ttk.Entry(root, textvariable=endpoints_var, width=30, style='Custom.TEntry')
+endpoints_entry.grid(row=12, column=1, columnspan=2, sticky=tk.W, padx=10, pady=5)
+
 # Calibrate button
 calibrate_button = ttk.Button(root, text="Calibrate", command=calibrate, style='Custom.TButton')
-calibrate_button.grid(row=12, column=0, columnspan=2, padx=10, pady=10)
+calibrate_button.grid(row=13, column=0, columnspan=2, padx=10, pady=10)
 
 # Smith Chart Label
 smith_chart_label = ttk.Label(root, text="Calibration Output:", style='Custom.TLabel')
@@ -388,9 +791,40 @@ message_window_label.grid(row=7, column=4, columnspan=2, sticky=tk.W, padx=10, p
 
 message_window = scrolledtext.ScrolledText(root, width=80, height=10, wrap=tk.WORD)
 message_window.grid(row=8, rowspan=6, column=4, columnspan=3, padx=10, pady=5)
+log_buffer.attach(root, message_window)
 
 # Clear selection button
 clear_button = ttk.Button(root, text="Clear Selection", command=clear_selection, style='Custom.TButton')
-clear_button.grid(row=13, column=0, columnspan=2, padx=10, pady=10)
+clear_button.grid(row=14, column=0, columnspan=2, padx=10, pady=10)
+
+# Live sweep button
+live_button = ttk.Button(root, text="Live Sweep", command=toggle_live_sweep, style='Custom.TButton')
+live_button.grid(row=15, column=0, columnspan=2, padx=10, pady=10)
+
+# Timing stats panel, hidden until toggled
+stats_button = ttk.Button(root, text="Show Timings", command=toggle_stats_panel, style='Custom.TButton')
+stats_button.grid(row=16, column=0, columnspan=2, padx=10, pady=10)
+
+stats_frame = ttk.Frame(root)
+stats_frame.grid(row=17, column=0, columnspan=7, sticky=tk.EW, padx=10, pady=5)
+
+stats_columns = ('stage', 'last', 'mean', 'min', 'max', 'runs')
+stats_headings = ('Stage', 'Last (ms)', 'Mean (ms)', 'Min (ms)', 'Max (ms)', 'Runs')
+stats_tree = ttk.Treeview(stats_frame, columns=stats_columns, show='headings', height=10)
+for column, heading in zip(stats_columns, stats_headings):
+    stats_tree.heading(column, text=heading)
+    stats_tree.column(column, width=160 if column == 'stage' else 90, anchor=tk.W if column == 'stage' else tk.E)
+stats_tree.grid(row=0, column=0, columnspan=2, sticky=tk.EW)
+
+stats_summary_var = tk.StringVar(value="Runs: 0")
+stats_summary_label = ttk.Label(stats_frame, textvariable=stats_summary_var, style='Custom.TLabel')
+stats_summary_label.grid(row=1, column=0, sticky=tk.W, pady=5)
+
+export_button = ttk.Button(stats_frame, text="Export JSON", command=export_timings, style='Custom.TButton')
+export_button.grid(row=1, column=1, sticky=tk.E, pady=5)
+stats_frame.grid_remove()
+
+# Apply updates from the calibration worker on the mainloop
+root.after(UI_POLL_MS, process_ui_queue)
 
 root.mainloop()
\ No newline at end of file
@@ -0,0 +1,181 @@
+# =========================================================================
+#           VNA Calibration Device Hot-Path Timing
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Timer of the calibration run on each thread, so nested library calls can add spans without being passed it
+_active = threading.local()
+
+
+class RunTimer:
+    """
+    RunTimer collects named timing spans for one calibration run. Spans can be added from the calibration worker
+    and the Tk mainloop, a stage timed more than once in a run is summed
+    """
+
+    def __init__(self, run_id):
+        """
+        __init__ creates an empty timer for a run
+        :param run_id: The number of the calibration run
+        :return: NULL
+        """
+        self.run_id = run_id
+        self.started = time.time()
+        self.status = 'running'
+        self.spans = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        """
+        span times the enclosed block as a stage of the run, the time is recorded even if the block raises
+        :param name: The name of the stage
+        :return: NULL
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, start - self._origin)
+
+    def record(self, name, seconds, offset=None):
+        """
+        record adds a stage timed elsewhere
+        :param name: The name of the stage
+        :param seconds: The duration of the stage in seconds
+        :param offset: The start of the stage in seconds since the run started, or None for now
+        :return: NULL
+        """
+        if offset is None:
+            offset = time.perf_counter() - self._origin - seconds
+        with self._lock:
+            self.spans.append((name, offset, seconds))
+
+    @contextmanager
+    def activate(self):
+        """
+        activate makes this the timer used by span() on the current thread for the enclosed block
+        :return: NULL
+        """
+        previous = getattr(_active, 'timer', None)
+        _active.timer = self
+        try:
+            yield self
+        finally:
+            _active.timer = previous
+
+    def stages(self):
+        """
+        stages sums the spans of each stage, in the order the stages first started
+        :return: A dict of stage name to total seconds
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+        totals = {}
+        for name, _, seconds in spans:
+            totals[name] = totals.get(name, 0.0) + seconds
+        return totals
+
+    def to_dict(self):
+        """
+        to_dict gives the run as JSON serialisable data
+        :return: A dict of the run details, stage totals and individual spans
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span[1])
+        return {
+            'run': self.run_id,
+            'started': self.started,
+            'status': self.status,
+            'stages': self.stages(),
+            'spans': [{'name': name, 'offset': offset, 'seconds': seconds} for name, offset, seconds in spans],
+        }
+
+
+def current_timer():
+    """
+    current_timer returns the timer activated on the current thread
+    :return: The active RunTimer, or None outside of a timed run
+    """
+    return getattr(_active, 'timer', None)
+
+
+@contextmanager
+def span(name):
+    """
+    span times the enclosed block in the active run of the current thread, doing nothing outside of a timed run
+    :param name: The name of the stage
+    :return: NULL
+    """
+    timer = current_timer()
+    if timer is None:
+        yield
+        return
+    with timer.span(name):
+        yield
+
+
+class TimingLog:
+    """
+    TimingLog keeps the most recent finished runs for per-stage statistics and run-to-run trends
+    """
+
+    def __init__(self, max_runs=500):
+        """
+        __init__ creates an empty log
+        :param max_runs: The number of runs kept, the oldest are dropped first
+        :return: NULL
+        """
+        self.runs = deque(maxlen=max_runs)
+        self._lock = threading.Lock()
+
+    def add(self, timer, status='done'):
+        """
+        add stores a finished run
+        :param timer: The RunTimer of the run
+        :param status: How the run ended, e.g. 'done', 'cancelled' or 'error'
+        :return: NULL
+        """
+        timer.status = status
+        with self._lock:
+            self.runs.append(timer)
+
+    def stage_stats(self):
+        """
+        stage_stats summarises the latency of each stage over the kept runs
+        :return: A dict of stage name to a dict of last, mean, min and max seconds and the number of runs
+        """
+        with self._lock:
+            runs = list(self.runs)
+        samples = {}
+        for timer in runs:
+            for name, seconds in timer.stages().items():
+                samples.setdefault(name, []).append(seconds)
+        return {name: {'last': values[-1], 'mean': sum(values) / len(values), 'min': min(values),
+                       'max': max(values), 'runs': len(values)} for name, values in samples.items()}
+
+    def to_dict(self):
+        """
+        to_dict gives the log as JSON serialisable data
+        :return: A dict of the per-stage statistics and every kept run
+        """
+        with self._lock:
+            runs = list(self.runs)
+        return {'stages': self.stage_stats(), 'runs': [timer.to_dict() for timer in runs]}
+
+    def export_json(self, path):
+        """
+        export_json writes the log to a JSON file
+        :param path: The path of the file to write
+        :return: NULL
+        """
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, indent=2)
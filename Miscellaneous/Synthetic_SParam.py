@@ -0,0 +1,552 @@
+# =========================================================================
+#           Synthetic S-Parameter Dataset Generator
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import skrf as rf
+from scipy import signal
+
+# Sidecar writer and error term order shared with the plotting scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'Plotting'))
+from Touchstone_Cache import write_sidecar
+from Error_Kernel import ERROR_TERMS
+from NPort_Calibration import NPortCalibration, port_pairs
+
+# File names of the GUI calibration kit and example DUT, so a dataset written to SParam is used as is
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'GUI'))
+from Calibration_Cache import IDEAL_FILES, MEASURED_FILES, DUT_FILE, NPORT_DUT_FILE, nport_kit_files
+
+# Default sweep, matching the 6 GHz limit of the GUI
+DEFAULT_START = 1e6
+DEFAULT_STOP = 6e9
+Z0 = 50.0
+SPEED_OF_LIGHT = 299792458.0
+
+# Standard names in the order used by the calibration, and the stream of each kind of file in the seed
+STANDARDS = ('Short', 'Open', 'Load', 'Thru')
+SEED_STANDARDS, SEED_LINES, SEED_FILTERS, SEED_FIXTURE, SEED_NOISE = range(5)
+
+# Frequency points formatted per write when saving Touchstone text
+TOUCHSTONE_CHUNK = 65536
+
+
+def frequency_grid(points, start=DEFAULT_START, stop=DEFAULT_STOP):
+    """
+    frequency_grid gives evenly spaced frequency points, as swept by the VNA
+    :param points: The number of frequency points
+    :param start: The first frequency in Hz
+    :param stop: The last frequency in Hz
+    :return: The frequency points in Hz
+    """
+    return np.linspace(start, stop, points)
+
+
+def lossy_line_s(f, length=1.0, loss_db=3.0, er_eff=2.1, impedance=Z0):
+    """
+    lossy_line_s calculates the S-parameters of a uniform transmission line with conductor loss rising with the
+    square root of frequency and dielectric loss rising linearly, mismatched to the 50 ohm reference
+    :param f: The frequency points in Hz
+    :param length: The line length in metres
+    :param loss_db: The insertion loss of the matched line at the last frequency point in dB
+    :param er_eff: The effective relative permittivity, setting the propagation delay
+    :param impedance: The characteristic impedance of the line in ohms
+    :return: The complex S-parameters, shape (F, 2, 2)
+    """
+    scale = f / f[-1]
+    attenuation = loss_db / (20 * np.log10(np.e)) * (0.8 * np.sqrt(scale) + 0.2 * scale)
+    propagation = np.exp(-attenuation - 2j * np.pi * f * length * np.sqrt(er_eff) / SPEED_OF_LIGHT)
+    gamma = (impedance - Z0) / (impedance + Z0)
+
+    denominator = 1 - gamma ** 2 * propagation ** 2
+    s = np.empty((len(f), 2, 2), dtype=complex)
+    s[:, 0, 0] = s[:, 1, 1] = gamma * (1 - propagation ** 2) / denominator
+    s[:, 1, 0] = s[:, 0, 1] = propagation * (1 - gamma ** 2) / denominator
+    return s
+
+
+def ripple_lpf_s(f, cutoff=1.35e9, order=5, ripple_db=3.0):
+    """
+    ripple_lpf_s calculates the S-parameters of a lossless, symmetric Chebyshev low-pass filter
+    :param f: The frequency points in Hz
+    :param cutoff: The ripple bandwidth in Hz
+    :param order: The number of filter sections
+    :param ripple_db: The passband ripple in dB
+    :return: The complex S-parameters, shape (F, 2, 2)
+    """
+    zeros, poles, gain = signal.cheby1(order, ripple_db, 2 * np.pi * cutoff, analog=True, output='zpk')
+    _, transmission = signal.freqs_zpk(zeros, poles, gain, 2 * np.pi * f)
+
+    # A lossless symmetric network reflects the remaining power in quadrature with the transmission
+    reflection = 1j * np.sqrt(np.clip(1 - np.abs(transmission) ** 2, 0, None)) * np.exp(1j * np.angle(transmission))
+    s = np.empty((len(f), 2, 2), dtype=complex)
+    s[:, 0, 0] = s[:, 1, 1] = reflection
+    s[:, 1, 0] = s[:, 0, 1] = transmission
+    return s
+
+
+def cascade(a, b):
+    """
+    cascade connects port 2 of one 2-port to port 1 of another
+    :param a: The S-parameters of the first network, shape (F, 2, 2)
+    :param b: The S-parameters of the second network, shape (F, 2, 2)
+    :return: The S-parameters of the combined network, shape (F, 2, 2)
+    """
+    loop = 1 - a[:, 1, 1] * b[:, 0, 0]
+    s = np.empty_like(a)
+    s[:, 0, 0] = a[:, 0, 0] + a[:, 0, 1] * a[:, 1, 0] * b[:, 0, 0] / loop
+    s[:, 1, 0] = a[:, 1, 0] * b[:, 1, 0] / loop
+    s[:, 0, 1] = a[:, 0, 1] * b[:, 0, 1] / loop
+    s[:, 1, 1] = b[:, 1, 1] + b[:, 1, 0] * b[:, 0, 1] * a[:, 1, 1] / loop
+    return s
+
+
+def standard_ideals_s(f, inductance=0.0, capacitance=0.0, offset_delay=0.0, load_reflection=0.0, thru_delay=0.0):
+    """
+    standard_ideals_s calculates the definitions of a Short, Open, Load and Thru kit with the usual parasitics
+    :param f: The frequency points in Hz
+    :param inductance: The short inductance in henries
+    :param capacitance: The open fringing capacitance in farads
+    :param offset_delay: The one-way delay of the offset to the short and open in seconds
+    :param load_reflection: The residual reflection of the load
+    :param thru_delay: The delay of the thru in seconds
+    :return: The complex S-parameters of the standards, shape (4, F, 2, 2), ordered as STANDARDS
+    """
+    omega = 2 * np.pi * f
+    offset = np.exp(-2j * omega * offset_delay)
+    reflections = (
+        offset * (1j * omega * inductance - Z0) / (1j * omega * inductance + Z0),
+        offset * (1 - 1j * omega * capacitance * Z0) / (1 + 1j * omega * capacitance * Z0),
+        np.full(len(f), load_reflection, dtype=complex),
+    )
+
+    s = np.zeros((len(STANDARDS), len(f), 2, 2), dtype=complex)
+    for i, reflection in enumerate(reflections):
+        s[i, :, 0, 0] = s[i, :, 1, 1] = reflection
+    s[3, :, 1, 0] = s[3, :, 0, 1] = np.exp(-1j * omega * thru_delay)
+    return s
+
+
+def mismatch_term(f, rng, low_db, high_db):
+    """
+    mismatch_term draws a small error term that grows with frequency and rotates with the delay to the port
+    :param f: The frequency points in Hz
+    :param rng: The np.random.Generator to draw from
+    :param low_db: The lowest magnitude at the middle of the band in dB
+    :param high_db: The highest magnitude at the middle of the band in dB
+    :return: The complex error term, shape (F,)
+    """
+    magnitude = 10 ** (rng.uniform(low_db, high_db) / 20) * (0.5 + f / f[-1])
+    return magnitude * np.exp(1j * (rng.uniform(0, 2 * np.pi) - 2 * np.pi * f * rng.uniform(0, 1e-9)))
+
+
+def port_cable(f, rng):
+    """
+    port_cable draws the transmission of a test port cable
+    :param f: The frequency points in Hz
+    :param rng: The np.random.Generator to draw from
+    :return: The complex transmission of the cable, shape (F,)
+    """
+    return lossy_line_s(f, rng.uniform(0.5, 1.5), rng.uniform(1, 3))[:, 1, 0]
+
+
+def random_error_terms(f, rng):
+    """
+    random_error_terms draws a realistic 12-term error model, with the tracking terms set by the loss and delay of
+    the test port cables
+    :param f: The frequency points in Hz
+    :param rng: The np.random.Generator to draw from
+    :return: The complex error terms in ERROR_TERMS order, shape (F, 12)
+    """
+    cables = [port_cable(f, rng) for _ in range(2)]
+    terms = []
+    for port, other in ((0, 1), (1, 0)):
+        terms += [
+            mismatch_term(f, rng, -40, -30),    # Directivity
+            mismatch_term(f, rng, -25, -15),    # Source match
+            mismatch_term(f, rng, -25, -15),    # Load match
+            mismatch_term(f, rng, -90, -70),    # Isolation
+            cables[port] ** 2,                  # Reflection tracking, there and back through one cable
+            cables[port] * cables[other],       # Transmission tracking, through both cables
+        ]
+    return np.stack(terms, axis=-1)
+
+
+def random_nport_error_model(f, nports, rng):
+    """
+    random_nport_error_model draws a realistic N-port error model. The load match of a port is the same whichever
+    port is driven, and the tracking terms are set by the test port cables
+    :param f: The frequency points in Hz
+    :param nports: The number of ports
+    :param rng: The np.random.Generator to draw from
+    :return: The NPortCalibration holding the error model
+    """
+    ports = np.arange(nports)
+    cables = np.stack([port_cable(f, rng) for _ in ports], axis=-1)
+    offset = np.stack([np.stack([mismatch_term(f, rng, -40, -30) if j == k else mismatch_term(f, rng, -90, -70)
+                                 for j in ports], axis=-1) for k in ports], axis=-2)
+    match = np.repeat(np.stack([mismatch_term(f, rng, -25, -15) for _ in ports], axis=-1)[:, :, None], nports,
+                      axis=2)
+    match[:, ports, ports] = np.stack([mismatch_term(f, rng, -25, -15) for _ in ports], axis=-1)
+    return NPortCalibration(f, offset, cables[:, :, None] * cables[:, None, :], match)
+
+
+def apply_error_terms(s, terms):
+    """
+    apply_error_terms gives the raw measurement of a network through a 12-term error model
+    :param s: The actual S-parameters, shape (F, 2, 2)
+    :param terms: The complex error terms in ERROR_TERMS order, shape (F, 12)
+    :return: The measured S-parameters, shape (F, 2, 2)
+    """
+    ed1, es1, el1, ex12, er1, et1, ed2, es2, el2, ex21, er2, et2 = terms.T
+    s11, s21, s12, s22 = s[:, 0, 0], s[:, 1, 0], s[:, 0, 1], s[:, 1, 1]
+    det = s11 * s22 - s21 * s12
+    forward = (1 - es1 * s11) * (1 - el1 * s22) - es1 * el1 * s21 * s12
+    reverse = (1 - es2 * s22) * (1 - el2 * s11) - es2 * el2 * s21 * s12
+
+    m = np.empty_like(s)
+    m[:, 0, 0] = ed1 + er1 * (s11 - el1 * det) / forward
+    m[:, 1, 0] = ex12 + et1 * s21 / forward
+    m[:, 1, 1] = ed2 + er2 * (s22 - el2 * det) / reverse
+    m[:, 0, 1] = ex21 + et2 * s12 / reverse
+    return m
+
+
+def add_noise(s, rng, level_db=-80):
+    """
+    add_noise adds complex Gaussian trace noise
+    :param s: The S-parameters
+    :param rng: The np.random.Generator to draw from
+    :param level_db: The noise floor in dB, or None for no noise
+    :return: The noisy S-parameters, same shape as s
+    """
+    if level_db is None:
+        return s
+    sigma = 10 ** (level_db / 20) / np.sqrt(2)
+    return s + sigma * (rng.standard_normal(s.shape) + 1j * rng.standard_normal(s.shape))
+
+
+def make_network(f, s, name=None):
+    """
+    make_network wraps S-parameters in a network with the frequency shown in GHz, as in the Touchstone files
+    :param f: The frequency points in Hz
+    :param s: The complex S-parameters, shape (F, N, N)
+    :param name: The name of the network
+    :return: The network
+    """
+    frequency = rf.Frequency.from_f(f, unit='Hz')
+    frequency.unit = 'GHz'
+    return rf.Network(frequency=frequency, s=s, name=name)
+
+
+def line_network(f, seed=0, noise_db=-80):
+    """
+    line_network generates a line like the 1000 mm line standards, with its length, loss and impedance drawn
+    from the seed
+    :param f: The frequency points in Hz
+    :param seed: The seed of the line parameters and noise, an integer or sequence of integers
+    :param noise_db: The noise floor in dB, or None for no noise
+    :return: The network
+    """
+    rng = np.random.default_rng(seed)
+    s = lossy_line_s(f, rng.uniform(0.9, 1.1), rng.uniform(2, 4), rng.uniform(1.9, 2.3), rng.uniform(47, 53))
+    return make_network(f, add_noise(s, rng, noise_db), name='line')
+
+
+def filter_network(f, seed=0, noise_db=-80):
+    """
+    filter_network generates a cable and ripple low-pass filter DUT like the 1 m cable LPF, with the filter and
+    cable drawn from the seed
+    :param f: The frequency points in Hz
+    :param seed: The seed of the filter parameters and noise, an integer or sequence of integers
+    :param noise_db: The noise floor in dB, or None for no noise
+    :return: The network
+    """
+    rng = np.random.default_rng(seed)
+    cable = lossy_line_s(f, rng.uniform(0.9, 1.1), rng.uniform(1, 3), rng.uniform(1.9, 2.3), rng.uniform(48, 52))
+    lpf = ripple_lpf_s(f, 1.35e9 * rng.uniform(0.95, 1.05), rng.choice([3, 5, 7]), rng.uniform(0.5, 3))
+    return make_network(f, add_noise(cascade(cable, lpf), rng, noise_db), name='lpf')
+
+
+def solt_standards(f, seed=0, noise_db=-80):
+    """
+    solt_standards generates an imperfect Short, Open, Load and Thru kit and its raw measurements through a known
+    12-term error model, both drawn from the seed
+    :param f: The frequency points in Hz
+    :param seed: The seed of the kit parasitics, error terms and noise, an integer or sequence of integers
+    :param noise_db: The noise floor of the measurements in dB, or None for no noise
+    :return: A tuple of the ideal networks, measured networks and the error terms (F, 12) in ERROR_TERMS order
+    """
+    rng = np.random.default_rng(seed)
+    ideals = standard_ideals_s(f, inductance=rng.uniform(0, 20e-12), capacitance=rng.uniform(0, 50e-15),
+                               offset_delay=rng.uniform(0, 30e-12),
+                               load_reflection=0.02 * rng.uniform() * np.exp(2j * np.pi * rng.uniform()),
+                               thru_delay=rng.uniform(0, 50e-12))
+    terms = random_error_terms(f, rng)
+    measured = [add_noise(apply_error_terms(s, terms), rng, noise_db) for s in ideals]
+    return ([make_network(f, s, name=f'{name}_Ideal') for name, s in zip(STANDARDS, ideals)],
+            [make_network(f, s, name=f'{name}_Meas') for name, s in zip(STANDARDS, measured)], terms)
+
+
+def nport_standards(f, nports, seed=0, noise_db=-80):
+    """
+    nport_standards generates an imperfect Short, Open and Load on every port and a thru between every pair of
+    ports, with their raw measurements through a known N-port error model
+    :param f: The frequency points in Hz
+    :param nports: The number of ports
+    :param seed: The seed of the kit parasitics, error model and noise, an integer or sequence of integers
+    :param noise_db: The noise floor of the measurements in dB, or None for no noise
+    :return: A tuple of the ideal and measured reflect standard networks, the ideal 2-port thru network, the
+    measured networks with each thru of port_pairs connected and the NPortCalibration of the error model
+    """
+    rng = np.random.default_rng(seed)
+    ideals = standard_ideals_s(f, inductance=rng.uniform(0, 20e-12), capacitance=rng.uniform(0, 50e-15),
+                               offset_delay=rng.uniform(0, 30e-12),
+                               load_reflection=0.02 * rng.uniform() * np.exp(2j * np.pi * rng.uniform()),
+                               thru_delay=rng.uniform(0, 50e-12))
+    model = random_nport_error_model(f, nports, rng)
+
+    # Reflect standards on every port at once, thrus with the other ports terminated in matched loads
+    ports = np.arange(nports)
+    reflects = np.zeros((3, len(f), nports, nports), dtype=complex)
+    reflects[:, :, ports, ports] = ideals[:3, :, 0, 0][:, :, None]
+    thrus = np.zeros((len(port_pairs(nports)), len(f), nports, nports), dtype=complex)
+    for i, (j, k) in enumerate(port_pairs(nports)):
+        thrus[i][:, [[j], [k]], [j, k]] = ideals[3]
+
+    reflect_measured = add_noise(model.measure_s(reflects), rng, noise_db)
+    thru_measured = add_noise(model.measure_s(thrus), rng, noise_db)
+    return ([make_network(f, s, name=f'{name}_Ideal') for name, s in zip(STANDARDS, reflects)],
+            [make_network(f, s, name=f'{name}_Meas') for name, s in zip(STANDARDS, reflect_measured)],
+            make_network(f, ideals[3], name='Thru_Ideal'),
+            [make_network(f, s, name=f'Thru_{j + 1}{k + 1}_Meas')
+             for (j, k), s in zip(port_pairs(nports), thru_measured)], model)
+
+
+def nport_network(f, nports, seed=0, noise_db=-80):
+    """
+    nport_network generates an N-port DUT of lossy lines joining neighbouring ports, with weak crosstalk between
+    all other ports
+    :param f: The frequency points in Hz
+    :param nports: The number of ports
+    :param seed: The seed of the line parameters, crosstalk and noise, an integer or sequence of integers
+    :param noise_db: The noise floor in dB, or None for no noise
+    :return: The network
+    """
+    rng = np.random.default_rng(seed)
+    s = np.zeros((len(f), nports, nports), dtype=complex)
+    for j, k in port_pairs(nports):
+        if j % 2 == 0 and k == j + 1:
+            line = lossy_line_s(f, rng.uniform(0.1, 1.1), rng.uniform(1, 4), rng.uniform(1.9, 2.3),
+                                rng.uniform(47, 53))
+            s[:, [[j], [k]], [j, k]] = line
+        else:
+            s[:, j, k] = s[:, k, j] = mismatch_term(f, rng, -50, -40)
+    if nports % 2:
+        s[:, -1, -1] = mismatch_term(f, rng, -30, -20)
+    return make_network(f, add_noise(s, rng, noise_db), name=f'{nports}port')
+
+
+def write_touchstone(path, ntwk):
+    """
+    write_touchstone saves a network as Touchstone text in real and imaginary format, several times faster than
+    ntwk.write_touchstone for large networks
+    :param path: The path of the file to write
+    :param ntwk: The network
+    :return: NULL
+    """
+    points, nports = ntwk.s.shape[:2]
+
+    # 2-ports are written S11 S21 S12 S22 on one line, larger networks row by row with four pairs per line
+    order = ntwk.s.transpose(0, 2, 1) if nports == 2 else ntwk.s
+    pairs = order.reshape(points, nports * nports)
+    columns = np.empty((points, 1 + 2 * nports * nports))
+    columns[:, 0] = ntwk.f
+    columns[:, 1::2] = pairs.real
+    columns[:, 2::2] = pairs.imag
+
+    fields = ['%.12g']
+    for i in range(nports * nports):
+        end_of_line = nports > 2 and (i % nports == nports - 1 or i % nports % 4 == 3)
+        fields.append(' %.12g %.12g' + ('\n' if end_of_line and i < nports * nports - 1 else ''))
+    row = ''.join(fields) + '\n'
+
+    with open(path, 'w') as file:
+        file.write(f"! {ntwk.name or 'Synthetic network'}\n# Hz S RI R {Z0:g}\n")
+        for start in range(0, points, TOUCHSTONE_CHUNK):
+            chunk = columns[start:start + TOUCHSTONE_CHUNK]
+            file.write((row * len(chunk)) % tuple(chunk.ravel()))
+
+
+def write_network(ntwk, directory, name, file_format='touchstone'):
+    """
+    write_network saves a network as Touchstone text or as a memory-mappable .npy sidecar
+    :param ntwk: The network
+    :param directory: The directory to write to, created if required
+    :param name: The file name without extension
+    :param file_format: 'touchstone' for .sNp text, or 'npy' for a binary file read back with as_network
+    :return: The path of the written file
+    """
+    os.makedirs(directory, exist_ok=True)
+    if file_format == 'npy':
+        path = os.path.join(directory, name + '.npy')
+        write_sidecar(path, ntwk.f, ntwk.s, np.broadcast_to(ntwk.z0, ntwk.s.shape[:2]), ntwk.frequency.unit)
+    else:
+        path = os.path.join(directory, f"{name}.s{ntwk.nports}p")
+        write_touchstone(path, ntwk)
+    return path
+
+
+def kit_location(output_dir, path):
+    """
+    kit_location maps a path under SParam used by the GUI to its place in a dataset
+    :param output_dir: The directory the dataset is written to
+    :param path: The path used by the GUI, e.g. 'SParam/Meas/1000mm_line_short.s2p'
+    :return: A tuple of the directory and the file name without its extension, as taken by write_network
+    """
+    directory, name = os.path.split(os.path.relpath(path, 'SParam'))
+    return os.path.join(output_dir, directory), os.path.splitext(name)[0]
+
+
+def generate_dataset(output_dir, points=10001, duts=1, lines=1, seed=0, file_format='touchstone',
+                     start=DEFAULT_START, stop=DEFAULT_STOP, noise_db=-80):
+    """
+    generate_dataset writes a calibration kit, its raw measurements, raw DUT measurements and the true networks
+    behind them, laid out like the SParam folder with the file names the GUI reads. Every file has its own seed
+    stream, so changing the file counts leaves the other files unchanged
+    :param output_dir: The directory to write the dataset to
+    :param points: The number of frequency points of every network
+    :param duts: The number of ripple low-pass filter DUTs, the first is written as the GUI example DUT
+    :param lines: The number of lossy line DUTs
+    :param seed: The seed of the whole dataset
+    :param file_format: 'touchstone' or 'npy', see write_network
+    :param start: The first frequency in Hz
+    :param stop: The last frequency in Hz
+    :param noise_db: The noise floor of the measurements in dB, or None for no noise
+    :return: The manifest dictionary, also written to manifest.json
+    """
+    f = frequency_grid(points, start, stop)
+    ideals, measured, terms = solt_standards(f, [seed, SEED_STANDARDS], noise_db)
+    manifest = {
+        'seed': seed, 'points': points, 'start': start, 'stop': stop, 'format': file_format,
+        'ideals': [write_network(ntwk, *kit_location(output_dir, path), file_format)
+                   for ntwk, path in zip(ideals, IDEAL_FILES)],
+        'measured': [write_network(ntwk, *kit_location(output_dir, path), file_format)
+                     for ntwk, path in zip(measured, MEASURED_FILES)],
+        'duts': [], 'truth': [],
+    }
+
+    # Ground truth error terms, in ERROR_TERMS order
+    terms_path = os.path.join(output_dir, 'error_terms.npy')
+    np.save(terms_path, terms)
+    manifest['error_terms'] = terms_path
+    manifest['error_term_names'] = list(ERROR_TERMS)
+
+    # DUTs are saved as raw measurements through the kit's error model, their actual networks under Truth. The
+    # network and the noise of each DUT come from streams of its own
+    kinds = [(SEED_FILTERS, i, filter_network) for i in range(duts)]
+    kinds += [(SEED_LINES, i, line_network) for i in range(lines)]
+    names = [f'lpf_{i:04d}' for i in range(duts)] + [f'line_{i:04d}' for i in range(lines)]
+    if duts:
+        names[0] = kit_location(output_dir, DUT_FILE)[1]
+    for name, (kind, i, network) in zip(names, kinds):
+        ntwk = network(f, [seed, kind, i], None)
+        rng = np.random.default_rng([seed, SEED_NOISE, kind, i])
+        raw = make_network(f, add_noise(apply_error_terms(ntwk.s, terms), rng, noise_db), name)
+        manifest['duts'].append(write_network(raw, os.path.join(output_dir, 'DUTs'), name, file_format))
+        manifest['truth'].append(write_network(ntwk, os.path.join(output_dir, 'Truth'), name, file_format))
+
+    # Short, well matched fixture to de-embed
+    rng = np.random.default_rng([seed, SEED_FIXTURE])
+    fixture = make_network(f, lossy_line_s(f, 0.05, 0.2, 2.1, rng.uniform(49, 51)), 'de-embed')
+    manifest['fixture'] = write_network(fixture, os.path.join(output_dir, 'De_embed'), 'de-embed', file_format)
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def generate_nport_dataset(output_dir, nports, points=10001, duts=1, seed=0, file_format='touchstone',
+                           start=DEFAULT_START, stop=DEFAULT_STOP, noise_db=-80):
+    """
+    generate_nport_dataset writes an N-port calibration kit, its raw measurements, raw N-port DUT measurements and
+    the true networks behind them, with the file names of nport_kit_files and a seed stream per file like
+    generate_dataset
+    :param output_dir: The directory to write the dataset to
+    :param nports: The number of ports
+    :param points: The number of frequency points of every network
+    :param duts: The number of N-port DUTs, the first is written as the GUI example N-port DUT
+    :param seed: The seed of the whole dataset
+    :param file_format: 'touchstone' or 'npy', see write_network
+    :param start: The first frequency in Hz
+    :param stop: The last frequency in Hz
+    :param noise_db: The noise floor of the measurements in dB, or None for no noise
+    :return: The manifest dictionary, also written to manifest.json
+    """
+    f = frequency_grid(points, start, stop)
+    reflect_ideals, reflect_measured, thru_ideal, thru_measured, model = nport_standards(
+        f, nports, [seed, SEED_STANDARDS], noise_db)
+    reflect_ideal_paths, reflect_measured_paths, thru_ideal_paths, thru_measured_paths = nport_kit_files(nports)
+    thru_path = write_network(thru_ideal, *kit_location(output_dir, thru_ideal_paths[0]), file_format)
+    manifest = {
+        'seed': seed, 'points': points, 'start': start, 'stop': stop, 'format': file_format, 'ports': nports,
+        'ideals': [write_network(ntwk, *kit_location(output_dir, path), file_format)
+                   for ntwk, path in zip(reflect_ideals, reflect_ideal_paths)],
+        'measured': [write_network(ntwk, *kit_location(output_dir, path), file_format)
+                     for ntwk, path in zip(reflect_measured, reflect_measured_paths)],
+        'thru_ideals': [thru_path] * len(thru_ideal_paths),
+        'thru_measured': [write_network(ntwk, *kit_location(output_dir, path), file_format)
+                          for ntwk, path in zip(thru_measured, thru_measured_paths)],
+        'pairs': port_pairs(nports), 'duts': [], 'truth': [],
+    }
+
+    # Ground truth error model, as the stacks of NPortCalibration
+    model_path = os.path.join(output_dir, 'error_model.npz')
+    np.savez(model_path, frequency=f, offset=model.offset, tracking=model.tracking, match=model.match)
+    manifest['error_model'] = model_path
+
+    for i in range(duts):
+        name = kit_location(output_dir, NPORT_DUT_FILE.format(nports=nports))[1] if i == 0 else f'{nports}port_{i:04d}'
+        ntwk = nport_network(f, nports, [seed, SEED_LINES, i], None)
+        rng = np.random.default_rng([seed, SEED_NOISE, SEED_LINES, i])
+        raw = make_network(f, add_noise(model.measure_s(ntwk.s), rng, noise_db), name)
+        manifest['duts'].append(write_network(raw, os.path.join(output_dir, 'DUTs'), name, file_format))
+        manifest['truth'].append(write_network(ntwk, os.path.join(output_dir, 'Truth'), name, file_format))
+
+    # The same short fixture on every port
+    rng = np.random.default_rng([seed, SEED_FIXTURE])
+    fixture = make_network(f, lossy_line_s(f, 0.05, 0.2, 2.1, rng.uniform(49, 51)), 'de-embed')
+    manifest['fixture'] = write_network(fixture, os.path.join(output_dir, 'De_embed'), 'de-embed', file_format)
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w') as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic calibration and DUT dataset")
+    parser.add_argument('output_dir', help="directory to write the dataset to")
+    parser.add_argument('--points', type=int, default=10001, help="frequency points per network")
+    parser.add_argument('--ports', type=int, default=2, help="number of ports, above 2 writes an N-port kit")
+    parser.add_argument('--duts', type=int, default=1, help="number of ripple low-pass filter or N-port DUTs")
+    parser.add_argument('--lines', type=int, default=1, help="number of lossy line DUTs")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the whole dataset")
+    parser.add_argument('--format', choices=['touchstone', 'npy'], default='touchstone',
+                        help="Touchstone text, or memory-mappable .npy files")
+    parser.add_argument('--start', type=float, default=DEFAULT_START, help="first frequency in Hz")
+    parser.add_argument('--stop', type=float, default=DEFAULT_STOP, help="last frequency in Hz")
+    parser.add_argument('--noise', type=float, default=-80, help="measurement noise floor in dB")
+    args = parser.parse_args()
+
+    if args.ports == 2:
+        manifest = generate_dataset(args.output_dir, args.points, args.duts, args.lines, args.seed, args.format,
+                                    args.start, args.stop, args.noise)
+    else:
+        manifest = generate_nport_dataset(args.output_dir, args.ports, args.points, args.duts, args.seed,
+                                          args.format, args.start, args.stop, args.noise)
+    print(f"Wrote {len(manifest['duts'])} DUTs and a calibration kit of {args.points} points to {args.output_dir}")
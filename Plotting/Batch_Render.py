@@ -0,0 +1,177 @@
+# =========================================================================
+#           Headless Parallel Batch Plot Renderer
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+import time
+import matplotlib
+
+# Peak memory comes from resource on Unix, or from psutil where it is installed, e.g. on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# The Agg backend must be selected before pyplot is imported by VNA_Plots, so no window is ever opened
+matplotlib.use('Agg')
+
+import VNA_Plots
+from Touchstone_Cache import load_network
+
+# Plot types that can be rendered, keyed by the name used in output file names
+PLOT_TYPES = {
+    'phase_nano': VNA_Plots.plot_phase_nano_s2p,
+    'mag_nano': VNA_Plots.plot_mag_nano_s2p,
+    'return_nano': VNA_Plots.plot_return_nano_s2p,
+    'insertion_nano': VNA_Plots.plot_insertion_nano_s2p,
+    'group_nano': VNA_Plots.plot_group_nano_s2p,
+    'phase': VNA_Plots.plot_phase_s2p,
+    'mag': VNA_Plots.plot_mag_s2p,
+    'return': VNA_Plots.plot_return_s2p,
+    'insertion': VNA_Plots.plot_insertion_s2p,
+    'group': VNA_Plots.plot_group_s2p,
+}
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+MAXRSS_TO_MB = 1 / (1024 * 1024) if sys.platform == 'darwin' else 1 / 1024
+
+# State of each worker process, set once by init_worker
+worker_output_dir = None
+worker_image_format = None
+worker_network = (None, None)
+
+
+def init_worker(output_dir, image_format):
+    """
+    init_worker stores the output settings in a worker process
+    :param output_dir: The directory rendered images are written to
+    :param image_format: The image file extension, e.g. 'png'
+    :return: NULL
+    """
+    global worker_output_dir, worker_image_format
+    worker_output_dir = output_dir
+    worker_image_format = image_format
+
+
+def worker_load(path):
+    """
+    worker_load loads a network, keeping the most recent one so every plot type of a file shares one load and one
+    set of computed traces
+    :param path: The path to the Touchstone file
+    :return: The network
+    """
+    global worker_network
+    if worker_network[0] != path:
+        worker_network = (path, load_network(path))
+    return worker_network[1]
+
+
+def peak_memory_mb():
+    """
+    peak_memory_mb reports the peak resident memory of the calling process
+    :return: The peak resident set size in MB, or None where the platform does not report it
+    """
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * MAXRSS_TO_MB
+    memory = None if psutil is None else psutil.Process().memory_info()
+    if memory is not None and hasattr(memory, 'peak_wset'):
+        return memory.peak_wset / (1024 * 1024)
+    return None
+
+
+def render_task(task):
+    """
+    render_task renders one plot type of one network to an image file
+    :param task: A tuple of the Touchstone file path and the plot type name
+    :return: A tuple of the path, plot type, error message or None, worker process id and its peak memory in MB or
+    None
+    """
+    path, plot_type = task
+    try:
+        ntwk = worker_load(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        output = os.path.join(worker_output_dir, f"{name}_{plot_type}.{worker_image_format}")
+        PLOT_TYPES[plot_type](ntwk, name, output)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return path, plot_type, error, os.getpid(), peak_memory_mb()
+
+
+def batch_render(input_dir, output_dir, plot_types=None, pattern='*.s2p', image_format='png', workers=None,
+                 max_tasks_per_child=None):
+    """
+    batch_render renders every plot type of every network in a directory across a process pool
+    :param input_dir: The directory of Touchstone files
+    :param output_dir: The directory rendered images are written to
+    :param plot_types: The names of the plot types to render, or None for all of PLOT_TYPES
+    :param pattern: The glob pattern selecting Touchstone files within input_dir
+    :param image_format: The image file extension, e.g. 'png'
+    :param workers: The number of worker processes, or None for one per core
+    :param max_tasks_per_child: The number of plots a worker renders before being replaced, or None to keep workers
+    :return: A dictionary with the number of plots rendered, the failures, the throughput in plots per second and
+    the peak memory of each worker in MB, empty where the platform does not report it
+    """
+    plot_types = list(PLOT_TYPES) if plot_types is None else list(plot_types)
+    unknown = [plot_type for plot_type in plot_types if plot_type not in PLOT_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown plot types: {', '.join(unknown)}")
+
+    paths = sorted(glob.glob(os.path.join(input_dir, pattern)))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count()
+
+    # Tasks are ordered file by file and handed out one file at a time, so a worker loads each network once
+    tasks = [(path, plot_type) for path in paths for plot_type in plot_types]
+    chunksize = max(1, len(plot_types))
+    print(f"Rendering {len(tasks)} plots of {len(paths)} files with {workers} workers")
+
+    start = time.perf_counter()
+    rendered = 0
+    failures = []
+    peak_memory = {}
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=(output_dir, image_format),
+                              maxtasksperchild=max_tasks_per_child) as pool:
+        for path, plot_type, error, pid, memory in pool.imap_unordered(render_task, tasks, chunksize=chunksize):
+            if memory is not None:
+                peak_memory[pid] = max(memory, peak_memory.get(pid, 0.0))
+            if error is None:
+                rendered += 1
+            else:
+                failures.append((path, plot_type, error))
+                print(f"Failed to render {plot_type} of {path}: {error}")
+    elapsed = time.perf_counter() - start
+
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    print(f"Rendered {rendered} plots in {elapsed:.2f} s ({rate:.1f} plots/s), {len(failures)} failed")
+    for pid, memory in sorted(peak_memory.items()):
+        print(f"  Worker {pid}: peak memory {memory:.1f} MB")
+    if not peak_memory:
+        print("  Peak memory: n/a on this platform")
+    return {'rendered': rendered, 'failures': failures, 'plots_per_second': rate, 'peak_memory_mb': peak_memory}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render VNA plots for a directory of Touchstone files")
+    parser.add_argument('input_dir', help="directory of Touchstone files")
+    parser.add_argument('output_dir', help="directory rendered images are written to")
+    parser.add_argument('--plots', nargs='+', default=None, choices=list(PLOT_TYPES), metavar='PLOT',
+                        help=f"plot types to render, default all of: {', '.join(PLOT_TYPES)}")
+    parser.add_argument('--pattern', default='*.s2p', help="glob pattern of Touchstone files")
+    parser.add_argument('--format', default='png', help="image file format")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default one per core")
+    parser.add_argument('--max-tasks-per-child', type=int, default=None,
+                        help="plots rendered before a worker is replaced, bounds memory of long runs")
+    args = parser.parse_args()
+    batch_render(args.input_dir, args.output_dir, args.plots, args.pattern, args.format, args.workers,
+                 args.max_tasks_per_child)
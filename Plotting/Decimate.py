@@ -0,0 +1,168 @@
+# =========================================================================
+#           Shape-Preserving Trace Decimation
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import io
+import time
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# Available decimation methods
+METHODS = ('minmax', 'lttb')
+
+
+def minmax_indices(y, buckets):
+    """
+    minmax_indices keeps the lowest and highest point of each bucket, so every peak and notch survives decimation
+    :param y: The trace values, shape (N,)
+    :param buckets: The number of buckets, normally the width of the plot in pixels
+    :return: The ascending indices of the points to draw, at most 2 * buckets + 2 of them
+    """
+    n = len(y)
+    width = -(-n // buckets)
+    # Pad with the last value so the trace reshapes into equal buckets, padded positions map back to the last point
+    padded = np.empty(buckets * width, dtype=y.dtype)
+    padded[:n] = y
+    padded[n:] = y[-1]
+    rows = padded.reshape(buckets, width)
+    offsets = np.arange(buckets) * width
+    lows = offsets + np.argmin(rows, axis=1)
+    highs = offsets + np.argmax(rows, axis=1)
+    indices = np.concatenate(([0, n - 1], np.minimum(lows, n - 1), np.minimum(highs, n - 1)))
+    return np.unique(indices)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    lttb_indices selects points with Largest-Triangle-Three-Buckets, keeping the point of each bucket that forms
+    the largest triangle with the previously kept point and the average of the next bucket
+    :param x: The trace x values, shape (N,)
+    :param y: The trace values, shape (N,)
+    :param threshold: The number of points to keep, including the first and last
+    :return: The ascending indices of the points to draw
+    """
+    n = len(y)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    indices = np.empty(threshold, dtype=int)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        next_stop = edges[bucket + 2] if bucket + 2 < len(edges) else n
+        next_x = x[stop:next_stop].mean() if next_stop > stop else x[-1]
+        next_y = y[stop:next_stop].mean() if next_stop > stop else y[-1]
+
+        # Twice the triangle area, the constant factor does not change which point is largest
+        area = np.abs((x[previous] - next_x) * (y[start:stop] - y[previous])
+                      - (x[previous] - x[start:stop]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        indices[bucket + 1] = previous
+    return indices
+
+
+def decimate_indices(x, y, max_points, method='minmax'):
+    """
+    decimate_indices selects the points of a trace to draw. The indices can be applied to any array aligned with the
+    trace, e.g. the complex S-parameters behind a Smith chart
+    :param x: The trace x values, shape (N,)
+    :param y: The trace values used to choose points, shape (N,)
+    :param max_points: The maximum number of points to keep
+    :param method: 'minmax' or 'lttb'
+    :return: The ascending indices of the points to draw, or a slice of every point if no decimation is needed
+    """
+    n = len(y)
+    if method not in METHODS:
+        raise ValueError(f"Unknown decimation method {method}, expected one of {', '.join(METHODS)}")
+    if n <= max_points or max_points < 4:
+        return slice(None)
+    if method == 'minmax':
+        return minmax_indices(y, max(1, (max_points - 2) // 2))
+    return lttb_indices(x, y, max_points)
+
+
+def decimate(x, y, max_points, method='minmax'):
+    """
+    decimate reduces a trace to at most max_points points while preserving its visible shape
+    :param x: The trace x values, shape (N,)
+    :param y: The trace values, shape (N,)
+    :param max_points: The maximum number of points to keep
+    :param method: 'minmax' or 'lttb'
+    :return: A tuple of the decimated x and y values
+    """
+    indices = decimate_indices(x, y, max_points, method)
+    return x[indices], y[indices]
+
+
+def render_trace(x, y, figsize=(12, 4), dpi=100):
+    """
+    render_trace draws a single trace with the Agg renderer
+    :param x: The trace x values
+    :param y: The trace values
+    :param figsize: The figure size in inches
+    :param dpi: The resolution in dots per inch
+    :return: A tuple of the RGBA image array, the render time in seconds and the size of the PNG in bytes
+    """
+    start = time.perf_counter()
+    fig = plt.figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(x, y)
+    ax.set_xlim(x[0], x[-1])
+    ax.set_ylim(np.min(y), np.max(y))
+    canvas.draw()
+    image = np.asarray(canvas.buffer_rgba()).copy()
+    elapsed = time.perf_counter() - start
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    plt.close(fig)
+    return image, elapsed, buffer.tell()
+
+
+def validate_decimation(x, y, method='minmax', figsize=(12, 4), dpi=100):
+    """
+    validate_decimation renders a trace at full resolution and decimated to the plot width, and compares the images
+    :param x: The trace x values
+    :param y: The trace values
+    :param method: 'minmax' or 'lttb'
+    :param figsize: The figure size in inches
+    :param dpi: The resolution in dots per inch
+    :return: A dictionary with the points drawn, render times, PNG sizes and the fraction of pixels that differ
+    """
+    max_points = 2 * int(figsize[0] * dpi)
+    x_dec, y_dec = decimate(x, y, max_points, method)
+    full, full_time, full_size = render_trace(x, y, figsize, dpi)
+    reduced, reduced_time, reduced_size = render_trace(x_dec, y_dec, figsize, dpi)
+    differs = np.any(full != reduced, axis=2)
+    return {
+        'points': (len(x), len(x_dec)),
+        'render_seconds': (full_time, reduced_time),
+        'png_bytes': (full_size, reduced_size),
+        'pixels_differing': float(differs.mean()),
+        'max_channel_difference': int(np.max(np.abs(full.astype(int) - reduced.astype(int)))),
+    }
+
+
+if __name__ == "__main__":
+    matplotlib.use('Agg')
+
+    # A 1M point sweep with narrow resonances and noise, the case min/max and LTTB must keep visible
+    f = np.linspace(1e6, 6e9, 1_000_000)
+    rng = np.random.default_rng(0)
+    trace = -3 - 0.5 * rng.standard_normal(len(f))
+    for centre in (0.7e9, 2.4e9, 4.1e9):
+        trace -= 40 / (1 + ((f - centre) / 2e5) ** 2)
+
+    for method in METHODS:
+        result = validate_decimation(f, trace, method)
+        print(f"{method}: {result['points'][0]} -> {result['points'][1]} points, "
+              f"render {result['render_seconds'][0]:.2f} s -> {result['render_seconds'][1]:.3f} s, "
+              f"PNG {result['png_bytes'][0] / 1e3:.0f} kB -> {result['png_bytes'][1] / 1e3:.0f} kB, "
+              f"{100 * result['pixels_differing']:.2f} % of pixels differ")
@@ -0,0 +1,78 @@
+# =========================================================================
+#           Error Model - Vectorized Error Term Kernel
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Error terms in the order of the last axis of error_terms, forward terms first then reverse terms
+ERROR_TERMS = ('Ed1', 'Es1', 'El1', 'Ex12', 'Er1', 'Et1', 'Ed2', 'Es2', 'El2', 'Ex21', 'Er2', 'Et2')
+
+# Plot labels of each error term
+ERROR_LABELS = {
+    'Ed1': 'Directivity (Ed1)', 'Es1': 'Source Match (Es1)', 'El1': 'Load Match (El1)',
+    'Ex12': 'Crosstalk (Ex12)', 'Er1': 'Reflection Tracking (Er1)', 'Et1': 'Transmission Tracking (Et1)',
+    'Ed2': 'Directivity (Ed2)', 'Es2': 'Source Match (Es2)', 'El2': 'Load Match (El2)',
+    'Ex21': 'Crosstalk (Ex21)', 'Er2': 'Reflection Tracking (Er2)', 'Et2': 'Transmission Tracking (Et2)',
+}
+
+
+def error_terms(measured, true):
+    """
+    error_terms calculates all 12 error terms from measured and true S-parameters in a single vectorized pass
+    :param measured: The uncalibrated complex S-parameters, shape (N, 2, 2)
+    :param true: The calibrated complex S-parameters, shape (N, 2, 2), or (K, N, 2, 2) to compare K cases at once
+    :return: The complex error terms in ERROR_TERMS order, shape (N, 12), or (K, N, 12) for K cases
+    """
+    m11, m21, m12, m22 = measured[..., 0, 0], measured[..., 1, 0], measured[..., 0, 1], measured[..., 1, 1]
+    t11, t21, t12, t22 = true[..., 0, 0], true[..., 1, 0], true[..., 0, 1], true[..., 1, 1]
+
+    return np.stack([
+        m11 - t11,          # Directivity at port 1
+        m11 / t11 - 1,      # Source match at port 1
+        t11 / m11 - 1,      # Load match at port 1
+        m21 - t21,          # Crosstalk from port 1 to 2
+        m11 * t11,          # Reflection tracking for S11
+        m21 / t21,          # Transmission tracking for S21
+        m22 - t22,          # Directivity at port 2
+        m22 / t22 - 1,      # Source match at port 2
+        t22 / m22 - 1,      # Load match at port 2
+        m12 - t12,          # Crosstalk from port 2 to 1
+        m22 * t22,          # Reflection tracking for S22
+        m12 / t12,          # Transmission tracking for S12
+    ], axis=-1)
+
+
+def to_db(terms):
+    """
+    to_db converts complex error terms to magnitudes in decibels
+    :param terms: The complex error terms
+    :return: The error term magnitudes in dB, same shape as terms
+    """
+    return 20 * np.log10(np.abs(terms))
+
+
+def plot_term_grid(frequency, terms_db, case_labels):
+    """
+    plot_term_grid plots each error term on its own axes, forward terms on the first row and reverse terms on the
+    second, with one trace per case
+    :param frequency: The frequency range to plot over
+    :param terms_db: The error term magnitudes in dB, shape (K, N, 12)
+    :param case_labels: The legend label of each of the K cases
+    :return: NULL
+    """
+    # Create subplots for each error term in a 2-row, 6-column grid
+    fig, axs = plt.subplots(2, 6, figsize=(36, 16))
+    for i, (ax, name) in enumerate(zip(axs.flat, ERROR_TERMS)):
+        for case, label in zip(terms_db, case_labels):
+            ax.plot(frequency, case[:, i], label=label)
+        ax.set_title(ERROR_LABELS[name])
+        ax.set_xlabel('Frequency (Hz)')
+        ax.set_ylabel('Error Magnitude (dB)')
+        ax.legend()
+        ax.grid(True)
+
+    plt.tight_layout()
+    plt.show()
@@ -0,0 +1,113 @@
+# =========================================================================
+#           12 Term Error Model - Extraction From Standards
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import numpy as np
+from Touchstone_Cache import as_network
+from Error_Kernel import plot_term_grid, to_db
+from Grid_Align import align_s
+
+
+def solve_one_port(ideal, measured):
+    """
+    solve_one_port solves the three one-port error terms at every frequency from reflect standards. Each standard
+    gives the linear equation e00 + gamma * m * e11 - gamma * delta = m, with delta = e00 * e11 - e01 * e10. Three
+    standards are solved exactly, more are solved in the least squares sense through the normal equations
+    :param ideal: The ideal reflection coefficients of the standards, shape (R, N)
+    :param measured: The measured reflection coefficients of the standards, shape (R, N)
+    :return: A tuple of directivity, source match and reflection tracking, each shape (N,)
+    """
+    # Stack one (N, R, 3) system for all frequencies at once
+    a = np.stack([np.ones_like(ideal), ideal * measured, -ideal], axis=-1).transpose(1, 0, 2)
+    b = measured.T[..., None]
+    if a.shape[1] > 3:
+        a_h = a.conj().transpose(0, 2, 1)
+        a, b = a_h @ a, a_h @ b
+    e00, e11, delta = np.linalg.solve(a, b)[..., 0].T
+    return e00, e11, e00 * e11 - delta
+
+
+def solve_thru(directivity, source_match, reflection_tracking, isolation, thru, reflect, transmit):
+    """
+    solve_thru finds the load match and transmission tracking of one direction in closed form from the thru
+    :param directivity: The directivity of the driven port, shape (N,)
+    :param source_match: The source match of the driven port, shape (N,)
+    :param reflection_tracking: The reflection tracking of the driven port, shape (N,)
+    :param isolation: The isolation of this direction, shape (N,)
+    :param thru: The ideal thru S-parameters seen from the driven port, shape (N, 2, 2), or (..., N, 2, 2) to
+    solve several thrus at once
+    :param reflect: The measured reflection at the driven port with the thru connected, shape (N,)
+    :param transmit: The measured transmission with the thru connected, shape (N,)
+    :return: A tuple of load match and transmission tracking, each shape (N,), or (..., N) for several thrus
+    """
+    t11, t21, t12, t22 = thru[..., 0, 0], thru[..., 1, 0], thru[..., 0, 1], thru[..., 1, 1]
+
+    # Reflection of the thru and load match seen at the reference plane of the driven port
+    offset = reflect - directivity
+    gamma = offset / (reflection_tracking + source_match * offset)
+    load_match = (gamma - t11) / (t12 * t21 + t22 * (gamma - t11))
+
+    denominator = (1 - source_match * t11) * (1 - load_match * t22) - source_match * load_match * t12 * t21
+    transmission_tracking = (transmit - isolation) * denominator / t21
+    return load_match, transmission_tracking
+
+
+def extract_error_terms(ideals, measured, load_index=2):
+    """
+    extract_error_terms solves the forward and reverse 12-term error model from raw standard measurements for all
+    frequencies at once. The final standard is the thru, all others are reflect standards
+    :param ideals: The ideal S-parameters of the standards, shape (S, N, 2, 2), ordered e.g. Short, Open, Load, Thru
+    :param measured: The measured S-parameters of the standards, same shape and order as ideals
+    :param load_index: The index of the load standard, whose transmission gives the isolation terms
+    :return: The complex error terms in ERROR_TERMS order, shape (N, 12)
+    """
+    ideals = np.asarray(ideals)
+    measured = np.asarray(measured)
+    if len(ideals) < 4:
+        raise ValueError("At least three reflect standards and a thru are needed")
+    reflect_ideals, thru_ideal = ideals[:-1], ideals[-1]
+    reflect_measured, thru_measured = measured[:-1], measured[-1]
+
+    # One-port terms of each port from the reflect standards
+    ed1, es1, er1 = solve_one_port(reflect_ideals[..., 0, 0], reflect_measured[..., 0, 0])
+    ed2, es2, er2 = solve_one_port(reflect_ideals[..., 1, 1], reflect_measured[..., 1, 1])
+
+    # Isolation from the transmission measured with loads on both ports
+    ex12 = measured[load_index, :, 1, 0]
+    ex21 = measured[load_index, :, 0, 1]
+
+    # Forward terms drive port 1, reverse terms see the thru from port 2 so its ports are swapped
+    el1, et1 = solve_thru(ed1, es1, er1, ex12, thru_ideal, thru_measured[:, 0, 0], thru_measured[:, 1, 0])
+    swapped = thru_ideal[:, ::-1, ::-1]
+    el2, et2 = solve_thru(ed2, es2, er2, ex21, swapped, thru_measured[:, 1, 1], thru_measured[:, 0, 1])
+
+    return np.stack([ed1, es1, el1, ex12, er1, et1, ed2, es2, el2, ex21, er2, et2], axis=-1)
+
+
+def load_standards(ideal_paths, measured_paths):
+    """
+    load_standards loads the standard networks as stacked arrays on the frequency points of the measurements
+    :param ideal_paths: The ideal standard networks or paths, ordered e.g. Short, Open, Load, Thru
+    :param measured_paths: The measured standard networks or paths, same order as ideal_paths
+    :return: A tuple of the frequency points, ideal S-parameters and measured S-parameters, shape (S, N, 2, 2)
+    """
+    measured = [as_network(path) for path in measured_paths]
+    frequency = measured[0].f
+    ideals = np.stack([align_s(path, frequency) for path in ideal_paths])
+    return frequency, ideals, np.stack([align_s(ntwk, frequency) for ntwk in measured])
+
+
+def plot_extracted_error_terms(ideal_paths, measured_paths, label='Extracted'):
+    """
+    plot_extracted_error_terms is a handler to extract and plot the 12 term error model of a calibration kit
+    :param ideal_paths: The ideal standard networks or paths, ordered Short, Open, Load, Thru
+    :param measured_paths: The measured standard networks or paths, same order as ideal_paths
+    :param label: The legend label of the traces
+    :return: The complex error terms, shape (N, 12)
+    """
+    frequency, ideals, measured = load_standards(ideal_paths, measured_paths)
+    terms = extract_error_terms(ideals, measured)
+    plot_term_grid(frequency, to_db(terms)[None], [label])
+    return terms
@@ -6,45 +6,45 @@
 # Imports
 import skrf as rf
 import matplotlib.pyplot as plt
-import numpy as np
+from Touchstone_Cache import as_network
+from Error_Kernel import ERROR_TERMS, error_terms, to_db
+from Grid_Align import align_s
 
 def error_calc(uncalibrated, calibrated, plot_title):
     """
     error_calc is a handler to calculate and plot error terms
-    :param uncalibrated: The uncalibrated measurement network in the form of rf.Network('path-to-file.s2p')
-    :param calibrated: The calibrated measurement network in the form of rf.Network('path-to-file.s2p')
+    :param uncalibrated: The uncalibrated measurement network in the form of rf.Network('path-to-file.s2p') or a path
+    :param calibrated: The calibrated measurement network in the form of rf.Network('path-to-file.s2p') or a path
     :param plot_title: A string representing the title to be displayed on the plot
     :return: NULL
     """
-    frequency = uncalibrated.f  # Frequency in Hz from the Network object
+    uncalibrated = as_network(uncalibrated)
+    calibrated = as_network(calibrated)
+    frequency = calibrated.f  # Frequency in Hz from the Network object
 
-    uncalibrated = uncalibrated.interpolate(calibrated.f)   # Interpolate uncalibrated frequency range to match calibrated
+    uncalibrated_s = align_s(uncalibrated, calibrated.f)    # Interpolate uncalibrated frequency range to match calibrated
                                                             # in case there is any discrepency
-    # Calculating simple error terms
-    Ed = uncalibrated.s11 - calibrated.s11  # Directivity
-    Es = uncalibrated.s11 / calibrated.s11  # Source Mismatch
-    El = uncalibrated.s22 / calibrated.s22  # Load Mismatch
-    Ex = uncalibrated.s21 - calibrated.s21  # Crosstalk
-    Er = uncalibrated.s11 * calibrated.s11  # Reflection Tracking
-    Et = uncalibrated.s21 / calibrated.s21  # Transmission Tracking
-
-    # Convert all error terms to decibels
-    Ed_db = 20 * np.log10(np.abs(Ed.s))  # Directivity
-    Es_db = 20 * np.log10(np.abs(Es.s))  # Source Mismatch
-    El_db = 20 * np.log10(np.abs(El.s))  # Load Mismatch
-    Ex_db = 20 * np.log10(np.abs(Ex.s))  # Crosstalk
-    Er_db = 20 * np.log10(np.abs(Er.s))  # Reflection Tracking
-    Et_db = 20 * np.log10(np.abs(Et.s))  # Transmission Tracking
+    # Calculating all error terms in one pass over the raw S-parameters
+    terms = error_terms(uncalibrated_s, calibrated.s)
+    term = {name: terms[:, i] for i, name in enumerate(ERROR_TERMS)}
+
+    # The simple model reports the reflection ratios themselves rather than their deviation from one
+    Ed = term['Ed1']      # Directivity
+    Es = term['Es1'] + 1  # Source Mismatch
+    El = term['Es2'] + 1  # Load Mismatch
+    Ex = term['Ex12']     # Crosstalk
+    Er = term['Er1']      # Reflection Tracking
+    Et = term['Et1']      # Transmission Tracking
 
     # Plot the error terms in dB over frequency
     plt.figure(figsize=(10, 6))
 
-    plt.plot(frequency, Ed_db.flatten(), label='Directivity [dB]')
-    plt.plot(frequency, Es_db.flatten(), label='Source Mismatch [dB]')
-    plt.plot(frequency, El_db.flatten(), label='Load Mismatch [dB]')
-    plt.plot(frequency, Ex_db.flatten(), label='Crosstalk [dB]')
-    plt.plot(frequency, Er_db.flatten(), label='Reflection Tracking [dB]')
-    plt.plot(frequency, Et_db.flatten(), label='Transmission Tracking [dB]')
+    plt.plot(frequency, to_db(Ed), label='Directivity [dB]')
+    plt.plot(frequency, to_db(Es), label='Source Mismatch [dB]')
+    plt.plot(frequency, to_db(El), label='Load Mismatch [dB]')
+    plt.plot(frequency, to_db(Ex), label='Crosstalk [dB]')
+    plt.plot(frequency, to_db(Er), label='Reflection Tracking [dB]')
+    plt.plot(frequency, to_db(Et), label='Transmission Tracking [dB]')
 
     plt.title(plot_title)
     plt.xlabel('Frequency (Hz)')
@@ -0,0 +1,125 @@
+# =========================================================================
+#           Frequency Grid Alignment With Cached Interpolation Weights
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import skrf as rf
+from Touchstone_Cache import as_network
+
+# Mappings between grids, keyed by the hashes of the source and target grids, least recently used first
+MAX_MAPPINGS = 32
+_mappings = OrderedDict()
+_mappings_lock = threading.Lock()
+
+
+def grid_hash(f):
+    """
+    grid_hash identifies a frequency grid by its contents
+    :param f: The frequency points in Hz
+    :return: The hex digest of the frequency points
+    """
+    return hashlib.sha1(np.ascontiguousarray(f, dtype=np.float64).tobytes()).hexdigest()
+
+
+class GridMapping:
+    """
+    GridMapping holds the indices and weights that linearly interpolate data on one frequency grid onto another, so
+    resampling any number of networks is a single gather and blend
+    """
+
+    def __init__(self, source_f, target_f):
+        """
+        __init__ calculates the interpolation indices and weights
+        :param source_f: The ascending frequency points of the data in Hz
+        :param target_f: The frequency points to resample to in Hz
+        :return: NULL
+        """
+        source_f = np.asarray(source_f, dtype=np.float64)
+        target_f = np.asarray(target_f, dtype=np.float64)
+        if target_f.min() < source_f[0] or target_f.max() > source_f[-1]:
+            raise ValueError(f"Target frequencies {target_f.min()} to {target_f.max()} Hz are outside the "
+                             f"source range {source_f[0]} to {source_f[-1]} Hz")
+        self.target_f = target_f
+        self.identity = np.array_equal(source_f, target_f)
+        if len(source_f) < 2:
+            self.lower = np.zeros(len(target_f), dtype=int)
+            self.weight = np.zeros(len(target_f))
+            return
+        self.lower = np.clip(np.searchsorted(source_f, target_f, side='right') - 1, 0, len(source_f) - 2)
+        self.weight = (target_f - source_f[self.lower]) / (source_f[self.lower + 1] - source_f[self.lower])
+
+    def resample(self, data):
+        """
+        resample interpolates data along its first axis onto the target grid
+        :param data: The data on the source grid, shape (N, ...)
+        :return: The data on the target grid, shape (M, ...)
+        """
+        if self.identity:
+            return data
+        weight = self.weight.reshape((-1,) + (1,) * (np.ndim(data) - 1))
+        upper = np.minimum(self.lower + 1, len(data) - 1)
+        return data[self.lower] * (1 - weight) + data[upper] * weight
+
+
+def get_mapping(source_f, target_f):
+    """
+    get_mapping returns the mapping between two grids, calculating it only the first time the pair is seen
+    :param source_f: The ascending frequency points of the data in Hz
+    :param target_f: The frequency points to resample to in Hz
+    :return: The GridMapping
+    """
+    key = (grid_hash(source_f), grid_hash(target_f))
+    with _mappings_lock:
+        mapping = _mappings.get(key)
+        if mapping is not None:
+            _mappings.move_to_end(key)
+            return mapping
+
+    mapping = GridMapping(source_f, target_f)
+    with _mappings_lock:
+        _mappings[key] = mapping
+        while len(_mappings) > MAX_MAPPINGS:
+            _mappings.popitem(last=False)
+    return mapping
+
+
+def clear_mappings():
+    """
+    clear_mappings removes all cached grid mappings
+    :return: NULL
+    """
+    with _mappings_lock:
+        _mappings.clear()
+
+
+def align_s(ntwk, target_f):
+    """
+    align_s resamples the S-parameters of a network onto a frequency grid
+    :param ntwk: An rf.Network, or the path to a Touchstone file
+    :param target_f: The frequency points to resample to in Hz
+    :return: The complex S-parameters on the target grid, shape (M, N, N)
+    """
+    ntwk = as_network(ntwk)
+    return get_mapping(ntwk.f, target_f).resample(ntwk.s)
+
+
+def align(ntwk, target_f):
+    """
+    align is a drop-in replacement for ntwk.interpolate(target_f) that reuses the cached mapping between the grids
+    :param ntwk: An rf.Network, or the path to a Touchstone file
+    :param target_f: The frequency points to resample to in Hz
+    :return: The network on the target grid, or the network itself if it is already on that grid
+    """
+    ntwk = as_network(ntwk)
+    mapping = get_mapping(ntwk.f, target_f)
+    if mapping.identity:
+        return ntwk
+    frequency = rf.Frequency.from_f(mapping.target_f, unit='Hz')
+    frequency.unit = ntwk.frequency.unit
+    return rf.Network(frequency=frequency, s=mapping.resample(ntwk.s), z0=mapping.resample(ntwk.z0),
+                      name=ntwk.name)
@@ -0,0 +1,161 @@
+# =========================================================================
+#           Vectorized Group Delay
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import numpy as np
+
+
+def window_bounds(n, aperture):
+    """
+    window_bounds finds the frequency points each group delay is taken across. Windows are centred where possible
+    and shifted inwards at the ends of the sweep, so every point gets a delay over the full aperture
+    :param n: The number of frequency points
+    :param aperture: The number of frequency steps each delay is taken across
+    :return: A tuple of the lower and upper index arrays, shape (n,)
+    """
+    aperture = max(1, min(aperture, n - 1))
+    lower = np.clip(np.arange(n) - aperture // 2, 0, n - 1 - aperture)
+    return lower, lower + aperture
+
+
+def moving_average(x, window):
+    """
+    moving_average smooths along the first axis with a centred window using a cumulative sum, so the cost does not
+    depend on the window size. The window shrinks at the ends of the sweep
+    :param x: The values to smooth, shape (N, ...)
+    :param window: The number of points averaged, 1 for no smoothing
+    :return: The smoothed values, same shape as x
+    """
+    n = len(x)
+    half = window // 2
+    if half == 0 or n == 0:
+        return x
+    totals = np.concatenate((np.zeros((1,) + x.shape[1:]), np.cumsum(x, axis=0)))
+    lower = np.clip(np.arange(n) - half, 0, n)
+    upper = np.clip(np.arange(n) + half + 1, 0, n)
+    counts = (upper - lower).reshape((n,) + (1,) * (x.ndim - 1))
+    return (totals[upper] - totals[lower]) / counts
+
+
+def delay_from_phase(f, phase, aperture=1, smoothing=1):
+    """
+    delay_from_phase calculates group delay from unwrapped phase
+    :param f: The frequency points in Hz, shape (N,)
+    :param phase: The unwrapped phase in radians, shape (N, ...)
+    :param aperture: The number of frequency steps each delay is taken across
+    :param smoothing: The number of points in the moving average applied to the delay, 1 for no smoothing
+    :return: The group delay in seconds, same shape as phase
+    """
+    n = len(f)
+    if n < 2:
+        return np.zeros(phase.shape)
+    lower, upper = window_bounds(n, aperture)
+    step = (f[upper] - f[lower]).reshape((n,) + (1,) * (phase.ndim - 1))
+    delay = -(phase[upper] - phase[lower]) / (2 * np.pi * step)
+    return moving_average(delay, smoothing)
+
+
+def group_delay(f, s, aperture=1, smoothing=1):
+    """
+    group_delay calculates the group delay of every S-parameter at once, aligned with the frequency points
+    :param f: The frequency points in Hz, shape (N,)
+    :param s: The complex S-parameters, shape (N, ...), e.g. (N, P, P)
+    :param aperture: The number of frequency steps each delay is taken across, as the instrument aperture setting
+    :param smoothing: The number of points in the moving average applied to the delay, 1 for no smoothing
+    :return: The group delay in seconds, same shape as s
+    """
+    return delay_from_phase(f, np.unwrap(np.angle(s), axis=0), aperture, smoothing)
+
+
+def aperture_points(f, fraction):
+    """
+    aperture_points converts an aperture given as a fraction of the span, as set on most analyzers, to frequency steps
+    :param f: The frequency points in Hz
+    :param fraction: The aperture as a fraction of the span, e.g. 0.01 for 1 %
+    :return: The aperture in frequency steps, at least 1
+    """
+    return max(1, int(round(fraction * (len(f) - 1))))
+
+
+class GroupDelayStream:
+    """
+    GroupDelayStream calculates group delay as a sweep arrives in chunks. Delays are returned as soon as every point
+    they depend on has arrived, and match group_delay over the whole sweep
+    """
+
+    def __init__(self, aperture=1, smoothing=1):
+        """
+        __init__ starts an empty sweep
+        :param aperture: The number of frequency steps each delay is taken across
+        :param smoothing: The number of points in the moving average applied to the delay, 1 for no smoothing
+        :return: NULL
+        """
+        self.aperture = max(1, aperture)
+        self.smoothing = max(1, smoothing)
+        # Points needed before and after a point to calculate its delay without reaching the edge of the buffer. The
+        # lookback covers a whole aperture, as windows at the end of the sweep are shifted back
+        self.lookback = self.smoothing // 2 + self.aperture
+        self.lookahead = self.smoothing // 2 + self.aperture - self.aperture // 2
+        self.reset()
+
+    def reset(self):
+        """
+        reset discards any partial sweep so a new one can begin
+        :return: NULL
+        """
+        self.f = np.empty(0)
+        self.phase = None
+        self.pending = 0
+
+    def push(self, f, s):
+        """
+        push adds a chunk of the sweep
+        :param f: The frequency points of the chunk in Hz, shape (M,)
+        :param s: The complex S-parameters of the chunk, shape (M, ...)
+        :return: A tuple of the frequency points and group delays that are now complete, possibly empty
+        """
+        phase = np.angle(s)
+        if self.phase is None:
+            phase = np.unwrap(phase, axis=0)
+            self.phase = phase[:0]
+        else:
+            # Unwrap continuing from the last phase already received
+            phase = np.unwrap(np.concatenate((self.phase[-1:], phase)), axis=0)[1:]
+        self.f = np.concatenate((self.f, f))
+        self.phase = np.concatenate((self.phase, phase))
+        self.pending += len(f)
+
+        if len(self.f) <= self.aperture:
+            return self.f[:0], self.phase[:0]
+        return self._emit(len(self.f) - self.lookahead)
+
+    def finish(self):
+        """
+        finish returns the delays of the remaining points at the end of the sweep and resets the stream
+        :return: A tuple of the remaining frequency points and group delays
+        """
+        if self.phase is None:
+            return self.f, np.empty(0)
+        result = self._emit(len(self.f))
+        self.reset()
+        return result
+
+    def _emit(self, end):
+        """
+        _emit returns the delays of pending points up to end and trims the buffer to what later points still need
+        :param end: The buffer index after the last point to return
+        :return: A tuple of the frequency points and group delays
+        """
+        start = len(self.f) - self.pending
+        if end <= start:
+            return self.f[:0], self.phase[:0]
+        delay = delay_from_phase(self.f, self.phase, self.aperture, self.smoothing)
+        result = self.f[start:end], delay[start:end]
+        self.pending -= end - start
+
+        keep = max(0, end - self.lookback)
+        self.f = self.f[keep:]
+        self.phase = self.phase[keep:]
+        return result
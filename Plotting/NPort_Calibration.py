@@ -0,0 +1,245 @@
+# =========================================================================
+#           N-Port Calibration, Correction and De-embedding
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import numpy as np
+from Touchstone_Cache import as_network
+from Grid_Align import align_s
+from Error_Model import solve_one_port, solve_thru
+
+
+def port_pairs(nports):
+    """
+    port_pairs lists every pair of ports connected by a thru in a full N-port calibration
+    :param nports: The number of ports
+    :return: A list of (j, k) port index tuples with j < k
+    """
+    return [(j, k) for j in range(nports) for k in range(j + 1, nports)]
+
+
+def stack_2x2(s11, s21, s12, s22):
+    """
+    stack_2x2 builds a stack of 2x2 matrices from its four elements
+    :param s11: The [0, 0] elements, shape (F,)
+    :param s21: The [1, 0] elements, shape (F,)
+    :param s12: The [0, 1] elements, shape (F,)
+    :param s22: The [1, 1] elements, shape (F,)
+    :return: The matrices, shape (F, 2, 2)
+    """
+    return np.stack([np.stack([s11, s12], -1), np.stack([s21, s22], -1)], -2)
+
+
+class NPortCalibration:
+    """
+    NPortCalibration holds the N-port generalisation of the 12-term error model as three (F, N, N) stacks, indexed
+    [receiving port, driven port]. The diagonals hold directivity, reflection tracking and source match, the
+    off-diagonals hold isolation, transmission tracking and load match. Correction and de-embedding are the same
+    batched solve over every frequency
+    """
+
+    def __init__(self, frequency, offset, tracking, match):
+        """
+        __init__ stores the error model
+        :param frequency: The frequency points in Hz, shape (F,)
+        :param offset: Directivity on the diagonal and isolation off it, shape (F, N, N)
+        :param tracking: Reflection tracking on the diagonal and transmission tracking off it, shape (F, N, N)
+        :param match: Source match on the diagonal and load match off it, shape (F, N, N)
+        :return: NULL
+        """
+        self.frequency = np.asarray(frequency)
+        self.offset = offset
+        self.tracking = tracking
+        self.match = match
+
+    @property
+    def nports(self):
+        """
+        nports gives the number of ports of the error model
+        :return: The number of ports
+        """
+        return self.offset.shape[-1]
+
+    @classmethod
+    def from_standards(cls, frequency, reflect_ideals, reflect_measured, thru_ideals, thru_measured, pairs=None,
+                       load_index=2):
+        """
+        from_standards solves the error model from reflect standards measured on every port and a thru between
+        every pair of ports, for all ports, pairs and frequencies at once
+        :param frequency: The frequency points in Hz, shape (F,)
+        :param reflect_ideals: The ideal S-parameters of the reflect standards, shape (R, F, N, N), e.g. Short,
+        Open, Load. Only the diagonals are used
+        :param reflect_measured: The measured S-parameters of the reflect standards, same shape as reflect_ideals
+        :param thru_ideals: The ideal 2-port S-parameters of each thru, port 1 at the lower port, shape (P, F, 2, 2)
+        :param thru_measured: The measured N-port S-parameters with each thru connected, shape (P, F, N, N)
+        :param pairs: The (j, k) ports joined by each thru, or None for port_pairs order
+        :param load_index: The index of the load standard, whose transmissions give the isolation terms
+        :return: The NPortCalibration
+        """
+        reflect_ideals = np.asarray(reflect_ideals)
+        reflect_measured = np.asarray(reflect_measured)
+        thru_ideals = np.asarray(thru_ideals)
+        thru_measured = np.asarray(thru_measured)
+        standards, points, nports = reflect_measured.shape[:3]
+        pairs = port_pairs(nports) if pairs is None else [tuple(pair) for pair in pairs]
+        missing = set(port_pairs(nports)) - set(pairs)
+        if missing:
+            raise ValueError(f"No thru between ports {sorted((j + 1, k + 1) for j, k in missing)}")
+        if standards < 3:
+            raise ValueError("At least three reflect standards are needed")
+
+        # One-port terms of every port, solved as one stack of (F * N) systems
+        ports = np.arange(nports)
+        ideal = reflect_ideals[..., ports, ports].reshape(standards, -1)
+        measured = reflect_measured[..., ports, ports].reshape(standards, -1)
+        directivity, source_match, reflection_tracking = (term.reshape(points, nports)
+                                                          for term in solve_one_port(ideal, measured))
+
+        offset = reflect_measured[load_index].copy()
+        offset[:, ports, ports] = directivity
+        tracking = np.empty_like(offset)
+        tracking[:, ports, ports] = reflection_tracking
+        match = np.empty_like(offset)
+        match[:, ports, ports] = source_match
+
+        # Both directions of every thru are solved together, the reverse direction sees the thru with its ports
+        # swapped
+        driven = np.array([j for j, _ in pairs] + [k for _, k in pairs])
+        receiving = np.array([k for _, k in pairs] + [j for j, _ in pairs])
+        thru = np.concatenate([thru_ideals, thru_ideals[..., ::-1, ::-1]])
+
+        # Only the (2P, F) elements used are gathered from the measurements, never whole matrices
+        measurement = np.concatenate([np.arange(len(pairs)), np.arange(len(pairs))])
+        load_match, transmission_tracking = solve_thru(
+            directivity[:, driven].T, source_match[:, driven].T, reflection_tracking[:, driven].T,
+            offset[:, receiving, driven].T, thru, thru_measured[measurement, :, driven, driven],
+            thru_measured[measurement, :, receiving, driven])
+        match[:, receiving, driven] = load_match.T
+        tracking[:, receiving, driven] = transmission_tracking.T
+        return cls(frequency, offset, tracking, match)
+
+    @classmethod
+    def from_fixtures(cls, frequency, fixtures):
+        """
+        from_fixtures builds the error model of a 2-port fixture on each port, so applying it de-embeds them
+        :param frequency: The frequency points in Hz, shape (F,)
+        :param fixtures: The fixture S-parameters with port 1 facing the instrument and port 2 facing the DUT,
+        shape (N, F, 2, 2)
+        :return: The NPortCalibration
+        """
+        fixtures = np.asarray(fixtures).transpose(1, 0, 2, 3)
+        nports = fixtures.shape[1]
+        offset = np.zeros(fixtures.shape[:2] + (nports,), dtype=complex)
+        ports = np.arange(nports)
+        offset[:, ports, ports] = fixtures[:, :, 0, 0]
+
+        # A wave driven into port j crosses fixture j towards the DUT and fixture k back to the instrument
+        tracking = fixtures[:, :, None, 0, 1] * fixtures[:, None, :, 1, 0]
+        match = np.repeat(fixtures[:, :, None, 1, 1], nports, axis=2)
+        return cls(frequency, offset, tracking, match)
+
+    @classmethod
+    def from_terms(cls, frequency, terms):
+        """
+        from_terms builds a 2-port error model from the 12 error terms
+        :param frequency: The frequency points in Hz, shape (F,)
+        :param terms: The complex error terms in ERROR_TERMS order, shape (F, 12)
+        :return: The NPortCalibration
+        """
+        ed1, es1, el1, ex12, er1, et1, ed2, es2, el2, ex21, er2, et2 = np.asarray(terms).T
+        return cls(frequency, stack_2x2(ed1, ex12, ex21, ed2), stack_2x2(er1, et1, et2, er2),
+                   stack_2x2(es1, el1, el2, es2))
+
+    def to_terms(self):
+        """
+        to_terms gives a 2-port error model as the 12 error terms
+        :return: The complex error terms in ERROR_TERMS order, shape (F, 12)
+        """
+        if self.nports != 2:
+            raise ValueError(f"The 12 error terms describe a 2-port, this error model has {self.nports} ports")
+        o, t, m = self.offset, self.tracking, self.match
+        return np.stack([o[:, 0, 0], m[:, 0, 0], m[:, 1, 0], o[:, 1, 0], t[:, 0, 0], t[:, 1, 0],
+                         o[:, 1, 1], m[:, 1, 1], m[:, 0, 1], o[:, 0, 1], t[:, 1, 1], t[:, 0, 1]], axis=-1)
+
+    def apply_s(self, s):
+        """
+        apply_s corrects raw S-parameters. Each column is normalised by X = (S_m - offset) / tracking, then
+        S = X (I + match * X)^-1, solved for every frequency at once
+        :param s: The raw S-parameters, shape (F, N, N) for one DUT or (K, F, N, N) for K DUTs
+        :return: The corrected S-parameters, with the same shape as s
+        """
+        normalised = (s - self.offset) / self.tracking
+        system = np.eye(self.nports) + self.match * normalised
+        return np.linalg.solve(system.swapaxes(-1, -2), normalised.swapaxes(-1, -2)).swapaxes(-1, -2)
+
+    def measure_s(self, s):
+        """
+        measure_s gives the raw S-parameters an instrument with this error model measures, the inverse of apply_s
+        :param s: The actual S-parameters, shape (F, N, N) for one DUT or (K, F, N, N) for K DUTs
+        :return: The raw S-parameters, with the same shape as s
+        """
+        # Column j of X solves (I - S diag(match[:, j])) x_j = s_j, one batched solve per driven port keeps the
+        # systems at (..., N, N)
+        normalised = np.empty(np.broadcast_shapes(np.shape(s), self.match.shape), dtype=complex)
+        for j in range(self.nports):
+            system = np.eye(self.nports) - s * self.match[..., None, :, j]
+            normalised[..., :, j] = np.linalg.solve(system, s[..., :, j, None])[..., 0]
+        return self.offset + self.tracking * normalised
+
+    def apply(self, ntwk):
+        """
+        apply corrects a single DUT network
+        :param ntwk: The raw DUT network, on the same frequency grid as the error model
+        :return: A new corrected network
+        """
+        corrected = ntwk.copy()
+        corrected.s = self.apply_s(ntwk.s)
+        return corrected
+
+    def apply_batch(self, ntwks):
+        """
+        apply_batch corrects many DUT networks with a single vectorized call
+        :param ntwks: A list of raw DUT networks, on the same frequency grid as the error model
+        :return: A list of new corrected networks
+        """
+        s = self.apply_s(np.stack([ntwk.s for ntwk in ntwks]))
+        corrected = []
+        for ntwk, s_dut in zip(ntwks, s):
+            ntwk = ntwk.copy()
+            ntwk.s = s_dut
+            corrected.append(ntwk)
+        return corrected
+
+
+def solve_nport_calibration(reflect_ideal_paths, reflect_measured_paths, thru_ideal_paths, thru_measured_paths,
+                            pairs=None, frequency=None):
+    """
+    solve_nport_calibration loads an N-port calibration kit and solves its error model
+    :param reflect_ideal_paths: The ideal reflect standard networks or paths, ordered e.g. Short, Open, Load
+    :param reflect_measured_paths: The measured reflect standard networks or paths, same order
+    :param thru_ideal_paths: The ideal 2-port thru network or path of each pair of ports
+    :param thru_measured_paths: The measured N-port network or path with each thru connected
+    :param pairs: The (j, k) ports joined by each thru, or None for port_pairs order
+    :param frequency: The frequency grid in Hz the standards are interpolated to, or None for the grid of the
+    first measured standard
+    :return: The NPortCalibration
+    """
+    if frequency is None:
+        frequency = as_network(reflect_measured_paths[0]).f
+    reflect_ideals, reflect_measured, thru_ideals, thru_measured = (
+        np.stack([align_s(path, frequency) for path in paths])
+        for paths in (reflect_ideal_paths, reflect_measured_paths, thru_ideal_paths, thru_measured_paths))
+    return NPortCalibration.from_standards(frequency, reflect_ideals, reflect_measured, thru_ideals, thru_measured,
+                                           pairs)
+
+
+def fixture_deembedder(fixture, nports):
+    """
+    fixture_deembedder builds the operator removing the same 2-port fixture from every port of an N-port
+    :param fixture: The fixture network or path, port 1 facing the instrument
+    :param nports: The number of ports of the DUT
+    :return: The NPortCalibration whose apply de-embeds the fixtures
+    """
+    fixture = as_network(fixture)
+    return NPortCalibration.from_fixtures(fixture.f, np.repeat(fixture.s[None], nports, axis=0))
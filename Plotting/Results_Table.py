@@ -4,64 +4,149 @@
 # =========================================================================
 
 # Imports
+import os
 import skrf as rf
 import pandas as pd
 import numpy as np
+from Touchstone_Cache import as_network
 
 
-def result_tables(network1, network2, frequency_start, frequency_end, frequency_step, file_name):
+def default_parameters(nports):
     """
-    result_tables is a handler to determine and save values to a csv file
-    :param network1: The first measurement network in the form of rf.Network('path-to-file.s2p')
-    :param network2: The second measurement network in the form of rf.Network('path-to-file.s2p')
+    default_parameters lists the S-parameters saved for an N-port, the reflection at port 1 and the transmission
+    from port 1 to every other port
+    :param nports: The number of ports
+    :return: A list of (receiving, driven) port index tuples, [(0, 0), (1, 0)] for a 2-port
+    """
+    return [(0, 0)] + [(k, 0) for k in range(1, nports)]
+
+
+def table_columns(parameters):
+    """
+    table_columns names the quantities saved for each network, magnitude and phase of every S-parameter followed
+    by the return loss of the reflections and the insertion loss of the transmissions
+    :param parameters: A list of (receiving, driven) port index tuples
+    :return: A list of (column name, (receiving, driven), quantity) tuples in column order
+    """
+    columns = []
+    for m, n in parameters:
+        label = f'S{m + 1}{n + 1}'
+        columns += [(f'{label} Magnitude (dB)', (m, n), 'mag'), (f'{label} Phase (deg)', (m, n), 'phase')]
+    for m, n in parameters:
+        loss = 'Return Loss' if m == n else 'Insertion Loss'
+        columns.append((f'{loss} S{m + 1}{n + 1} (dB)', (m, n), 'loss'))
+    return columns
+
+
+def nearest_indices(frequencies, target_frequencies):
+    """
+    nearest_indices finds the closest frequency point to each target with a binary search
+    :param frequencies: The ascending frequency points of a network
+    :param target_frequencies: The frequencies to look up
+    :return: The index of the closest frequency point for each target
+    """
+    upper = np.clip(np.searchsorted(frequencies, target_frequencies), 1, len(frequencies) - 1)
+    lower = upper - 1
+    closer_lower = np.abs(target_frequencies - frequencies[lower]) <= np.abs(frequencies[upper] - target_frequencies)
+    return np.where(closer_lower, lower, upper)
+
+
+def lookup_rows(network, target_frequencies, method='nearest'):
+    """
+    lookup_rows extracts the S-parameters of a network at the target frequencies only
+    :param network: The network in the form of rf.Network('path-to-file.s2p')
+    :param target_frequencies: The frequencies to look up
+    :param method: 'nearest' for the closest measured point, or 'interpolate' for linear interpolation between the
+    two neighbouring points. Targets outside the network's range take the value at the nearest end
+    :return: The complex S-parameters at the target frequencies, shape (M, N, N)
+    """
+    frequencies = network.f
+    if method == 'nearest':
+        return network.s[nearest_indices(frequencies, target_frequencies)]
+    if method != 'interpolate':
+        raise ValueError(f"Unknown lookup method {method}, expected 'nearest' or 'interpolate'")
+
+    upper = np.clip(np.searchsorted(frequencies, target_frequencies), 1, len(frequencies) - 1)
+    lower = upper - 1
+    weight = (target_frequencies - frequencies[lower]) / (frequencies[upper] - frequencies[lower])
+    weight = np.clip(weight, 0, 1)[:, None, None]
+    return network.s[lower] * (1 - weight) + network.s[upper] * weight
+
+
+def save_table(table, file_name):
+    """
+    save_table writes a table in the format given by the file extension: .parquet or .feather for fast columnar
+    files, which need pyarrow, otherwise CSV
+    :param table: The pandas DataFrame to save
+    :param file_name: The name of the file to save data to
+    :return: NULL
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension == '.parquet':
+        table.to_parquet(file_name, index=False)
+    elif extension == '.feather':
+        table.to_feather(file_name)
+    else:
+        table.to_csv(file_name, index=False)
+
+
+def result_tables_multi(networks, labels, frequency_start, frequency_end, frequency_step, file_name,
+                        method='nearest', parameters=None):
+    """
+    result_tables_multi is a handler to determine and save values for any number of networks to a table file
+    :param networks: The measurement networks in the form of rf.Network('path-to-file.s2p') or paths, each may
+    have its own frequency points
+    :param labels: The label of each network used in the column names
     :param frequency_start: The starting frequency value
     :param frequency_end: The ending frequency value
     :param frequency_step: The frequency step value between each value saved to table
-    :param file_name: The name of the csv file to save data to
-    :return: NULL
+    :param file_name: The name of the csv, parquet or feather file to save data to
+    :param method: 'nearest' or 'interpolate', see lookup_rows
+    :param parameters: The (receiving, driven) port indices to save, or None for default_parameters of the
+    first network
+    :return: The pandas DataFrame that was saved
     """
-    # Ensure both networks have the same frequency points
-    frequencies1 = network1.f
-    frequencies2 = network2.f
+    networks = [as_network(network) for network in networks]
+    if len(labels) != len(networks):
+        raise ValueError(f"Got {len(labels)} labels for {len(networks)} networks")
+    if parameters is None:
+        parameters = default_parameters(networks[0].nports)
+    column_specs = table_columns(parameters)
 
     # Define the specific frequency points at given intervals
     target_frequencies = np.arange(frequency_start, frequency_end + frequency_step, frequency_step)
 
-    # Find indices of closest matching frequencies in the network data
-    indices = [np.argmin(np.abs(frequencies1 - f)) for f in target_frequencies]
-
-    # Extract log magnitude, phase, return loss, and insertion loss for both networks at these indices
-    s1_mag_db = network1.s_db[indices]  # Magnitude in dB for network 1 at target frequencies
-    s1_phase_deg = network1.s_deg[indices]  # Phase in degrees for network 1 at target frequencies
-
-    s2_mag_db = network2.s_db[indices]  # Magnitude in dB for network 2 at target frequencies
-    s2_phase_deg = network2.s_deg[indices]  # Phase in degrees for network 2 at target frequencies
-
-    # Calculate return loss and insertion loss for both networks at these indices
-    return_loss_s11_1 = -s1_mag_db[:, 0, 0]  # Return loss S11 (network 1)
-    return_loss_s11_2 = -s2_mag_db[:, 0, 0]  # Return loss S11 (network 2)
-
-    insertion_loss_s21_1 = -s1_mag_db[:, 1, 0]  # Insertion loss S21 (network 1)
-    insertion_loss_s21_2 = -s2_mag_db[:, 1, 0]  # Insertion loss S21 (network 2)
-
-    # Create a DataFrame to compare the two networks at the specified frequencies
-    comparison_df = pd.DataFrame({
-        'Frequency (Hz)': target_frequencies,
-        'S11 Magnitude (dB) - Uncalibrated': s1_mag_db[:, 0, 0],
-        'S11 Magnitude (dB) - Calibrated': s2_mag_db[:, 0, 0],
-        'S11 Phase (deg) - Uncalibrated': s1_phase_deg[:, 0, 0],
-        'S11 Phase (deg) - Calibrated': s2_phase_deg[:, 0, 0],
-        'S21 Magnitude (dB) - Uncalibrated': s1_mag_db[:, 1, 0],
-        'S21 Magnitude (dB) - Calibrated': s2_mag_db[:, 1, 0],
-        'S21 Phase (deg) - Uncalibrated': s1_phase_deg[:, 1, 0],
-        'S21 Phase (deg) - Calibrated': s2_phase_deg[:, 1, 0],
-        'Return Loss S11 (dB) - Uncalibrated': return_loss_s11_1,
-        'Return Loss S11 (dB) - Calibrated': return_loss_s11_2,
-        'Insertion Loss S21 (dB) - Uncalibrated': insertion_loss_s21_1,
-        'Insertion Loss S21 (dB) - Calibrated': insertion_loss_s21_2,
-    })
-
-    # Export the comparison to a CSV file
-    comparison_df.to_csv(file_name, index=False)
+    # Magnitude and phase are only calculated at the requested rows of each network
+    columns = {name: [] for name, _, _ in column_specs}
+    for network in networks:
+        s = lookup_rows(network, target_frequencies, method)
+        mag_db = 20 * np.log10(np.abs(s) + 1e-15)
+        quantities = {'mag': mag_db, 'phase': np.degrees(np.angle(s)), 'loss': -mag_db}
+        for name, (m, n), quantity in column_specs:
+            columns[name].append(quantities[quantity][:, m, n])
+
+    # Create a DataFrame comparing every network at the specified frequencies
+    table = {'Frequency (Hz)': target_frequencies}
+    for name, _, _ in column_specs:
+        for label, values in zip(labels, columns[name]):
+            table[f'{name} - {label}'] = values
+    comparison_df = pd.DataFrame(table)
 
+    save_table(comparison_df, file_name)
     print("Comparison data saved to " + file_name)
+    return comparison_df
+
+
+def result_tables(network1, network2, frequency_start, frequency_end, frequency_step, file_name):
+    """
+    result_tables is a handler to determine and save values to a csv file
+    :param network1: The first measurement network in the form of rf.Network('path-to-file.s2p') or a path
+    :param network2: The second measurement network in the form of rf.Network('path-to-file.s2p') or a path
+    :param frequency_start: The starting frequency value
+    :param frequency_end: The ending frequency value
+    :param frequency_step: The frequency step value between each value saved to table
+    :param file_name: The name of the csv file to save data to
+    :return: NULL
+    """
+    result_tables_multi([network1, network2], ['Uncalibrated', 'Calibrated'], frequency_start, frequency_end,
+                        frequency_step, file_name)
@@ -0,0 +1,194 @@
+# =========================================================================
+#           Touchstone Loader With Binary Sidecar Cache
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import hashlib
+import json
+import os
+import numpy as np
+import skrf as rf
+
+# Sidecars are kept in a hidden directory beside the Touchstone files they cache
+SIDECAR_DIR = '.touchstone_cache'
+SIDECAR_VERSION = 1
+
+
+def sidecar_paths(path):
+    """
+    sidecar_paths gives the locations of the binary sidecar and its metadata for a Touchstone file
+    :param path: The path to the Touchstone file
+    :return: A tuple of the .npy array path and the .json metadata path
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    base = os.path.join(directory, SIDECAR_DIR, name)
+    return base + '.npy', base + '.json'
+
+
+def sidecar_dtype(nports):
+    """
+    sidecar_dtype gives the record layout of one frequency point in the sidecar
+    :param nports: The number of ports of the network
+    :return: A numpy structured dtype with frequency, S-parameter and port impedance fields
+    """
+    return np.dtype([('f', '<f8'), ('s', '<c16', (nports, nports)), ('z0', '<c16', (nports,))])
+
+
+def content_hash(path):
+    """
+    content_hash calculates the SHA-256 of a file's contents
+    :param path: The path to the file
+    :return: The hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_sidecar(array_path, f, s, z0, unit='Hz', source=None):
+    """
+    write_sidecar saves frequency, S-parameter and impedance arrays as a memory-mappable .npy file
+    :param array_path: The path of the .npy file to write, metadata is written beside it as .json
+    :param f: The frequency points in Hz, shape (F,)
+    :param s: The complex S-parameters, shape (F, N, N)
+    :param z0: The complex port impedances, shape (F, N)
+    :param unit: The frequency unit to restore on the loaded network
+    :param source: An optional dictionary describing the Touchstone file the sidecar was built from
+    :return: NULL
+    """
+    records = np.empty(len(f), dtype=sidecar_dtype(s.shape[1]))
+    records['f'] = f
+    records['s'] = s
+    records['z0'] = z0
+    metadata = {'version': SIDECAR_VERSION, 'unit': unit, 'source': source}
+
+    # Write to temporary files first so concurrent readers never see a partial sidecar
+    os.makedirs(os.path.dirname(array_path), exist_ok=True)
+    suffix = f".{os.getpid()}.tmp"
+    with open(array_path + suffix, 'wb') as file:
+        np.save(file, records)
+    with open(array_path[:-4] + '.json' + suffix, 'w') as file:
+        json.dump(metadata, file)
+    os.replace(array_path + suffix, array_path)
+    os.replace(array_path[:-4] + '.json' + suffix, array_path[:-4] + '.json')
+
+
+def read_metadata(metadata_path):
+    """
+    read_metadata reads the metadata of a sidecar
+    :param metadata_path: The path to the .json metadata
+    :return: The metadata dictionary, or None if missing or unreadable
+    """
+    try:
+        with open(metadata_path) as file:
+            metadata = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return metadata if metadata.get('version') == SIDECAR_VERSION else None
+
+
+def is_fresh(path, metadata_path):
+    """
+    is_fresh checks the sidecar still matches its Touchstone file. The size and modification time are compared
+    first, the contents are only hashed when the modification time differs
+    :param path: The path to the Touchstone file
+    :param metadata_path: The path to the sidecar .json metadata
+    :return: True if the sidecar can be used, otherwise False
+    """
+    metadata = read_metadata(metadata_path)
+    if metadata is None or metadata.get('source') is None:
+        return False
+    source = metadata['source']
+    stat = os.stat(path)
+    if stat.st_size != source['size']:
+        return False
+    if stat.st_mtime_ns == source['mtime_ns']:
+        return True
+    if content_hash(path) != source['sha256']:
+        return False
+
+    # Same contents with a new modification time, record it to skip hashing next time
+    source['mtime_ns'] = stat.st_mtime_ns
+    with open(metadata_path, 'w') as file:
+        json.dump(metadata, file)
+    return True
+
+
+def build_sidecar(path):
+    """
+    build_sidecar parses a Touchstone file and saves its binary sidecar
+    :param path: The path to the Touchstone file
+    :return: The parsed network
+    """
+    stat = os.stat(path)
+    source = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash(path)}
+    ntwk = rf.Network(path)
+    array_path, _ = sidecar_paths(path)
+    try:
+        write_sidecar(array_path, ntwk.f, ntwk.s, ntwk.z0, ntwk.frequency.unit, source)
+    except OSError:
+        # A read-only data directory still loads, just without the sidecar
+        pass
+    return ntwk
+
+
+def load_arrays(path):
+    """
+    load_arrays returns the frequency, S-parameters and port impedances of a Touchstone file as memory-mapped
+    arrays, building the sidecar on first use or when the file has changed
+    :param path: The path to the Touchstone file
+    :return: A tuple of f (F,), s (F, N, N) and z0 (F, N) arrays
+    """
+    array_path, metadata_path = sidecar_paths(path)
+    if not (os.path.exists(array_path) and is_fresh(path, metadata_path)):
+        ntwk = build_sidecar(path)
+        return ntwk.f, ntwk.s, ntwk.z0
+    records = np.load(array_path, mmap_mode='r')
+    return records['f'], records['s'], records['z0']
+
+
+def load_network(path):
+    """
+    load_network is a drop-in replacement for rf.Network('path-to-file.s2p') that reads the binary sidecar when
+    it is up to date and only parses the Touchstone text otherwise
+    :param path: The path to the Touchstone file
+    :return: The network
+    """
+    array_path, metadata_path = sidecar_paths(path)
+    if not (os.path.exists(array_path) and is_fresh(path, metadata_path)):
+        return build_sidecar(path)
+    return read_sidecar(array_path, os.path.splitext(os.path.basename(path))[0])
+
+
+def read_sidecar(array_path, name=None):
+    """
+    read_sidecar builds a network on the memory-mapped arrays of a sidecar, with or without a Touchstone source
+    :param array_path: The path to the .npy file, its metadata is read from the .json beside it
+    :param name: The name of the network, or None to use the file name
+    :return: The network
+    """
+    metadata = read_metadata(array_path[:-4] + '.json')
+    if metadata is None:
+        raise ValueError(f"{array_path} has no readable sidecar metadata")
+    records = np.load(array_path, mmap_mode='r')
+    frequency = rf.Frequency.from_f(records['f'], unit='Hz')
+    frequency.unit = metadata['unit']
+    if name is None:
+        name = os.path.splitext(os.path.basename(array_path))[0]
+    return rf.Network(frequency=frequency, s=records['s'], z0=records['z0'], name=name)
+
+
+def as_network(ntwk):
+    """
+    as_network accepts either a network, a path to a Touchstone file or a path to a standalone .npy sidecar
+    :param ntwk: An rf.Network, or the path to a Touchstone or .npy file
+    :return: The network
+    """
+    if isinstance(ntwk, (str, os.PathLike)):
+        if os.fspath(ntwk).endswith('.npy'):
+            return read_sidecar(os.fspath(ntwk))
+        return load_network(ntwk)
+    return ntwk
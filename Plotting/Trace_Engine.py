@@ -0,0 +1,91 @@
+# =========================================================================
+#           Vectorized Trace Engine
+#           By Dylan Fleming, 45313345
+# =========================================================================
+
+# Imports
+import weakref
+import numpy as np
+from Touchstone_Cache import as_network
+from Group_Delay import group_delay
+
+# Computed traces, keyed by network identity and band. Entries are dropped when the network is garbage collected
+_trace_cache = {}
+
+
+class Traces:
+    """
+    Traces holds every derived quantity of a network over a frequency band, computed in one vectorized pass over
+    the whole (F, N, N) S-parameter array
+    """
+
+    def __init__(self, f, s, aperture=1, smoothing=1):
+        """
+        __init__ computes the derived traces for all S-parameters at once
+        :param f: The frequency points in Hz, shape (F,)
+        :param s: The complex S-parameters, shape (F, N, N)
+        :param aperture: The number of frequency steps each group delay is taken across
+        :param smoothing: The number of points in the moving average applied to the group delay
+        :return: NULL
+        """
+        self.f = f
+        self.s = s
+
+        # Magnitude and phase of every S-parameter
+        self.mag_db = 20 * np.log10(np.abs(s) + 1e-15)
+        self.phase_deg = np.degrees(np.angle(s))
+
+        # Return loss of each port and insertion loss of every path, in dB
+        self.return_loss = -np.diagonal(self.mag_db, axis1=1, axis2=2)
+        self.insertion_loss = -self.mag_db
+
+        # Group delay of every S-parameter in seconds, aligned with f
+        self.group_delay = group_delay(f, s, aperture, smoothing)
+
+
+def band_slice(f, max_freq=None, min_freq=None):
+    """
+    band_slice finds the frequency band as a slice, so band-limited arrays are views rather than copies
+    :param f: The ascending frequency points in Hz
+    :param max_freq: The highest frequency included, or None for no upper limit
+    :param min_freq: The lowest frequency included, or None for no lower limit
+    :return: A slice selecting the band along the frequency axis
+    """
+    start = 0 if min_freq is None else np.searchsorted(f, min_freq, side='left')
+    stop = len(f) if max_freq is None else np.searchsorted(f, max_freq, side='right')
+    return slice(int(start), int(stop))
+
+
+def compute_traces(ntwk, max_freq=None, min_freq=None, aperture=1, smoothing=1):
+    """
+    compute_traces returns the derived traces of a network over a band, computing them only on first use. Later
+    calls for the same network and band return the cached result
+    :param ntwk: An rf.Network, or the path to a Touchstone file
+    :param max_freq: The highest frequency included, or None for no upper limit
+    :param min_freq: The lowest frequency included, or None for no lower limit
+    :param aperture: The number of frequency steps each group delay is taken across
+    :param smoothing: The number of points in the moving average applied to the group delay
+    :return: The Traces of the network over the band
+    """
+    ntwk = as_network(ntwk)
+    key = (id(ntwk), max_freq, min_freq, aperture, smoothing)
+    cached = _trace_cache.get(key)
+
+    # The cache is only valid while the network still holds the same S-parameter array
+    if cached is not None and cached[0] is ntwk.s:
+        return cached[1]
+
+    band = band_slice(ntwk.f, max_freq, min_freq)
+    traces = Traces(ntwk.f[band], ntwk.s[band], aperture, smoothing)
+    if cached is None:
+        weakref.finalize(ntwk, _trace_cache.pop, key, None)
+    _trace_cache[key] = (ntwk.s, traces)
+    return traces
+
+
+def clear_trace_cache():
+    """
+    clear_trace_cache removes all computed traces
+    :return: NULL
+    """
+    _trace_cache.clear()
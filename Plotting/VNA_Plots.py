@@ -1,435 +1,261 @@
 import skrf as rf
 import matplotlib.pyplot as plt
 import numpy as np
+from Trace_Engine import band_slice, compute_traces
+from Touchstone_Cache import as_network
+from Decimate import decimate, decimate_indices
+from Grid_Align import align_s
 
-def plot_mag_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(15, 12))
-    fig.suptitle(title)
+# Optional decimation of line traces, off by default so every point is drawn
+decimation_method = None
+decimation_points = None
 
-    # Filter frequencies up to 1 GHz (1e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Magnitude of S11, S12, and S22
-    axs.set_title('Log Magnitude (S11, S12, S22)')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15), label='S11')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1]) + 1e-15), label='S12')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1]) + 1e-15), label='S22')
-
-    # Labeling and grid
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Magnitude (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
 
-def plot_phase_nano_s2p(ntwk, title, plot_title):
+# Enable decimation with 'minmax' or 'lttb', or disable it with None. With no point limit, traces are capped at two
+# points per horizontal pixel of the axes they are drawn on
+def set_decimation(method, max_points=None):
+    global decimation_method, decimation_points
+    decimation_method = method
+    decimation_points = max_points
+
+
+# Group delay aperture and smoothing in frequency points, the defaults take each delay across a single step
+group_delay_aperture = 1
+group_delay_smoothing = 1
+
+
+# Set the group delay aperture in frequency steps and the number of points in its moving average
+def set_group_delay(aperture, smoothing=1):
+    global group_delay_aperture, group_delay_smoothing
+    group_delay_aperture = aperture
+    group_delay_smoothing = smoothing
+
+
+# Get the traces of a network up to max_freq with the current group delay settings
+def band_traces(ntwk, max_freq):
+    return compute_traces(ntwk, max_freq, aperture=group_delay_aperture, smoothing=group_delay_smoothing)
+
+
+# Draw a line trace, decimated to the axes resolution when decimation is enabled
+def plot_line(ax, x, y, **kwargs):
+    if decimation_method is not None:
+        max_points = decimation_points or 2 * int(ax.get_window_extent().width)
+        x, y = decimate(x, y, max_points, decimation_method)
+    return ax.plot(x, y, **kwargs)
+
+
+# Draw a complex trace on a Smith chart, decimated by frequency index when decimation is enabled
+def plot_smith_line(ax, trace, **kwargs):
+    if decimation_method is not None:
+        max_points = decimation_points or 2 * int(ax.get_window_extent().width)
+        trace = trace[decimate_indices(np.arange(len(trace)), np.abs(trace), max_points, decimation_method)]
+    return ax.plot(trace.real, trace.imag, **kwargs)
+
+
+# Draw the Smith chart grid once and add every trace to it. Traces are slices of the S-parameter array, so no
+# network copies are made
+def plot_smith_axes(ax, traces, labels, title, fontsize=None, show_legend=True):
+    ax.set_title(title, fontsize=fontsize)
+    rf.plotting.smith(ax=ax)
+    # The grid lies inside the axes, leaving its many arcs out of tight_layout saves measuring each one
+    for patch in ax.patches:
+        patch.set_in_layout(False)
+    for trace, label in zip(traces, labels):
+        plot_smith_line(ax, trace, label=label)[0].set_in_layout(False)
+    ax.set_aspect('equal', adjustable='box')
+    ax.axis([-1.1, 1.1, -1.1, 1.1])
+    if show_legend:
+        ax.legend()
+
+
+# Plot one or more traces against frequency with the standard labelling
+def plot_traces(ax, f, traces, labels, title, ylabel):
+    ax.set_title(title)
+    for trace, label in zip(traces, labels):
+        plot_line(ax, f, trace, label=label)
+    ax.set_xlabel('Frequency (Hz)')
+    ax.set_ylabel(ylabel)
+    ax.grid(True)
+    ax.legend()
+
+
+# S-parameters drawn for an N-port, a 2-port gives S11, S12, S22 for magnitude and phase, S11, S22 for the
+# reflections and S21 for the transmissions
+def reflection_pairs(nports):
+    return [(k, k) for k in range(nports)]
+
+
+def upper_pairs(nports):
+    return [(m, n) for m in range(nports) for n in range(m, nports)]
+
+
+def transmission_pairs(nports):
+    return [(n, m) for m in range(nports) for n in range(m + 1, nports)]
+
+
+def smith_pairs(nports):
+    return reflection_pairs(nports) + [(m, n) for m, n in upper_pairs(nports) if m != n]
+
+
+def pair_label(pair):
+    return f'S{pair[0] + 1}{pair[1] + 1}'
+
+
+# Name every S-parameter in a title, or the first and last when there are too many to read
+def pairs_title(name, pairs):
+    labels = [pair_label(pair) for pair in pairs]
+    if len(labels) > 4:
+        labels = [labels[0], '...', labels[-1]]
+    return f"{name} ({', '.join(labels)})"
+
+
+def plot_smith_pairs(ax, tr):
+    pairs = smith_pairs(tr.s.shape[-1])
+    plot_smith_axes(ax, [tr.s[:, m, n] for m, n in pairs], [pair_label(pair) for pair in pairs],
+                    pairs_title('Smith Chart', pairs))
+
+
+def plot_mag_axes(ax, tr):
+    pairs = upper_pairs(tr.s.shape[-1])
+    plot_traces(ax, tr.f, [tr.mag_db[:, m, n] for m, n in pairs], [pair_label(pair) for pair in pairs],
+                pairs_title('Log Magnitude', pairs), 'Magnitude (dB)')
+
+
+def plot_phase_axes(ax, tr):
+    pairs = upper_pairs(tr.s.shape[-1])
+    plot_traces(ax, tr.f, [tr.phase_deg[:, m, n] for m, n in pairs], [pair_label(pair) for pair in pairs],
+                pairs_title('Phase Response', pairs), 'Phase (degrees)')
+
+
+def plot_return_axes(ax, tr):
+    # A 2-port shows the return loss of port 1 only
+    pairs = reflection_pairs(tr.s.shape[-1])
+    pairs = pairs[:1] if len(pairs) == 2 else pairs
+    plot_traces(ax, tr.f, [tr.return_loss[:, m] for m, _ in pairs],
+                [f'Return Loss ({pair_label(pair)})' for pair in pairs], pairs_title('Return Loss', pairs),
+                'Return Loss (dB)')
+
+
+def plot_insertion_axes(ax, tr):
+    pairs = transmission_pairs(tr.s.shape[-1])
+    plot_traces(ax, tr.f, [tr.insertion_loss[:, m, n] for m, n in pairs],
+                [f'Insertion Loss ({pair_label(pair)})' for pair in pairs], pairs_title('Insertion Loss', pairs),
+                'Insertion Loss (dB)')
+
+
+def plot_group_axes(ax, tr):
+    pairs = reflection_pairs(tr.s.shape[-1])
+    plot_traces(ax, tr.f, [tr.group_delay[:, m, n] for m, n in pairs],
+                [f'{pair_label(pair)} Group Delay' for pair in pairs], pairs_title('Group Delay', pairs),
+                'Group Delay (s)')
+
+
+# Create a single plot figure, draw it and save it
+def save_single_plot(ntwk, title, plot_title, max_freq, plot_axes):
     # Create the figure and axis
     fig, axs = plt.subplots(figsize=(36, 16))
     fig.suptitle(title)
 
-    # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Phase response for S11, S22 and S12
-    axs.set_title('Phase Response (S11, S12, S22)')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Phase (degrees)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
+    # Traces are computed once per network and band, then shared by every plot
+    plot_axes(axs, band_traces(ntwk, max_freq))
+
+    # Adjust layout and save the plot, closing the figure so repeated calls do not accumulate open figures
     plt.tight_layout()
-    plt.savefig(plot_title)
+    fig.savefig(plot_title)
+    plt.close(fig)
     #plt.show()
 
-def plot_mag_nano_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
+def plot_phase_nano_s2p(ntwk, title, plot_title):
+    # Filter frequencies up to 1 GHz (1e9 Hz)
+    save_single_plot(ntwk, title, plot_title, 1e9, plot_phase_axes)
 
+def plot_mag_nano_s2p(ntwk, title, plot_title):
     # Filter frequencies up to 1 GHz (1e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Magnitude of S11, S12, and S22
-    axs.set_title('Log Magnitude (S11, S12, S22)')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])), label='S11')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])), label='S12')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])), label='S22')
-
-    # Labeling and grid
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Magnitude (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 1e9, plot_mag_axes)
 
 def plot_return_nano_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 1 GHz (1e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Return Loss
-    axs.set_title('Return Loss (S11)')
-    return_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15)
-    axs.plot(ntwk.f[freq_mask], return_loss, label='Return Loss (S11)')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Return Loss (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 1e9, plot_return_axes)
 
 def plot_insertion_nano_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 1 GHz (1e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Insertion Loss
-    axs.set_title('Insertion Loss (S21)')
-    insertion_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 0]) + 1e-15)
-    axs.plot(ntwk.f[freq_mask], insertion_loss, label='Insertion Loss (S21)')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Insertion Loss (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 1e9, plot_insertion_axes)
 
 def plot_group_nano_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 1 GHz (1e9 Hz)
-    max_freq = 1e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Group delay of S11 and S22
-    axs.set_title('Group Delay (S11, S22)')
-    group_delay_s11 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 0, 0]))) / np.diff(ntwk.f[freq_mask])
-    group_delay_s22 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 1, 1]))) / np.diff(ntwk.f[freq_mask])
-    axs.plot(ntwk.f[freq_mask][:-1], group_delay_s11, label='S11 Group Delay')
-    axs.plot(ntwk.f[freq_mask][:-1], group_delay_s22, label='S22 Group Delay')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Group Delay (s)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 1e9, plot_group_axes)
 
 
 def plot_phase_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Phase response of S11, S22, S21
-    axs.set_title('Phase Response (S11, S12, S22)')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs.plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Phase (degrees)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 6e9, plot_phase_axes)
 
 def plot_mag_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Magnitude of S11, S12, and S22
-    axs.set_title('Log Magnitude (S11, S12, S22)')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])), label='S11')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])), label='S12')
-    axs.plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])), label='S22')
-
-    # Labeling and grid
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Magnitude (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 6e9, plot_mag_axes)
 
 def plot_return_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Return Loss
-    axs.set_title('Return Loss (S11)')
-    return_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15)
-    axs.plot(ntwk.f[freq_mask], return_loss, label='Return Loss (S11)')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Return Loss (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 6e9, plot_return_axes)
 
 def plot_insertion_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Insertion Loss
-    axs.set_title('Insertion Loss (S21)')
-    insertion_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 0]) + 1e-15)
-    axs.plot(ntwk.f[freq_mask], insertion_loss, label='Insertion Loss (S21)')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Insertion Loss (dB)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 6e9, plot_insertion_axes)
 
 def plot_group_s2p(ntwk, title, plot_title):
-    # Create the figure and axis
-    fig, axs = plt.subplots(figsize=(36, 16))
-    fig.suptitle(title)
-
     # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot: Group delay of S11 and S22
-    axs.set_title('Group Delay (S11, S22)')
-    group_delay_s11 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 0, 0]))) / np.diff(ntwk.f[freq_mask])
-    group_delay_s22 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 1, 1]))) / np.diff(ntwk.f[freq_mask])
-    axs.plot(ntwk.f[freq_mask][:-1], group_delay_s11, label='S11 Group Delay')
-    axs.plot(ntwk.f[freq_mask][:-1], group_delay_s22, label='S22 Group Delay')
-    axs.set_xlabel('Frequency (Hz)')
-    axs.set_ylabel('Group Delay (s)')
-    axs.grid(True)
-    axs.legend()
-
-    # Adjust layout and show the plot
-    plt.tight_layout()
-    plt.savefig(plot_title)  # Save the plot as a .png file
-    #plt.show()
+    save_single_plot(ntwk, title, plot_title, 6e9, plot_group_axes)
 
 def plot_uncal_s2p(ntwk, title):
+    ntwk = as_network(ntwk)
     fig, axs = plt.subplots(2, 2, figsize=(15, 12))
     fig.suptitle(title)
 
     # Filter frequencies up to 6 GHz (6e9 Hz)
     max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
+    tr = band_traces(ntwk, max_freq)
 
     # Plot 1: Smith chart with S11, S22, and S12
-    axs[0, 0].set_title('Smith Chart (S11, S22, S12)')
-    ntwk[freq_mask].plot_s_smith(m=0, n=0, ax=axs[0, 0], label='S11')
-    ntwk[freq_mask].plot_s_smith(m=1, n=1, ax=axs[0, 0], label='S22')
-    ntwk[freq_mask].plot_s_smith(m=0, n=1, ax=axs[0, 0], label='S12')
+    plot_smith_pairs(axs[0, 0], tr)
 
     # Plot 2: Magnitude of S11, S12, and S22
-    axs[0, 1].set_title('Log Magnitude (S11, S12, S22)')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])+ 1e-15), label='S11')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])+ 1e-15), label='S12')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])+ 1e-15), label='S22')
-    axs[0, 1].set_xlabel('Frequency (Hz)')
-    axs[0, 1].set_ylabel('Magnitude (dB)')
-    axs[0, 1].grid(True)
-    axs[0, 1].legend()
+    plot_mag_axes(axs[0, 1], tr)
 
     # Plot 3: Phase response of S11, S12, and S22
-    axs[1, 0].set_title('Phase Response (S11, S12, S22)')
-    axs[1, 0].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs[1, 0].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs[1, 0].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs[1, 0].set_xlabel('Frequency (Hz)')
-    axs[1, 0].set_ylabel('Phase (degrees)')
-    axs[1, 0].grid(True)
-    axs[1, 0].legend()
+    plot_phase_axes(axs[1, 0], tr)
 
     # Plot 4: Group delay of S11 and S22
-    axs[1, 1].set_title('Group Delay (S11, S22)')
-    group_delay_s11 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 0, 0]))) / np.diff(ntwk.f[freq_mask])
-    group_delay_s22 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 1, 1]))) / np.diff(ntwk.f[freq_mask])
-    axs[1, 1].plot(ntwk.f[freq_mask][:-1], group_delay_s11, label='S11 Group Delay')
-    axs[1, 1].plot(ntwk.f[freq_mask][:-1], group_delay_s22, label='S22 Group Delay')
-    axs[1, 1].set_xlabel('Frequency (Hz)')
-    axs[1, 1].set_ylabel('Group Delay (s)')
-    axs[1, 1].grid(True)
-    axs[1, 1].legend()
-
-    plt.tight_layout()
-    plt.show()
-
-def plot_s2p_pres(ntwk, title):
-    fig, axs = plt.subplots(2, 2, figsize=(15, 12))
-    fig.suptitle(title)
-
-    # Filter frequencies up to 6 GHz (6e9 Hz)
-    max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
-
-    # Plot 2: Magnitude of S11, S12, and S22
-    axs[0, 0].set_title('Log Magnitude (S11, S12, S22)')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])), label='S11')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])), label='S12')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])), label='S22')
-    axs[0, 0].set_xlabel('Frequency (Hz)')
-    axs[0, 0].set_ylabel('Magnitude (dB)')
-    axs[0, 0].grid(True)
-    axs[0, 0].legend()
-
-    # Plot 3: Phase response of S11, S12, and S22
-    axs[0, 1].set_title('Phase Response (S11, S12, S22)')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs[0, 1].set_xlabel('Frequency (Hz)')
-    axs[0, 1].set_ylabel('Phase (degrees)')
-    axs[0, 1].grid(True)
-    axs[0, 1].legend()
-
-    # Plot 5: Return loss (S11)
-    axs[1, 0].set_title('Return Loss (S11)')
-    return_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15)
-    axs[1, 0].plot(ntwk.f[freq_mask], return_loss, label='Return Loss (S11)')
-    axs[1, 0].set_xlabel('Frequency (Hz)')
-    axs[1, 0].set_ylabel('Return Loss (dB)')
-    axs[1, 0].grid(True)
-    axs[1, 0].legend()
-
-    # Plot 6: Insertion loss (S21)
-    axs[1, 1].set_title('Insertion Loss (S21)')
-    insertion_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 0]) + 1e-15)
-    axs[1, 1].plot(ntwk.f[freq_mask], insertion_loss, label='Insertion Loss (S21)')
-    axs[1, 1].set_xlabel('Frequency (Hz)')
-    axs[1, 1].set_ylabel('Insertion Loss (dB)')
-    axs[1, 1].grid(True)
-    axs[1, 1].legend()
+    plot_group_axes(axs[1, 1], tr)
 
     plt.tight_layout()
     plt.show()
 
 def plot_s2p(ntwk, title):
+    ntwk = as_network(ntwk)
     fig, axs = plt.subplots(2, 3, figsize=(15, 12))
     fig.suptitle(title)
 
     # Filter frequencies up to 6 GHz (6e9 Hz)
     max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
+    tr = band_traces(ntwk, max_freq)
 
     # Plot 1: Smith chart with S11, S22, and S12
-    axs[0, 0].set_title('Smith Chart (S11, S22, S12)')
-    ntwk[freq_mask].plot_s_smith(m=0, n=0, ax=axs[0, 0], label='S11')
-    ntwk[freq_mask].plot_s_smith(m=1, n=1, ax=axs[0, 0], label='S22')
-    ntwk[freq_mask].plot_s_smith(m=0, n=1, ax=axs[0, 0], label='S12')
+    plot_smith_pairs(axs[0, 0], tr)
 
     # Plot 2: Magnitude of S11, S12, and S22
-    axs[0, 1].set_title('Log Magnitude (S11, S12, S22)')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])+ 1e-15), label='S11')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])+ 1e-15), label='S12')
-    axs[0, 1].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])+ 1e-15), label='S22')
-    axs[0, 1].set_xlabel('Frequency (Hz)')
-    axs[0, 1].set_ylabel('Magnitude (dB)')
-    axs[0, 1].grid(True)
-    axs[0, 1].legend()
+    plot_mag_axes(axs[0, 1], tr)
 
     # Plot 3: Phase response of S11, S12, and S22
-    axs[0, 2].set_title('Phase Response (S11, S12, S22)')
-    axs[0, 2].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs[0, 2].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs[0, 2].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs[0, 2].set_xlabel('Frequency (Hz)')
-    axs[0, 2].set_ylabel('Phase (degrees)')
-    axs[0, 2].grid(True)
-    axs[0, 2].legend()
+    plot_phase_axes(axs[0, 2], tr)
 
     # Plot 4: Group delay of S11 and S22
-    axs[1, 0].set_title('Group Delay (S11, S22)')
-    group_delay_s11 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 0, 0]))) / np.diff(ntwk.f[freq_mask])
-    group_delay_s22 = -np.diff(np.unwrap(np.angle(ntwk.s[freq_mask, 1, 1]))) / np.diff(ntwk.f[freq_mask])
-    axs[1, 0].plot(ntwk.f[freq_mask][:-1], group_delay_s11, label='S11 Group Delay')
-    axs[1, 0].plot(ntwk.f[freq_mask][:-1], group_delay_s22, label='S22 Group Delay')
-    axs[1, 0].set_xlabel('Frequency (Hz)')
-    axs[1, 0].set_ylabel('Group Delay (s)')
-    axs[1, 0].grid(True)
-    axs[1, 0].legend()
+    plot_group_axes(axs[1, 0], tr)
 
     # Plot 5: Return loss (S11)
-    axs[1, 1].set_title('Return Loss (S11)')
-    return_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15)
-    axs[1, 1].plot(ntwk.f[freq_mask], return_loss, label='Return Loss (S11)')
-    axs[1, 1].set_xlabel('Frequency (Hz)')
-    axs[1, 1].set_ylabel('Return Loss (dB)')
-    axs[1, 1].grid(True)
-    axs[1, 1].legend()
+    plot_return_axes(axs[1, 1], tr)
 
     # Plot 6: Insertion loss (S21)
-    axs[1, 2].set_title('Insertion Loss (S21)')
-    insertion_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 0]) + 1e-15)
-    axs[1, 2].plot(ntwk.f[freq_mask], insertion_loss, label='Insertion Loss (S21)')
-    axs[1, 2].set_xlabel('Frequency (Hz)')
-    axs[1, 2].set_ylabel('Insertion Loss (dB)')
-    axs[1, 2].grid(True)
-    axs[1, 2].legend()
+    plot_insertion_axes(axs[1, 2], tr)
 
     plt.tight_layout()
     plt.show()
@@ -440,111 +266,64 @@ def plot_s2p_pres(ntwk, title):
 
     # Filter frequencies up to 6 GHz (6e9 Hz)
     max_freq = 6e9
-    freq_mask = ntwk.f <= max_freq
+    tr = band_traces(ntwk, max_freq)
 
     # Plot 1: Magnitude of S11, S12, and S22
-    axs[0, 0].set_title('Log Magnitude (S11, S12, S22)')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0])), label='S11')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 1])), label='S12')
-    axs[0, 0].plot(ntwk.f[freq_mask], 20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 1])), label='S22')
-    axs[0, 0].set_xlabel('Frequency (Hz)')
-    axs[0, 0].set_ylabel('Magnitude (dB)')
-    axs[0, 0].grid(True)
-    axs[0, 0].legend()
+    plot_mag_axes(axs[0, 0], tr)
 
     # Plot 2: Phase response of S11, S12, and S22
-    axs[0, 1].set_title('Phase Response (S11, S12, S22)')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 0], deg=True), label='S11')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 0, 1], deg=True), label='S12')
-    axs[0, 1].plot(ntwk.f[freq_mask], np.angle(ntwk.s[freq_mask, 1, 1], deg=True), label='S22')
-    axs[0, 1].set_xlabel('Frequency (Hz)')
-    axs[0, 1].set_ylabel('Phase (degrees)')
-    axs[0, 1].grid(True)
-    axs[0, 1].legend()
+    plot_phase_axes(axs[0, 1], tr)
 
     # Plot 3: Return loss (S11)
-    axs[1, 0].set_title('Return Loss (S11)')
-    return_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 0, 0]) + 1e-15)
-    axs[1, 0].plot(ntwk.f[freq_mask], return_loss, label='Return Loss (S11)')
-    axs[1, 0].set_xlabel('Frequency (Hz)')
-    axs[1, 0].set_ylabel('Return Loss (dB)')
-    axs[1, 0].grid(True)
-    axs[1, 0].legend()
+    plot_return_axes(axs[1, 0], tr)
 
     # Plot 4: Insertion loss (S21)
-    axs[1, 1].set_title('Insertion Loss (S21)')
-    insertion_loss = -20 * np.log10(np.abs(ntwk.s[freq_mask, 1, 0]) + 1e-15)
-    axs[1, 1].plot(ntwk.f[freq_mask], insertion_loss, label='Insertion Loss (S21)')
-    axs[1, 1].set_xlabel('Frequency (Hz)')
-    axs[1, 1].set_ylabel('Insertion Loss (dB)')
-    axs[1, 1].grid(True)
-    axs[1, 1].legend()
+    plot_insertion_axes(axs[1, 1], tr)
 
     plt.tight_layout()
     plt.show()
 
-def plot_s2p_comparison_four(ntwk1, ntwk2, ntwk3, ntwk4, title):
+def plot_s2p_comparison(networks, labels, title, max_freq=1.2e9, min_freq=None):
+    networks = [as_network(ntwk) for ntwk in networks]
+    if len(labels) != len(networks):
+        raise ValueError(f"Got {len(labels)} labels for {len(networks)} networks")
     fig, axs = plt.subplots(2, 3, figsize=(18, 12))  # Adjust figure size for poster
     fig.suptitle(title, fontsize=28)  # Large title for the poster
 
-    max_freq = 1.2e9
-    freq_mask = ntwk1.f <= max_freq
-
-    # Define labels
-    labels = ['NanoVNA-H4', 'FieldFox N9916A', 'R&S ZVL', 'Ideal']
+    # Align every network onto the first network's frequency points within the band they all cover, then stack
+    # them as (K, N, 2, 2) so every trace is computed in one pass
+    low = max([ntwk.f[0] for ntwk in networks] + ([min_freq] if min_freq is not None else []))
+    high = min([ntwk.f[-1] for ntwk in networks] + ([max_freq] if max_freq is not None else []))
+    f = networks[0].f[band_slice(networks[0].f, high, low)]
+    if len(f) == 0:
+        raise ValueError(f"The networks share no frequency points, the common band {low:.6g} Hz to {high:.6g} Hz "
+                         "is empty")
+    s = np.stack([align_s(ntwk, f) for ntwk in networks])
+    mag_db = 20 * np.log10(np.abs(s) + 1e-15)
 
     # Set tick parameters for all subplots
     for ax in axs.flat:
         ax.tick_params(axis='both', which='major', labelsize=16)  # Increase tick label size
         ax.tick_params(axis='both', which='minor', labelsize=12)
 
-    # Smith Chart for S11, S22, S12
-    axs[0, 0].set_title('Smith Chart S11', fontsize=22)
-    ntwk1.plot_s_smith(m=0, n=0, ax=axs[0, 0], show_legend=False)
-    ntwk2.plot_s_smith(m=0, n=0, ax=axs[0, 0], show_legend=False)
-    ntwk3.plot_s_smith(m=0, n=0, ax=axs[0, 0], show_legend=False)
-    ntwk4.plot_s_smith(m=0, n=0, ax=axs[0, 0], show_legend=False)
-
-    axs[0, 1].set_title('Smith Chart S22', fontsize=22)
-    ntwk1.plot_s_smith(m=1, n=1, ax=axs[0, 1], show_legend=False)
-    ntwk2.plot_s_smith(m=1, n=1, ax=axs[0, 1], show_legend=False)
-    ntwk3.plot_s_smith(m=1, n=1, ax=axs[0, 1], show_legend=False)
-    ntwk4.plot_s_smith(m=1, n=1, ax=axs[0, 1], show_legend=False)
-
-    axs[0, 2].set_title('Smith Chart S12', fontsize=22)
-    ntwk1.plot_s_smith(m=0, n=1, ax=axs[0, 2], show_legend=False)
-    ntwk2.plot_s_smith(m=0, n=1, ax=axs[0, 2], show_legend=False)
-    ntwk3.plot_s_smith(m=0, n=1, ax=axs[0, 2], show_legend=False)
-    ntwk4.plot_s_smith(m=0, n=1, ax=axs[0, 2], show_legend=False)
+    # Smith Chart for S11, S22, S12. Each grid is drawn once for all networks
+    for ax, (m, n) in zip(axs[0], smith_pairs(2)):
+        plot_smith_axes(ax, s[:, :, m, n], labels, f'Smith Chart {pair_label((m, n))}', fontsize=22,
+                        show_legend=False)
 
     # Log magnitude plots
-    axs[1, 0].set_title('Log Magnitude S11', fontsize=22)
-    axs[1, 0].plot(ntwk1.f, 20 * np.log10(np.abs(ntwk1.s[freq_mask, 0, 0])), color='C0', label=labels[0])
-    axs[1, 0].plot(ntwk2.f, 20 * np.log10(np.abs(ntwk2.s[:, 0, 0])), color='C1', label=labels[1])
-    axs[1, 0].plot(ntwk3.f, 20 * np.log10(np.abs(ntwk3.s[:, 0, 0])), color='C2', label=labels[2])
-    axs[1, 0].plot(ntwk4.f, 20 * np.log10(np.abs(ntwk4.s[:, 0, 0])), color='C3', label=labels[3])
-    axs[1, 0].set_xlabel('Frequency (Hz)', fontsize=20)
-    axs[1, 0].set_ylabel('Magnitude (dB)', fontsize=20)
-    axs[1, 0].grid(True)
-
-    axs[1, 1].set_title('Log Magnitude S22', fontsize=22)
-    axs[1, 1].plot(ntwk1.f, 20 * np.log10(np.abs(ntwk1.s[freq_mask, 1, 1])), color='C0')
-    axs[1, 1].plot(ntwk2.f, 20 * np.log10(np.abs(ntwk2.s[:, 1, 1])), color='C1')
-    axs[1, 1].plot(ntwk3.f, 20 * np.log10(np.abs(ntwk3.s[:, 1, 1])), color='C2')
-    axs[1, 1].plot(ntwk4.f, 20 * np.log10(np.abs(ntwk4.s[:, 1, 1])), color='C3')
-    axs[1, 1].set_xlabel('Frequency (Hz)', fontsize=20)
-    axs[1, 1].set_ylabel('Magnitude (dB)', fontsize=20)
-    axs[1, 1].grid(True)
-
-    axs[1, 2].set_title('Log Magnitude S12', fontsize=22)
-    axs[1, 2].plot(ntwk1.f, 20 * np.log10(np.abs(ntwk1.s[freq_mask, 0, 1])), color='C0')
-    axs[1, 2].plot(ntwk2.f, 20 * np.log10(np.abs(ntwk2.s[:, 0, 1])), color='C1')
-    axs[1, 2].plot(ntwk3.f, 20 * np.log10(np.abs(ntwk3.s[:, 0, 1])), color='C2')
-    axs[1, 2].plot(ntwk4.f, 20 * np.log10(np.abs(ntwk4.s[:, 0, 1])), color='C3')
-    axs[1, 2].set_xlabel('Frequency (Hz)', fontsize=20)
-    axs[1, 2].set_ylabel('Magnitude (dB)', fontsize=20)
-    axs[1, 2].grid(True)
+    for ax, (m, n) in zip(axs[1], smith_pairs(2)):
+        ax.set_title(f'Log Magnitude {pair_label((m, n))}', fontsize=22)
+        for i, label in enumerate(labels):
+            plot_line(ax, f, mag_db[i, :, m, n], color=f'C{i % 10}', label=label if (m, n) == (0, 0) else None)
+        ax.set_xlabel('Frequency (Hz)', fontsize=20)
+        ax.set_ylabel('Magnitude (dB)', fontsize=20)
+        ax.grid(True)
 
     plt.tight_layout(rect=[0, 0, 1, 0.95])  # Adjust layout to leave space for title
     plt.show()
 
+def plot_s2p_comparison_four(ntwk1, ntwk2, ntwk3, ntwk4, title):
+    # Define labels
+    labels = ['NanoVNA-H4', 'FieldFox N9916A', 'R&S ZVL', 'Ideal']
+    plot_s2p_comparison([ntwk1, ntwk2, ntwk3, ntwk4], labels, title, max_freq=1.2e9)